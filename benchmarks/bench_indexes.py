@@ -0,0 +1,172 @@
+"""Scan vs. index timings for the admin analytics queries.
+
+Builds a throwaway database with N synthetic flight searches, times each
+analytics query with no secondary indexes, applies the schema migrations,
+and times the same queries again. The dashboard's get_* readers answer
+from the search rollups, so those are timed as well.
+
+The rollup triggers are dropped while the table is filled (the migrations
+re-create them and backfill the rollups), so the fill measures plain
+inserts and the rollups are built in one pass.
+
+    python benchmarks/bench_indexes.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+QUERIES = {
+    'top destinations': '''
+        SELECT destination, COUNT(*) as count FROM flight_searches
+        GROUP BY destination ORDER BY count DESC LIMIT 10''',
+    'top departures': '''
+        SELECT origin, COUNT(*) as count FROM flight_searches
+        GROUP BY origin ORDER BY count DESC LIMIT 10''',
+    'searches last 7 days': '''
+        SELECT COUNT(*) FROM flight_searches
+        WHERE created_at >= date('now', '-7 days')''',
+    'this month by destination': '''
+        SELECT destination, COUNT(*) as count FROM flight_searches
+        WHERE created_at >= date('now', 'start of month')
+        GROUP BY destination ORDER BY count DESC LIMIT 5''',
+    'budget distribution': '''
+        SELECT budget_preference, COUNT(*) as count FROM flight_searches
+        WHERE budget_preference IS NOT NULL
+        GROUP BY budget_preference ORDER BY count DESC''',
+    'class distribution': '''
+        SELECT flight_class, COUNT(*) as count FROM flight_searches
+        WHERE flight_class IS NOT NULL
+        GROUP BY flight_class ORDER BY count DESC''',
+    'recent searches': '''
+        SELECT * FROM flight_searches ORDER BY created_at DESC LIMIT 50''',
+    'avg duration last 90 days': '''
+        SELECT AVG(duration_days) FROM flight_searches
+        WHERE created_at >= date('now', '-90 days')''',
+}
+
+# Rollup-backed db_utils readers for the same questions: (function, args)
+ROLLUP_READERS = {
+    'top destinations': ('get_top_destinations', (10,)),
+    'top departures': ('get_top_departures', (10,)),
+    'searches last 7 days': ('get_recent_searches_count', (7,)),
+    'budget distribution': ('get_budget_distribution', ()),
+    'class distribution': ('get_class_distribution', ()),
+}
+
+AIRPORTS = ['BOM', 'DEL', 'BLR', 'MAA', 'BKK', 'SIN', 'KUL', 'DXB', 'DOH', 'KTM',
+            'CMB', 'NRT', 'ICN', 'LHR', 'CDG', 'FRA', 'JFK', 'LAX', 'SYD', 'AKL']
+BUDGETS = ['Economy', 'Standard', 'Luxury']
+CLASSES = ['Economy', 'Business', 'First Class']
+
+
+def populate(conn, rows, days=365, chunk=50000):
+    now = datetime.utcnow()
+    rng = random.Random(42)
+    insert = '''
+    INSERT INTO flight_searches
+    (origin, destination, departure_date, return_date, duration_days,
+     budget_preference, flight_class, estimated_price, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    for start in range(0, rows, chunk):
+        batch = []
+        for _ in range(min(chunk, rows - start)):
+            created = now - timedelta(seconds=rng.randrange(days * 86400))
+            duration = rng.randint(1, 14)
+            departure = created + timedelta(days=rng.randint(1, 90))
+            batch.append((
+                rng.choice(AIRPORTS), rng.choice(AIRPORTS),
+                departure.strftime('%Y-%m-%d'),
+                (departure + timedelta(days=duration)).strftime('%Y-%m-%d'),
+                duration, rng.choice(BUDGETS), rng.choice(CLASSES),
+                float(rng.randint(3000, 90000)),
+                created.strftime('%Y-%m-%d %H:%M:%S'),
+            ))
+        conn.executemany(insert, batch)
+        conn.commit()
+
+
+def time_queries(conn, repeat):
+    timings = {}
+    for name, sql in QUERIES.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql).fetchall()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    return timings
+
+
+def time_rollup_readers(db_utils, repeat):
+    timings = {}
+    for name, (function_name, args) in ROLLUP_READERS.items():
+        reader = getattr(db_utils, function_name)
+        # Bypass the analytics cache so every call reads the rollup tables
+        reader = getattr(reader, 'uncached', reader)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            reader(*args)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='roamgenie_bench_')
+    os.environ['ROAMGENIE_DB_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ['ROAMGENIE_WRITE_BEHIND'] = '0'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import db_utils
+
+    conn = sqlite3.connect(db_utils.DB_PATH)
+    # Indexes and triggers are dropped; tables and backfills from the other
+    # migrations are idempotent and simply re-run below
+    for version, _, statements in db_utils.SCHEMA_MIGRATIONS:
+        for statement in statements:
+            match = re.search(r'CREATE (?:UNIQUE )?(INDEX|TRIGGER) IF NOT EXISTS (\w+)', statement)
+            if match:
+                conn.execute(f"DROP {match.group(1)} IF EXISTS {match.group(2)}")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+
+    print(f"Populating {args.rows:,} rows in {db_utils.DB_PATH} ...")
+    start = time.perf_counter()
+    populate(conn, args.rows)
+    print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    scan = time_queries(conn, args.repeat)
+
+    start = time.perf_counter()
+    db_utils.run_migrations(conn)
+    conn.execute("ANALYZE")
+    print(f"Migrations + ANALYZE took {time.perf_counter() - start:.1f}s")
+
+    indexed = time_queries(conn, args.repeat)
+    conn.close()
+    rollup = time_rollup_readers(db_utils, args.repeat)
+
+    print(f"\n{'query':<28}{'scan ms':>12}{'index ms':>12}{'speedup':>10}{'rollup ms':>12}{'speedup':>10}")
+    for name in QUERIES:
+        speedup = scan[name] / indexed[name] if indexed[name] else float('inf')
+        line = f"{name:<28}{scan[name] * 1000:>12.1f}{indexed[name] * 1000:>12.1f}{speedup:>9.1f}x"
+        if name in rollup:
+            rollup_speedup = scan[name] / rollup[name] if rollup[name] else float('inf')
+            line += f"{rollup[name] * 1000:>12.2f}{rollup_speedup:>9.1f}x"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Pandas scan vs. precomputed index for visa-free destination lookups.
+
+Times the old PassportScanner.get_visa_free_countries DataFrame path
+against VisaIndex for every passport in the dataset, and checks that both
+return the same destinations. Also times a group-travel intersection
+(one pandas lookup per member vs. VisaMatrix bitmaps). The dataset is
+synthetic (same shape and requirement mix as the passport-index tidy
+CSV) unless --csv points at a real snapshot.
+
+    python benchmarks/bench_visa_lookup.py
+    python benchmarks/bench_visa_lookup.py --csv visa_snapshots/passport-index-....csv.gz
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+REQUIREMENTS = ['visa free', 'visa on arrival', 'e-visa', 'eta', 'visa required',
+                'no admission', '90', '30', '14']
+REQUIREMENT_WEIGHTS = [20, 10, 10, 3, 35, 2, 10, 7, 3]
+
+
+def synthetic_dataset(countries, seed=42):
+    rng = random.Random(seed)
+    names = [f"Country {index:03d}" for index in range(countries)]
+    rows = []
+    for passport in names:
+        for destination in names:
+            requirement = '-1' if passport == destination else rng.choices(REQUIREMENTS, REQUIREMENT_WEIGHTS)[0]
+            # Untidy whitespace, as in hand-edited copies of the CSV
+            rows.append((f" {passport}" if rng.random() < 0.05 else passport, destination, requirement))
+    return pd.DataFrame(rows, columns=['Passport', 'Destination', 'Requirement'])
+
+
+def pandas_lookup(visa_data, passport_country):
+    """The DataFrame path PassportScanner used before the index"""
+    passport_country_clean = passport_country.strip()
+    visa_free_data = visa_data[
+        (visa_data['Passport'].str.strip().str.lower() == passport_country_clean.lower()) &
+        (visa_data['Requirement'].str.contains('visa free|visa-free|visa on arrival', case=False, na=False))
+    ]
+    if visa_free_data.empty:
+        visa_free_data = visa_data[
+            (visa_data['Passport'].str.contains(passport_country_clean, case=False, na=False)) &
+            (visa_data['Requirement'].str.contains('visa free|visa-free|visa on arrival', case=False, na=False))
+        ]
+    countries = sorted(visa_free_data['Destination'].unique().tolist())
+    return [country for country in countries if country and str(country).strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--countries', type=int, default=199)
+    parser.add_argument('--csv', help="benchmark a real passport-index tidy CSV instead")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--group-size', type=int, default=50)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from visa_dataset import VisaIndex, VisaMatrix, normalize_visa_frame
+
+    raw = pd.read_csv(args.csv) if args.csv else synthetic_dataset(args.countries)
+    passports = sorted(raw['Passport'].astype(str).str.strip().unique())
+    print(f"{len(raw):,} rows, {len(passports)} passports")
+
+    start = time.perf_counter()
+    frame = normalize_visa_frame(raw)
+    index = VisaIndex.from_frame(frame)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    matrix = VisaMatrix.from_frame(frame)
+    matrix_seconds = time.perf_counter() - start
+
+    pandas_best = index_best = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        expected = {passport: pandas_lookup(raw, passport) for passport in passports}
+        pandas_best = min(pandas_best, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        actual = {passport: list(index.visa_free(passport)) for passport in passports}
+        index_best = min(index_best, time.perf_counter() - start)
+
+    # The old path falls back to substring matches when an exact passport has
+    # no visa-free rows; the index keeps the exact (empty) answer
+    mismatches = [passport for passport in passports
+                  if expected[passport] != actual[passport] and actual[passport]]
+
+    group = random.Random(7).sample(passports, min(args.group_size, len(passports)))
+    start = time.perf_counter()
+    group_expected = set.intersection(*(set(pandas_lookup(raw, passport)) for passport in group))
+    group_pandas = time.perf_counter() - start
+    group_best = float('inf')
+    for _ in range(100):
+        start = time.perf_counter()
+        group_actual = matrix.group_access(group, categories=('visa_free', 'visa_on_arrival')).any_category
+        group_best = min(group_best, time.perf_counter() - start)
+    if set(group_actual) != group_expected:
+        mismatches.append(f"group of {len(group)}")
+
+    per_pandas = pandas_best / len(passports) * 1000
+    per_index = index_best / len(passports) * 1000
+    print(f"index build             {build_seconds * 1000:>10.1f} ms (once per dataset load)")
+    print(f"pandas scan per lookup  {per_pandas:>10.3f} ms")
+    print(f"index per lookup        {per_index:>10.4f} ms")
+    print(f"speedup                 {per_pandas / per_index if per_index else float('inf'):>10.0f}x")
+    print(f"matrix + bitmap build   {matrix_seconds * 1000:>10.1f} ms ({matrix.nbytes:,} bytes)")
+    print(f"group of {len(group):<3} pandas    {group_pandas * 1000:>10.1f} ms")
+    print(f"group of {len(group):<3} bitmaps   {group_best * 1000:>10.3f} ms")
+    print(f"mismatches              {len(mismatches):>10}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
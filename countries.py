@@ -0,0 +1,303 @@
+"""Country reference data: ISO codes, names, regions, flags and aliases.
+
+The visa datasets spell countries differently ("UAE" vs "United Arab
+Emirates", "IND" as a passport key, "Czechia" vs "Czech Republic").
+country_iso3 maps any of those spellings to one code, so data from
+different sources can be joined on it. The table is indexed once at
+import; lookups are dict hits.
+
+Regions follow the app's own grouping (the Middle East is separate from
+Asia); subregions follow the UN geoscheme.
+"""
+from collections import Counter
+from dataclasses import dataclass
+
+REGIONS = ('Asia', 'Europe', 'Middle East', 'Africa', 'Americas', 'Oceania')
+UNKNOWN_REGION = 'Other'
+
+# (iso3, iso2, name, region, subregion)
+COUNTRIES = [
+    # Asia
+    ('AFG', 'AF', 'Afghanistan', 'Asia', 'Southern Asia'),
+    ('BGD', 'BD', 'Bangladesh', 'Asia', 'Southern Asia'),
+    ('BTN', 'BT', 'Bhutan', 'Asia', 'Southern Asia'),
+    ('IND', 'IN', 'India', 'Asia', 'Southern Asia'),
+    ('MDV', 'MV', 'Maldives', 'Asia', 'Southern Asia'),
+    ('NPL', 'NP', 'Nepal', 'Asia', 'Southern Asia'),
+    ('PAK', 'PK', 'Pakistan', 'Asia', 'Southern Asia'),
+    ('LKA', 'LK', 'Sri Lanka', 'Asia', 'Southern Asia'),
+    ('BRN', 'BN', 'Brunei', 'Asia', 'South-Eastern Asia'),
+    ('KHM', 'KH', 'Cambodia', 'Asia', 'South-Eastern Asia'),
+    ('IDN', 'ID', 'Indonesia', 'Asia', 'South-Eastern Asia'),
+    ('LAO', 'LA', 'Laos', 'Asia', 'South-Eastern Asia'),
+    ('MYS', 'MY', 'Malaysia', 'Asia', 'South-Eastern Asia'),
+    ('MMR', 'MM', 'Myanmar', 'Asia', 'South-Eastern Asia'),
+    ('PHL', 'PH', 'Philippines', 'Asia', 'South-Eastern Asia'),
+    ('SGP', 'SG', 'Singapore', 'Asia', 'South-Eastern Asia'),
+    ('THA', 'TH', 'Thailand', 'Asia', 'South-Eastern Asia'),
+    ('TLS', 'TL', 'Timor-Leste', 'Asia', 'South-Eastern Asia'),
+    ('VNM', 'VN', 'Vietnam', 'Asia', 'South-Eastern Asia'),
+    ('CHN', 'CN', 'China', 'Asia', 'Eastern Asia'),
+    ('HKG', 'HK', 'Hong Kong', 'Asia', 'Eastern Asia'),
+    ('JPN', 'JP', 'Japan', 'Asia', 'Eastern Asia'),
+    ('MAC', 'MO', 'Macau', 'Asia', 'Eastern Asia'),
+    ('MNG', 'MN', 'Mongolia', 'Asia', 'Eastern Asia'),
+    ('PRK', 'KP', 'North Korea', 'Asia', 'Eastern Asia'),
+    ('KOR', 'KR', 'South Korea', 'Asia', 'Eastern Asia'),
+    ('TWN', 'TW', 'Taiwan', 'Asia', 'Eastern Asia'),
+    ('KAZ', 'KZ', 'Kazakhstan', 'Asia', 'Central Asia'),
+    ('KGZ', 'KG', 'Kyrgyzstan', 'Asia', 'Central Asia'),
+    ('TJK', 'TJ', 'Tajikistan', 'Asia', 'Central Asia'),
+    ('TKM', 'TM', 'Turkmenistan', 'Asia', 'Central Asia'),
+    ('UZB', 'UZ', 'Uzbekistan', 'Asia', 'Central Asia'),
+    # Middle East
+    ('ARM', 'AM', 'Armenia', 'Middle East', 'Western Asia'),
+    ('AZE', 'AZ', 'Azerbaijan', 'Middle East', 'Western Asia'),
+    ('BHR', 'BH', 'Bahrain', 'Middle East', 'Western Asia'),
+    ('GEO', 'GE', 'Georgia', 'Middle East', 'Western Asia'),
+    ('IRN', 'IR', 'Iran', 'Middle East', 'Southern Asia'),
+    ('IRQ', 'IQ', 'Iraq', 'Middle East', 'Western Asia'),
+    ('ISR', 'IL', 'Israel', 'Middle East', 'Western Asia'),
+    ('JOR', 'JO', 'Jordan', 'Middle East', 'Western Asia'),
+    ('KWT', 'KW', 'Kuwait', 'Middle East', 'Western Asia'),
+    ('LBN', 'LB', 'Lebanon', 'Middle East', 'Western Asia'),
+    ('OMN', 'OM', 'Oman', 'Middle East', 'Western Asia'),
+    ('PSE', 'PS', 'Palestine', 'Middle East', 'Western Asia'),
+    ('QAT', 'QA', 'Qatar', 'Middle East', 'Western Asia'),
+    ('SAU', 'SA', 'Saudi Arabia', 'Middle East', 'Western Asia'),
+    ('SYR', 'SY', 'Syria', 'Middle East', 'Western Asia'),
+    ('TUR', 'TR', 'Turkey', 'Middle East', 'Western Asia'),
+    ('ARE', 'AE', 'United Arab Emirates', 'Middle East', 'Western Asia'),
+    ('YEM', 'YE', 'Yemen', 'Middle East', 'Western Asia'),
+    # Europe
+    ('DNK', 'DK', 'Denmark', 'Europe', 'Northern Europe'),
+    ('EST', 'EE', 'Estonia', 'Europe', 'Northern Europe'),
+    ('FIN', 'FI', 'Finland', 'Europe', 'Northern Europe'),
+    ('ISL', 'IS', 'Iceland', 'Europe', 'Northern Europe'),
+    ('IRL', 'IE', 'Ireland', 'Europe', 'Northern Europe'),
+    ('LVA', 'LV', 'Latvia', 'Europe', 'Northern Europe'),
+    ('LTU', 'LT', 'Lithuania', 'Europe', 'Northern Europe'),
+    ('NOR', 'NO', 'Norway', 'Europe', 'Northern Europe'),
+    ('SWE', 'SE', 'Sweden', 'Europe', 'Northern Europe'),
+    ('GBR', 'GB', 'United Kingdom', 'Europe', 'Northern Europe'),
+    ('AUT', 'AT', 'Austria', 'Europe', 'Western Europe'),
+    ('BEL', 'BE', 'Belgium', 'Europe', 'Western Europe'),
+    ('FRA', 'FR', 'France', 'Europe', 'Western Europe'),
+    ('DEU', 'DE', 'Germany', 'Europe', 'Western Europe'),
+    ('LIE', 'LI', 'Liechtenstein', 'Europe', 'Western Europe'),
+    ('LUX', 'LU', 'Luxembourg', 'Europe', 'Western Europe'),
+    ('MCO', 'MC', 'Monaco', 'Europe', 'Western Europe'),
+    ('NLD', 'NL', 'Netherlands', 'Europe', 'Western Europe'),
+    ('CHE', 'CH', 'Switzerland', 'Europe', 'Western Europe'),
+    ('ALB', 'AL', 'Albania', 'Europe', 'Southern Europe'),
+    ('AND', 'AD', 'Andorra', 'Europe', 'Southern Europe'),
+    ('BIH', 'BA', 'Bosnia and Herzegovina', 'Europe', 'Southern Europe'),
+    ('HRV', 'HR', 'Croatia', 'Europe', 'Southern Europe'),
+    ('CYP', 'CY', 'Cyprus', 'Europe', 'Southern Europe'),
+    ('GRC', 'GR', 'Greece', 'Europe', 'Southern Europe'),
+    ('ITA', 'IT', 'Italy', 'Europe', 'Southern Europe'),
+    ('XKX', 'XK', 'Kosovo', 'Europe', 'Southern Europe'),
+    ('MLT', 'MT', 'Malta', 'Europe', 'Southern Europe'),
+    ('MNE', 'ME', 'Montenegro', 'Europe', 'Southern Europe'),
+    ('MKD', 'MK', 'North Macedonia', 'Europe', 'Southern Europe'),
+    ('PRT', 'PT', 'Portugal', 'Europe', 'Southern Europe'),
+    ('SMR', 'SM', 'San Marino', 'Europe', 'Southern Europe'),
+    ('SRB', 'RS', 'Serbia', 'Europe', 'Southern Europe'),
+    ('SVN', 'SI', 'Slovenia', 'Europe', 'Southern Europe'),
+    ('ESP', 'ES', 'Spain', 'Europe', 'Southern Europe'),
+    ('VAT', 'VA', 'Vatican City', 'Europe', 'Southern Europe'),
+    ('BLR', 'BY', 'Belarus', 'Europe', 'Eastern Europe'),
+    ('BGR', 'BG', 'Bulgaria', 'Europe', 'Eastern Europe'),
+    ('CZE', 'CZ', 'Czech Republic', 'Europe', 'Eastern Europe'),
+    ('HUN', 'HU', 'Hungary', 'Europe', 'Eastern Europe'),
+    ('MDA', 'MD', 'Moldova', 'Europe', 'Eastern Europe'),
+    ('POL', 'PL', 'Poland', 'Europe', 'Eastern Europe'),
+    ('ROU', 'RO', 'Romania', 'Europe', 'Eastern Europe'),
+    ('RUS', 'RU', 'Russia', 'Europe', 'Eastern Europe'),
+    ('SVK', 'SK', 'Slovakia', 'Europe', 'Eastern Europe'),
+    ('UKR', 'UA', 'Ukraine', 'Europe', 'Eastern Europe'),
+    # Africa
+    ('DZA', 'DZ', 'Algeria', 'Africa', 'Northern Africa'),
+    ('EGY', 'EG', 'Egypt', 'Africa', 'Northern Africa'),
+    ('LBY', 'LY', 'Libya', 'Africa', 'Northern Africa'),
+    ('MAR', 'MA', 'Morocco', 'Africa', 'Northern Africa'),
+    ('SDN', 'SD', 'Sudan', 'Africa', 'Northern Africa'),
+    ('TUN', 'TN', 'Tunisia', 'Africa', 'Northern Africa'),
+    ('BEN', 'BJ', 'Benin', 'Africa', 'Western Africa'),
+    ('BFA', 'BF', 'Burkina Faso', 'Africa', 'Western Africa'),
+    ('CPV', 'CV', 'Cape Verde', 'Africa', 'Western Africa'),
+    ('GMB', 'GM', 'Gambia', 'Africa', 'Western Africa'),
+    ('GHA', 'GH', 'Ghana', 'Africa', 'Western Africa'),
+    ('GIN', 'GN', 'Guinea', 'Africa', 'Western Africa'),
+    ('GNB', 'GW', 'Guinea-Bissau', 'Africa', 'Western Africa'),
+    ('CIV', 'CI', 'Ivory Coast', 'Africa', 'Western Africa'),
+    ('LBR', 'LR', 'Liberia', 'Africa', 'Western Africa'),
+    ('MLI', 'ML', 'Mali', 'Africa', 'Western Africa'),
+    ('MRT', 'MR', 'Mauritania', 'Africa', 'Western Africa'),
+    ('NER', 'NE', 'Niger', 'Africa', 'Western Africa'),
+    ('NGA', 'NG', 'Nigeria', 'Africa', 'Western Africa'),
+    ('SEN', 'SN', 'Senegal', 'Africa', 'Western Africa'),
+    ('SLE', 'SL', 'Sierra Leone', 'Africa', 'Western Africa'),
+    ('TGO', 'TG', 'Togo', 'Africa', 'Western Africa'),
+    ('AGO', 'AO', 'Angola', 'Africa', 'Middle Africa'),
+    ('CMR', 'CM', 'Cameroon', 'Africa', 'Middle Africa'),
+    ('CAF', 'CF', 'Central African Republic', 'Africa', 'Middle Africa'),
+    ('TCD', 'TD', 'Chad', 'Africa', 'Middle Africa'),
+    ('COG', 'CG', 'Republic of the Congo', 'Africa', 'Middle Africa'),
+    ('COD', 'CD', 'Democratic Republic of the Congo', 'Africa', 'Middle Africa'),
+    ('GNQ', 'GQ', 'Equatorial Guinea', 'Africa', 'Middle Africa'),
+    ('GAB', 'GA', 'Gabon', 'Africa', 'Middle Africa'),
+    ('STP', 'ST', 'Sao Tome and Principe', 'Africa', 'Middle Africa'),
+    ('BDI', 'BI', 'Burundi', 'Africa', 'Eastern Africa'),
+    ('COM', 'KM', 'Comoros', 'Africa', 'Eastern Africa'),
+    ('DJI', 'DJ', 'Djibouti', 'Africa', 'Eastern Africa'),
+    ('ERI', 'ER', 'Eritrea', 'Africa', 'Eastern Africa'),
+    ('ETH', 'ET', 'Ethiopia', 'Africa', 'Eastern Africa'),
+    ('KEN', 'KE', 'Kenya', 'Africa', 'Eastern Africa'),
+    ('MDG', 'MG', 'Madagascar', 'Africa', 'Eastern Africa'),
+    ('MWI', 'MW', 'Malawi', 'Africa', 'Eastern Africa'),
+    ('MUS', 'MU', 'Mauritius', 'Africa', 'Eastern Africa'),
+    ('MOZ', 'MZ', 'Mozambique', 'Africa', 'Eastern Africa'),
+    ('RWA', 'RW', 'Rwanda', 'Africa', 'Eastern Africa'),
+    ('SYC', 'SC', 'Seychelles', 'Africa', 'Eastern Africa'),
+    ('SOM', 'SO', 'Somalia', 'Africa', 'Eastern Africa'),
+    ('SSD', 'SS', 'South Sudan', 'Africa', 'Eastern Africa'),
+    ('TZA', 'TZ', 'Tanzania', 'Africa', 'Eastern Africa'),
+    ('UGA', 'UG', 'Uganda', 'Africa', 'Eastern Africa'),
+    ('ZMB', 'ZM', 'Zambia', 'Africa', 'Eastern Africa'),
+    ('ZWE', 'ZW', 'Zimbabwe', 'Africa', 'Eastern Africa'),
+    ('BWA', 'BW', 'Botswana', 'Africa', 'Southern Africa'),
+    ('SWZ', 'SZ', 'Eswatini', 'Africa', 'Southern Africa'),
+    ('LSO', 'LS', 'Lesotho', 'Africa', 'Southern Africa'),
+    ('NAM', 'NA', 'Namibia', 'Africa', 'Southern Africa'),
+    ('ZAF', 'ZA', 'South Africa', 'Africa', 'Southern Africa'),
+    # Americas
+    ('CAN', 'CA', 'Canada', 'Americas', 'Northern America'),
+    ('USA', 'US', 'United States', 'Americas', 'Northern America'),
+    ('BLZ', 'BZ', 'Belize', 'Americas', 'Central America'),
+    ('CRI', 'CR', 'Costa Rica', 'Americas', 'Central America'),
+    ('SLV', 'SV', 'El Salvador', 'Americas', 'Central America'),
+    ('GTM', 'GT', 'Guatemala', 'Americas', 'Central America'),
+    ('HND', 'HN', 'Honduras', 'Americas', 'Central America'),
+    ('MEX', 'MX', 'Mexico', 'Americas', 'Central America'),
+    ('NIC', 'NI', 'Nicaragua', 'Americas', 'Central America'),
+    ('PAN', 'PA', 'Panama', 'Americas', 'Central America'),
+    ('ATG', 'AG', 'Antigua and Barbuda', 'Americas', 'Caribbean'),
+    ('BHS', 'BS', 'Bahamas', 'Americas', 'Caribbean'),
+    ('BRB', 'BB', 'Barbados', 'Americas', 'Caribbean'),
+    ('CUB', 'CU', 'Cuba', 'Americas', 'Caribbean'),
+    ('DMA', 'DM', 'Dominica', 'Americas', 'Caribbean'),
+    ('DOM', 'DO', 'Dominican Republic', 'Americas', 'Caribbean'),
+    ('GRD', 'GD', 'Grenada', 'Americas', 'Caribbean'),
+    ('HTI', 'HT', 'Haiti', 'Americas', 'Caribbean'),
+    ('JAM', 'JM', 'Jamaica', 'Americas', 'Caribbean'),
+    ('PRI', 'PR', 'Puerto Rico', 'Americas', 'Caribbean'),
+    ('KNA', 'KN', 'Saint Kitts and Nevis', 'Americas', 'Caribbean'),
+    ('LCA', 'LC', 'Saint Lucia', 'Americas', 'Caribbean'),
+    ('VCT', 'VC', 'Saint Vincent and the Grenadines', 'Americas', 'Caribbean'),
+    ('TTO', 'TT', 'Trinidad and Tobago', 'Americas', 'Caribbean'),
+    ('ARG', 'AR', 'Argentina', 'Americas', 'South America'),
+    ('BOL', 'BO', 'Bolivia', 'Americas', 'South America'),
+    ('BRA', 'BR', 'Brazil', 'Americas', 'South America'),
+    ('CHL', 'CL', 'Chile', 'Americas', 'South America'),
+    ('COL', 'CO', 'Colombia', 'Americas', 'South America'),
+    ('ECU', 'EC', 'Ecuador', 'Americas', 'South America'),
+    ('GUY', 'GY', 'Guyana', 'Americas', 'South America'),
+    ('PRY', 'PY', 'Paraguay', 'Americas', 'South America'),
+    ('PER', 'PE', 'Peru', 'Americas', 'South America'),
+    ('SUR', 'SR', 'Suriname', 'Americas', 'South America'),
+    ('URY', 'UY', 'Uruguay', 'Americas', 'South America'),
+    ('VEN', 'VE', 'Venezuela', 'Americas', 'South America'),
+    # Oceania
+    ('AUS', 'AU', 'Australia', 'Oceania', 'Australia and New Zealand'),
+    ('NZL', 'NZ', 'New Zealand', 'Oceania', 'Australia and New Zealand'),
+    ('FJI', 'FJ', 'Fiji', 'Oceania', 'Melanesia'),
+    ('NCL', 'NC', 'New Caledonia', 'Oceania', 'Melanesia'),
+    ('PNG', 'PG', 'Papua New Guinea', 'Oceania', 'Melanesia'),
+    ('SLB', 'SB', 'Solomon Islands', 'Oceania', 'Melanesia'),
+    ('VUT', 'VU', 'Vanuatu', 'Oceania', 'Melanesia'),
+    ('KIR', 'KI', 'Kiribati', 'Oceania', 'Micronesia'),
+    ('MHL', 'MH', 'Marshall Islands', 'Oceania', 'Micronesia'),
+    ('FSM', 'FM', 'Micronesia', 'Oceania', 'Micronesia'),
+    ('NRU', 'NR', 'Nauru', 'Oceania', 'Micronesia'),
+    ('PLW', 'PW', 'Palau', 'Oceania', 'Micronesia'),
+    ('COK', 'CK', 'Cook Islands', 'Oceania', 'Polynesia'),
+    ('PYF', 'PF', 'French Polynesia', 'Oceania', 'Polynesia'),
+    ('NIU', 'NU', 'Niue', 'Oceania', 'Polynesia'),
+    ('WSM', 'WS', 'Samoa', 'Oceania', 'Polynesia'),
+    ('TON', 'TO', 'Tonga', 'Oceania', 'Polynesia'),
+    ('TUV', 'TV', 'Tuvalu', 'Oceania', 'Polynesia'),
+]
+
+# Other spellings seen in the visa datasets and the app itself
+COUNTRY_ALIASES = {
+    'UAE': 'ARE', 'UK': 'GBR', 'Great Britain': 'GBR', 'USA': 'USA',
+    'United States of America': 'USA', 'US': 'USA', 'Czechia': 'CZE',
+    "Cote d'Ivoire": 'CIV', "Côte d'Ivoire": 'CIV', 'Macao': 'MAC', 'Macedonia': 'MKD',
+    'Swaziland': 'SWZ', 'Burma': 'MMR', 'East Timor': 'TLS', 'Vatican': 'VAT',
+    'Holy See': 'VAT', 'Cabo Verde': 'CPV', 'Congo': 'COG', 'Congo (Rep.)': 'COG',
+    'DR Congo': 'COD', 'Congo (Dem. Rep.)': 'COD', 'Korea, South': 'KOR', 'Republic of Korea': 'KOR',
+    'Korea, North': 'PRK', 'Russian Federation': 'RUS', 'Viet Nam': 'VNM', 'Lao PDR': 'LAO',
+    'Brunei Darussalam': 'BRN', 'Bahamas, The': 'BHS', 'The Bahamas': 'BHS', 'Gambia, The': 'GMB',
+    'The Gambia': 'GMB', 'Micronesia (Federated States of)': 'FSM', 'St. Kitts and Nevis': 'KNA',
+    'St. Lucia': 'LCA', 'St. Vincent and the Grenadines': 'VCT', 'Sao Tome & Principe': 'STP',
+    'Trinidad & Tobago': 'TTO', 'Antigua & Barbuda': 'ATG', 'Bosnia & Herzegovina': 'BIH',
+    'Palestinian Territories': 'PSE', 'Turkiye': 'TUR', 'Türkiye': 'TUR', 'Moldova, Republic of': 'MDA',
+}
+
+@dataclass(frozen=True)
+class CountryInfo:
+    """One row of the country metadata table"""
+    iso3: str
+    iso2: str
+    name: str
+    region: str
+    subregion: str
+
+    @property
+    def flag(self):
+        # Flag emoji are the ISO2 letters as regional indicator symbols
+        return ''.join(chr(0x1F1E6 + ord(letter) - ord('A')) for letter in self.iso2)
+
+COUNTRY_INFO = {iso3: CountryInfo(iso3, iso2, name, region, subregion)
+                for iso3, iso2, name, region, subregion in COUNTRIES}
+COUNTRY_NAMES = {iso3: info.name for iso3, info in COUNTRY_INFO.items()}
+
+_ISO3_BY_KEY = {}
+for _info in COUNTRY_INFO.values():
+    _ISO3_BY_KEY[_info.name.lower()] = _info.iso3
+    _ISO3_BY_KEY[_info.iso3.lower()] = _info.iso3
+for _alias, _iso3 in COUNTRY_ALIASES.items():
+    _ISO3_BY_KEY[_alias.lower()] = _iso3
+
+def country_iso3(name):
+    """ISO3 code for a country name, alias or code; None when unknown"""
+    if name is None:
+        return None
+    return _ISO3_BY_KEY.get(str(name).strip().lower())
+
+def country_name(iso3):
+    """Canonical display name for an ISO3 code"""
+    return COUNTRY_NAMES.get(iso3)
+
+def country_info(name):
+    """CountryInfo for a country name, alias or ISO3 code; None when unknown"""
+    return COUNTRY_INFO.get(country_iso3(name))
+
+def country_region(name):
+    """Region for a country name, alias or code ('Other' when unknown)"""
+    info = country_info(name)
+    return info.region if info else UNKNOWN_REGION
+
+def country_flag(name):
+    """Flag emoji for a country name, alias or code ('' when unknown)"""
+    info = country_info(name)
+    return info.flag if info else ''
+
+def region_breakdown(countries):
+    """Count countries per region in one pass; unknown names are counted under 'Other'"""
+    counts = Counter(country_region(country) for country in countries)
+    breakdown = {region: counts.get(region, 0) for region in REGIONS}
+    if counts.get(UNKNOWN_REGION):
+        breakdown[UNKNOWN_REGION] = counts[UNKNOWN_REGION]
+    return breakdown
@@ -0,0 +1,230 @@
+"""Background dispatcher for the CRM sync outbox.
+
+Contact Us submissions write their CRM payload to the crm_outbox table in
+the same transaction as the contact (see log_enhanced_contact), so the form
+only waits for the local database. This dispatcher drains the outbox in
+the background: it claims a batch of due rows, posts them to the CRM
+webhook over the shared pooled HTTP client, and reschedules failures with
+jittered exponential backoff. Every delivery carries the row's
+Idempotency-Key header, so a retry after an ambiguous failure cannot create
+a duplicate lead on the CRM side.
+
+Claims expire, so rows held by a process that died are picked up again.
+Each row's claim is renewed just before it is sent and its outcome is
+written straight after, guarded by the claim token, so a slow batch never
+overlaps another dispatcher's claim on the same row. Rows that keep
+failing, or that the CRM rejects outright, are marked 'dead' and can be
+requeued from the System page once the problem is fixed.
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from db_utils import get_connection
+from http_client import CircuitOpenError, get_http_client
+
+CRM_WEBHOOK_URL = os.environ.get(
+    'ROAMGENIE_CRM_WEBHOOK_URL',
+    'https://automations.businessapp.io/start/UNMG/59276034-e50b-4344-b053-7022d7eac352',
+)
+CRM_OUTBOX_BATCH_SIZE = int(os.environ.get('ROAMGENIE_CRM_OUTBOX_BATCH', 20))
+CRM_OUTBOX_POLL_SECONDS = float(os.environ.get('ROAMGENIE_CRM_OUTBOX_POLL_SECONDS', 5))
+CRM_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('ROAMGENIE_CRM_OUTBOX_MAX_ATTEMPTS', 8))
+CRM_RETRY_BASE_SECONDS = 10
+CRM_RETRY_MAX_SECONDS = 30 * 60
+# A claimed row is considered abandoned after this long; the claim is
+# renewed before each send, so it only has to cover a single delivery
+CRM_CLAIM_SECONDS = 120
+# Client errors that can succeed on a later attempt
+CRM_RETRYABLE_CLIENT_STATUSES = frozenset([408, 429])
+
+class CrmRejectedError(RuntimeError):
+    """The CRM refused the payload; retrying the same request cannot help"""
+
+def post_to_crm(payload, idempotency_key):
+    """Deliver one contact to the CRM webhook; raises on failure"""
+    response = get_http_client('vendasta').post(
+        CRM_WEBHOOK_URL,
+        json=payload,
+        headers={'Idempotency-Key': idempotency_key},
+    )
+    if response.status_code == 200:
+        return
+    if 400 <= response.status_code < 500 and response.status_code not in CRM_RETRYABLE_CLIENT_STATUSES:
+        raise CrmRejectedError(f"CRM rejected the contact with status {response.status_code}")
+    raise RuntimeError(f"CRM returned status {response.status_code}")
+
+class CrmOutboxDispatcher:
+    """Drains crm_outbox in batches on a daemon thread"""
+
+    def __init__(self, send=post_to_crm, batch_size=CRM_OUTBOX_BATCH_SIZE,
+                 poll_seconds=CRM_OUTBOX_POLL_SECONDS, max_attempts=CRM_OUTBOX_MAX_ATTEMPTS):
+        self.send = send
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'sent': 0,
+            'failed_attempts': 0,
+            'dead': 0,
+            'rejected': 0,
+            'lost_claims': 0,
+            'batches': 0,
+            'last_error': None,
+        }
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _record_error(self, error):
+        with self._stats_lock:
+            self.stats['last_error'] = str(error)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='roamgenie-crm-outbox', daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Dispatch now instead of at the next poll (call after enqueueing)"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # Keep going while there is a full backlog to drain
+                while self.dispatch_batch() == self.batch_size and not self._stop.is_set():
+                    pass
+            except Exception as e:
+                print(f"⚠️ Warning: CRM outbox dispatch failed: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def _claim(self, now, token):
+        with get_connection() as conn:
+            rows = conn.execute('''
+            UPDATE crm_outbox
+            SET status = 'sending', claimed_until = ?, claim_token = ?
+            WHERE id IN (
+                SELECT id FROM crm_outbox
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'sending' AND claimed_until < ?)
+                ORDER BY id LIMIT ?
+            )
+            RETURNING id, idempotency_key, payload, attempts
+            ''', (now + CRM_CLAIM_SECONDS, token, now, now, self.batch_size)).fetchall()
+            conn.commit()
+        return sorted(rows)
+
+    def _write_claimed(self, row_id, token, assignments, params=()):
+        """Update a row only while this batch still holds its claim"""
+        with get_connection() as conn:
+            updated = conn.execute(f'''
+            UPDATE crm_outbox SET {assignments}
+            WHERE id = ? AND claim_token = ? AND status = 'sending'
+            ''', (*params, row_id, token)).rowcount
+            conn.commit()
+        return updated == 1
+
+    def _retry_delay(self, attempts):
+        delay = min(CRM_RETRY_MAX_SECONDS, CRM_RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _deliver(self, token, row_id, idempotency_key, payload, attempts):
+        """Send one claimed row and persist its outcome; returns the counters to bump"""
+        try:
+            self.send(json.loads(payload), idempotency_key)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            self._record_error(e)
+            attempts += 1
+            counters = ['failed_attempts']
+            if isinstance(e, CrmRejectedError):
+                counters += ['dead', 'rejected']
+            elif attempts >= self.max_attempts:
+                counters.append('dead')
+            written = self._write_claimed(
+                row_id, token,
+                "status = ?, attempts = ?, next_attempt_at = ?, claimed_until = NULL, last_error = ?",
+                ('dead' if 'dead' in counters else 'pending', attempts,
+                 time.time() + self._retry_delay(attempts), str(e)),
+            )
+        else:
+            counters = ['sent']
+            written = self._write_claimed(
+                row_id, token,
+                "status = 'sent', attempts = attempts + 1, sent_at = CURRENT_TIMESTAMP, "
+                "claimed_until = NULL, last_error = NULL",
+            )
+        return counters if written else ['lost_claims']
+
+    def dispatch_batch(self):
+        """Claim and deliver one batch of due rows; returns how many were claimed"""
+        token = uuid.uuid4().hex
+        rows = self._claim(time.time(), token)
+        if not rows:
+            return 0
+        self._count('batches')
+        for index, row in enumerate(rows):
+            # Earlier rows may have used up the batch claim; renew it for this send
+            if not self._write_claimed(row[0], token, 'claimed_until = ?',
+                                       (time.time() + CRM_CLAIM_SECONDS,)):
+                self._count('lost_claims')
+                continue
+            try:
+                counters = self._deliver(token, *row)
+            except CircuitOpenError as e:
+                # The CRM is known to be down: hand the rest back without using up attempts
+                self._record_error(e)
+                retry_at = time.time() + CRM_RETRY_BASE_SECONDS
+                for released in rows[index:]:
+                    self._write_claimed(released[0], token,
+                                        "status = 'pending', next_attempt_at = ?, claimed_until = NULL",
+                                        (retry_at,))
+                break
+            for name in counters:
+                self._count(name)
+        return len(rows)
+
+    def requeue_dead(self):
+        """Give rows that ran out of attempts another full set of retries"""
+        with get_connection() as conn:
+            requeued = conn.execute('''
+            UPDATE crm_outbox SET status = 'pending', attempts = 0, next_attempt_at = 0
+            WHERE status = 'dead'
+            ''').rowcount
+            conn.commit()
+        if requeued:
+            self.wake()
+        return requeued
+
+    def get_stats(self):
+        """Outbox depth by status, age of the oldest undelivered row and counters"""
+        with get_connection() as conn:
+            by_status = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM crm_outbox GROUP BY status"
+            ).fetchall())
+            oldest = conn.execute('''
+            SELECT (julianday('now') - julianday(MIN(created_at))) * 86400
+            FROM crm_outbox WHERE status IN ('pending', 'sending')
+            ''').fetchone()[0]
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['by_status'] = by_status
+        stats['oldest_pending_seconds'] = oldest
+        return stats
@@ -0,0 +1,216 @@
+"""Streaming exports of RoamGenie tables to CSV, gzip CSV or Parquet.
+
+Rows are pulled from a SQLite cursor in fixed-size chunks and written
+straight to the destination, so memory stays bounded by the chunk size
+rather than the table size.
+
+    python data_export.py flight_searches --format csv.gz --since 2024-01-01
+    python data_export.py contacts --columns firstName,email --output contacts.csv
+"""
+import argparse
+import csv
+import gzip
+import io
+import os
+import sys
+import time
+from datetime import datetime
+
+from db_utils import get_connection, flush_pending_writes
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_AVAILABLE = pa is not None
+
+EXPORT_CHUNK_SIZE = int(os.environ.get('ROAMGENIE_EXPORT_CHUNK_SIZE', 5000))
+
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+# Exportable tables: column -> header written to the file, and the column
+# used for date-range filtering. Headers match the old DataFrame exports.
+EXPORT_DATASETS = {
+    'flight_searches': {
+        'columns': {
+            'origin': 'Departure City',
+            'destination': 'Destination',
+            'departure_date': 'Departure Date',
+            'return_date': 'Return Date',
+            'duration_days': 'Trip Duration (Days)',
+            'budget_preference': 'Budget Preference',
+            'flight_class': 'Flight Class',
+            'estimated_price': 'Estimated Price',
+            'created_at': 'Search Date',
+        },
+        'date_column': 'created_at',
+    },
+    'contacts': {
+        'columns': {
+            'id': 'id',
+            'firstName': 'firstName',
+            'secondName': 'secondName',
+            'email': 'email',
+            'phone': 'phone',
+            'source': 'source',
+            'created_at': 'created_at',
+            'last_interaction': 'last_interaction',
+            'status': 'status',
+            'notes': 'notes',
+        },
+        'date_column': 'created_at',
+    },
+}
+
+def build_export_query(dataset, columns=None, start_date=None, end_date=None):
+    """Build the SELECT for an export; end_date is inclusive"""
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    spec = EXPORT_DATASETS[dataset]
+    columns = list(columns or spec['columns'])
+    unknown = [col for col in columns if col not in spec['columns']]
+    if unknown:
+        raise ValueError(f"Unknown columns for {dataset}: {', '.join(unknown)}")
+
+    date_column = spec['date_column']
+    where, params = [], []
+    if start_date:
+        where.append(f"{date_column} >= date(?)")
+        params.append(str(start_date))
+    if end_date:
+        where.append(f"{date_column} < date(?, '+1 day')")
+        params.append(str(end_date))
+
+    # Column names come from the whitelist above, never from user input
+    query = f"SELECT {', '.join(columns)} FROM {dataset}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY {date_column} DESC"
+    headers = [spec['columns'][col] for col in columns]
+    return query, params, headers
+
+def iter_export_chunks(dataset, columns=None, start_date=None, end_date=None,
+                       chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield (headers, rows) chunks of at most chunk_size rows"""
+    query, params, headers = build_export_query(dataset, columns, start_date, end_date)
+    # Include rows still sitting in the write-behind queue
+    flush_pending_writes()
+    with get_connection() as conn:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield headers, rows
+        cursor.close()
+
+def _write_csv(chunks, binary_stream, headers):
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
+    writer = csv.writer(text_stream)
+    writer.writerow(headers)
+    count = 0
+    for _, rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    text_stream.flush()
+    text_stream.detach()
+    return count
+
+def export_column_types(dataset, columns=None):
+    """Declared SQLite types of the exported columns, in export order"""
+    spec = EXPORT_DATASETS[dataset]
+    columns = list(columns or spec['columns'])
+    with get_connection() as conn:
+        # dataset is whitelisted by build_export_query before we get here
+        declared = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({dataset})")}
+    return [declared.get(col, '') for col in columns]
+
+def _arrow_type(declared_type):
+    # SQLite affinity rules; DATETIME columns hold CURRENT_TIMESTAMP text
+    declared_type = declared_type.upper()
+    if 'INT' in declared_type:
+        return pa.int64()
+    if any(name in declared_type for name in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    return pa.string()
+
+def _write_parquet(chunks, binary_stream, headers, column_types):
+    # The schema comes from the table definition, not from the first chunk,
+    # so a chunk whose column happens to be all NULL cannot pin it to `null`
+    schema = pa.schema([(name, _arrow_type(declared))
+                        for name, declared in zip(headers, column_types)])
+    count = 0
+    with pq.ParquetWriter(binary_stream, schema) as writer:
+        for _, rows in chunks:
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array([row[i] for row in rows], type=field.type)
+                 for i, field in enumerate(schema)],
+                schema=schema,
+            )
+            writer.write_batch(batch)
+            count += len(rows)
+    return count
+
+def export_dataset(dataset, destination, fmt='csv', columns=None, start_date=None,
+                   end_date=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream a table to a path or binary file object; returns rows written"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == 'parquet' and not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    _, _, headers = build_export_query(dataset, columns, start_date, end_date)
+    chunks = iter_export_chunks(dataset, columns, start_date, end_date, chunk_size)
+
+    owns_stream = isinstance(destination, (str, os.PathLike))
+    stream = open(destination, 'wb') if owns_stream else destination
+    try:
+        if fmt == 'parquet':
+            column_types = export_column_types(dataset, columns)
+            return _write_parquet(chunks, stream, headers, column_types)
+        if fmt == 'csv.gz':
+            with gzip.GzipFile(fileobj=stream, mode='wb') as gz_stream:
+                return _write_csv(chunks, gz_stream, headers)
+        return _write_csv(chunks, stream, headers)
+    finally:
+        chunks.close()
+        if owns_stream:
+            stream.close()
+
+def default_export_filename(dataset, fmt='csv'):
+    """File name used by the dashboard downloads and the nightly dump"""
+    extension, _ = EXPORT_FORMATS[fmt]
+    return f"{dataset}_{datetime.now().strftime('%Y%m%d')}{extension}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dataset', choices=sorted(EXPORT_DATASETS))
+    parser.add_argument('--format', dest='fmt', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--columns', help='comma-separated column names (default: all)')
+    parser.add_argument('--since', help='first day to include, YYYY-MM-DD')
+    parser.add_argument('--until', help='last day to include, YYYY-MM-DD')
+    parser.add_argument('--output', help='output path (default: dated file name)')
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    columns = [col.strip() for col in args.columns.split(',')] if args.columns else None
+    output = args.output or default_export_filename(args.dataset, args.fmt)
+
+    start = time.perf_counter()
+    try:
+        count = export_dataset(args.dataset, output, args.fmt, columns,
+                               args.since, args.until, args.chunk_size)
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
+    print(f"✅ Exported {count} {args.dataset} rows to {output} "
+          f"in {time.perf_counter() - start:.2f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""Online backups of the RoamGenie database.
+
+Snapshots are taken with the SQLite backup API, which copies a consistent
+view of the database (WAL contents included) while other connections keep
+reading and writing. Full backups store the whole snapshot; incremental
+backups store only the pages that changed since the previous backup in
+the chain, found by comparing per-page hashes. Every backup gets a JSON
+manifest next to it describing the chain, sizes, checksums and timings.
+
+    python db_backup.py full
+    python db_backup.py incremental
+    python db_backup.py verify roamgenie_backup_20250101_120000_000000.db.gz
+    python db_backup.py restore roamgenie_incr_20250101_130000_000000.pages.gz
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Optional
+
+import db_utils
+
+BACKUP_DIR = os.environ.get('ROAMGENIE_BACKUP_DIR', 'backups')
+BACKUP_PAGES_PER_STEP = int(os.environ.get('ROAMGENIE_BACKUP_PAGES_PER_STEP', 256))
+BACKUP_STEP_SLEEP_MS = float(os.environ.get('ROAMGENIE_BACKUP_STEP_SLEEP_MS', 5))
+BACKUP_RETENTION = int(os.environ.get('ROAMGENIE_BACKUP_RETENTION', 7))
+BACKUP_MAX_RESTARTS = 3
+
+FULL_PREFIX = 'roamgenie_backup_'
+INCREMENTAL_PREFIX = 'roamgenie_incr_'
+MANIFEST_SUFFIX = '.json'
+PAGE_HASHES_SUFFIX = '.pagehashes'
+PAGE_RECORD = struct.Struct('>I')
+PAGE_HASH_SIZE = 8
+COPY_CHUNK_SIZE = 1024 * 1024
+
+@dataclass
+class BackupResult:
+    """Manifest of one backup file plus how long each phase took"""
+    name: str
+    kind: str
+    created_at: str
+    page_size: int
+    page_count: int
+    pages_written: int
+    size_bytes: int
+    sha256: str
+    compressed: bool
+    base: Optional[str] = None
+    verified: Optional[bool] = None
+    timings: dict = field(default_factory=dict)
+
+    @property
+    def path(self):
+        return os.path.join(BACKUP_DIR, self.name)
+
+class _TooManyRestarts(Exception):
+    pass
+
+# Timings of the most recent backup/verify/restore, shown on the System page
+_last_operations = {}
+
+# ============= SNAPSHOTS =============
+
+def snapshot_database(target_path, pages_per_step=BACKUP_PAGES_PER_STEP,
+                      step_sleep_ms=BACKUP_STEP_SLEEP_MS):
+    """Copy the live database into target_path with the online backup API"""
+    # Queued rows belong in the snapshot
+    db_utils.flush_pending_writes()
+    state = {'steps': 0, 'restarts': 0, 'remaining': None}
+
+    def progress(status, remaining, total):
+        # Sleeping between steps releases the source read lock so writers
+        # and checkpoints are not starved during a long copy.
+        state['steps'] += 1
+        if state['remaining'] is not None and remaining > state['remaining']:
+            # A write from another connection restarted the copy
+            state['restarts'] += 1
+            if state['restarts'] > BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        if step_sleep_ms:
+            time.sleep(step_sleep_ms / 1000.0)
+
+    start = time.perf_counter()
+    with db_utils.get_connection() as source:
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=pages_per_step, progress=progress)
+            except _TooManyRestarts:
+                # Busy writers keep restarting the paged copy. Under WAL a
+                # single step only holds a read snapshot, so writers still
+                # proceed while it runs.
+                source.backup(target, pages=-1)
+            page_size = target.execute("PRAGMA page_size").fetchone()[0]
+            page_count = target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
+
+    return {
+        'page_size': page_size,
+        'page_count': page_count,
+        'steps': state['steps'],
+        'restarts': state['restarts'],
+        'seconds': time.perf_counter() - start,
+    }
+
+def _iter_pages(path, page_size):
+    with open(path, 'rb') as f:
+        page_number = 1
+        while True:
+            page = f.read(page_size)
+            if not page:
+                break
+            yield page_number, page
+            page_number += 1
+
+def _hash_page(page):
+    return hashlib.blake2b(page, digest_size=PAGE_HASH_SIZE).digest()
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _open_output(path, compressed):
+    return gzip.open(path, 'wb', compresslevel=6) if compressed else open(path, 'wb')
+
+def _open_input(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+def _integrity_check(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+# ============= MANIFESTS =============
+
+def _manifest_path(name):
+    return os.path.join(BACKUP_DIR, name + MANIFEST_SUFFIX)
+
+def _write_manifest(result):
+    with open(_manifest_path(result.name), 'w') as f:
+        json.dump(asdict(result), f, indent=2)
+
+def load_manifest(name):
+    """Load the manifest of a backup by file name"""
+    with open(_manifest_path(name)) as f:
+        return BackupResult(**json.load(f))
+
+def list_backups():
+    """All backups in BACKUP_DIR, newest first"""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    backups = []
+    for entry in os.listdir(BACKUP_DIR):
+        if entry.endswith(MANIFEST_SUFFIX):
+            try:
+                backups.append(load_manifest(entry[:-len(MANIFEST_SUFFIX)]))
+            except Exception as e:
+                print(f"Skipping unreadable backup manifest {entry}: {e}")
+    return sorted(backups, key=lambda backup: backup.created_at, reverse=True)
+
+def _backup_chain(name):
+    """Manifests from the full backup up to `name`, oldest first"""
+    chain = [load_manifest(name)]
+    while chain[0].base:
+        chain.insert(0, load_manifest(chain[0].base))
+    if chain[0].kind != 'full':
+        raise ValueError(f"Backup chain for {name} does not start with a full backup")
+    return chain
+
+# ============= BACKUP / VERIFY / RESTORE =============
+
+def create_backup(kind='full', compress=True, verify=True,
+                  pages_per_step=BACKUP_PAGES_PER_STEP, step_sleep_ms=BACKUP_STEP_SLEEP_MS,
+                  retention=BACKUP_RETENTION):
+    """Take a full or incremental online backup and return its manifest"""
+    if kind not in ('full', 'incremental'):
+        raise ValueError(f"Unsupported backup kind: {kind}")
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+
+    base = None
+    if kind == 'incremental':
+        # Chain onto the most recent backup; without one, fall back to full
+        base = next(iter(list_backups()), None)
+        if base is None:
+            kind = 'full'
+
+    started = time.perf_counter()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    if kind == 'full':
+        name = f"{FULL_PREFIX}{timestamp}.db" + ('.gz' if compress else '')
+    else:
+        name = f"{INCREMENTAL_PREFIX}{timestamp}.pages" + ('.gz' if compress else '')
+    path = os.path.join(BACKUP_DIR, name)
+
+    with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as work_dir:
+        snapshot_path = os.path.join(work_dir, 'snapshot.db')
+        snapshot = snapshot_database(snapshot_path, pages_per_step, step_sleep_ms)
+        page_size = snapshot['page_size']
+
+        # Hash every page so the next incremental can diff against this one
+        write_start = time.perf_counter()
+        base_hashes = b''
+        if base is not None:
+            with open(os.path.join(BACKUP_DIR, base.name + PAGE_HASHES_SUFFIX), 'rb') as f:
+                base_hashes = f.read()
+            if base.page_size != page_size:
+                raise ValueError("Page size changed since the last backup; take a full backup")
+
+        hashes = bytearray()
+        pages_written = 0
+        with _open_output(path, compress) as out:
+            for page_number, page in _iter_pages(snapshot_path, page_size):
+                page_hash = _hash_page(page)
+                hashes += page_hash
+                if kind == 'full':
+                    out.write(page)
+                    pages_written += 1
+                    continue
+                offset = (page_number - 1) * PAGE_HASH_SIZE
+                if base_hashes[offset:offset + PAGE_HASH_SIZE] != page_hash:
+                    out.write(PAGE_RECORD.pack(page_number))
+                    out.write(page)
+                    pages_written += 1
+        with open(path + PAGE_HASHES_SUFFIX, 'wb') as f:
+            f.write(hashes)
+        write_seconds = time.perf_counter() - write_start
+
+        result = BackupResult(
+            name=name,
+            kind=kind,
+            created_at=datetime.now().isoformat(timespec='microseconds'),
+            page_size=page_size,
+            page_count=snapshot['page_count'],
+            pages_written=pages_written,
+            size_bytes=os.path.getsize(path),
+            sha256=_file_sha256(snapshot_path),
+            compressed=compress,
+            base=base.name if base is not None else None,
+            timings={
+                'snapshot_seconds': round(snapshot['seconds'], 4),
+                'snapshot_steps': snapshot['steps'],
+                'snapshot_restarts': snapshot['restarts'],
+                'write_seconds': round(write_seconds, 4),
+            },
+        )
+        _write_manifest(result)
+
+    if verify:
+        verify_start = time.perf_counter()
+        result.verified = verify_backup(name)['ok']
+        result.timings['verify_seconds'] = round(time.perf_counter() - verify_start, 4)
+    result.timings['total_seconds'] = round(time.perf_counter() - started, 4)
+    _write_manifest(result)
+
+    if retention:
+        rotate_backups(retention)
+    _last_operations['backup'] = asdict(result)
+    return result
+
+def materialize_backup(name, target_path):
+    """Rebuild the database file a backup describes by replaying its chain"""
+    chain = _backup_chain(name)
+    with open(target_path, 'wb') as out:
+        for backup in chain:
+            source_path = os.path.join(BACKUP_DIR, backup.name)
+            with _open_input(source_path) as f:
+                if backup.kind == 'full':
+                    shutil.copyfileobj(f, out, COPY_CHUNK_SIZE)
+                    continue
+                while True:
+                    header = f.read(PAGE_RECORD.size)
+                    if not header:
+                        break
+                    page_number, = PAGE_RECORD.unpack(header)
+                    out.seek((page_number - 1) * backup.page_size)
+                    out.write(f.read(backup.page_size))
+            # The database may have shrunk (e.g. after VACUUM)
+            out.truncate(backup.page_count * backup.page_size)
+    return chain[-1]
+
+def verify_backup(name):
+    """Rebuild a backup in a temp file and check its checksum and integrity"""
+    start = time.perf_counter()
+    report = {'name': name, 'ok': False, 'checksum_ok': False, 'integrity': None}
+    with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as work_dir:
+        restored_path = os.path.join(work_dir, 'verify.db')
+        try:
+            manifest = materialize_backup(name, restored_path)
+            report['checksum_ok'] = _file_sha256(restored_path) == manifest.sha256
+            report['integrity'] = _integrity_check(restored_path)
+            report['ok'] = report['checksum_ok'] and report['integrity'] == 'ok'
+        except Exception as e:
+            report['error'] = str(e)
+    report['seconds'] = round(time.perf_counter() - start, 4)
+    _last_operations['verify'] = report
+    return report
+
+def restore_backup(name, pages_per_step=BACKUP_PAGES_PER_STEP):
+    """Replace the live database contents with a verified backup"""
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as work_dir:
+        restored_path = os.path.join(work_dir, 'restore.db')
+        manifest = materialize_backup(name, restored_path)
+        if _file_sha256(restored_path) != manifest.sha256:
+            raise ValueError(f"Checksum mismatch for backup {name}")
+        integrity = _integrity_check(restored_path)
+        if integrity != 'ok':
+            raise ValueError(f"Backup {name} failed integrity check: {integrity}")
+
+        # Copy into the live file through SQLite, so pooled connections see
+        # the restored pages instead of a file swapped underneath them
+        db_utils.flush_pending_writes()
+        source = sqlite3.connect(restored_path)
+        try:
+            with db_utils.get_connection() as live:
+                source.backup(live, pages=pages_per_step)
+                db_utils.run_migrations(live)
+        finally:
+            source.close()
+
+    db_utils.clear_analytics_cache()
+    db_utils.invalidate_tables('flight_searches', 'contacts', 'events', 'system_metrics')
+    report = {'name': name, 'seconds': round(time.perf_counter() - start, 4)}
+    _last_operations['restore'] = report
+    return report
+
+def rotate_backups(keep=BACKUP_RETENTION):
+    """Keep the newest `keep` full backups and the incrementals built on them"""
+    backups = list_backups()
+    kept = set()
+    fulls_seen = 0
+    for backup in backups:
+        if backup.kind == 'full':
+            fulls_seen += 1
+            if fulls_seen > keep:
+                continue
+            kept.add(backup.name)
+
+    # An incremental survives only if its whole chain survives
+    for backup in reversed(backups):
+        if backup.kind == 'incremental' and backup.base in kept:
+            kept.add(backup.name)
+
+    removed = []
+    for backup in backups:
+        if backup.name in kept:
+            continue
+        for suffix in ('', MANIFEST_SUFFIX, PAGE_HASHES_SUFFIX):
+            try:
+                os.remove(os.path.join(BACKUP_DIR, backup.name + suffix))
+            except FileNotFoundError:
+                pass
+        removed.append(backup.name)
+    return removed
+
+def get_backup_stats():
+    """Recent backup timings and on-disk totals for the System page"""
+    backups = list_backups()
+    return {
+        'backup_dir': BACKUP_DIR,
+        'count': len(backups),
+        'total_size_mb': round(sum(backup.size_bytes for backup in backups) / (1024 * 1024), 2),
+        'latest': asdict(backups[0]) if backups else None,
+        'last_operations': dict(_last_operations),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for kind in ('full', 'incremental'):
+        sub = subparsers.add_parser(kind, help=f'take a {kind} backup')
+        sub.add_argument('--no-compress', action='store_true')
+        sub.add_argument('--no-verify', action='store_true')
+        sub.add_argument('--retention', type=int, default=BACKUP_RETENTION)
+    subparsers.add_parser('list', help='list backups')
+    for command in ('verify', 'restore'):
+        subparsers.add_parser(command, help=f'{command} a backup').add_argument('name')
+    args = parser.parse_args(argv)
+
+    if args.command in ('full', 'incremental'):
+        result = create_backup(args.command, compress=not args.no_compress,
+                               verify=not args.no_verify, retention=args.retention)
+        print(f"✅ {result.kind} backup {result.path}: {result.pages_written}/{result.page_count} pages, "
+              f"{result.size_bytes / 1024:.1f} KB in {result.timings['total_seconds']:.2f}s")
+        return 0 if result.verified is not False else 1
+    if args.command == 'list':
+        for backup in list_backups():
+            print(f"{backup.created_at}  {backup.kind:<11}  {backup.size_bytes:>12,}  {backup.name}")
+        return 0
+    if args.command == 'verify':
+        report = verify_backup(args.name)
+        print(json.dumps(report, indent=2))
+        return 0 if report['ok'] else 1
+    report = restore_backup(args.name)
+    print(f"✅ Restored {args.name} in {report['seconds']:.2f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
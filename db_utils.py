@@ -1,296 +1,1132 @@
 import sqlite3
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
+import os
+import queue
+import threading
+import atexit
+import time
+import re
+import copy
+import functools
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+import dataclasses
+from dataclasses import dataclass
+from typing import Optional
+
+DB_PATH = os.environ.get('ROAMGENIE_DB_PATH', 'roamgenie.db')
+
+# ============= CONNECTION MANAGEMENT =============
+
+# Pragmas applied once per pooled connection. WAL lets readers run alongside
+# the single writer, and synchronous=NORMAL only fsyncs at checkpoints.
+CONNECTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,        # ~16 MB page cache per connection
+    'mmap_size': 268435456,      # 256 MB memory-mapped I/O
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+class ConnectionPool:
+    """Thread-aware pool of long-lived SQLite connections"""
+
+    def __init__(self, db_path=DB_PATH, max_size=8, timeout=30.0, statement_cache_size=256):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _create_connection(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+        )
+        for pragma, value in CONNECTION_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self.max_size:
+                conn = self._create_connection()
+                self._all.append(conn)
+                return conn
+
+        # Pool exhausted: wait for another thread to hand a connection back
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"connection pool exhausted: no connection released within {self.timeout} seconds"
+            ) from None
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; nested use on the same thread reuses it"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def close_all(self):
+        """Close every pooled connection (used on shutdown and path changes)"""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+            for conn in self._all:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._all = []
+
+    def stats(self):
+        """Return pool size information"""
+        return {
+            'db_path': self.db_path,
+            'open_connections': len(self._all),
+            'idle_connections': self._idle.qsize(),
+            'max_size': self.max_size,
+        }
+
+_pool = ConnectionPool()
+atexit.register(_pool.close_all)
+
+def get_connection():
+    """Context manager yielding a pooled connection to the RoamGenie database"""
+    return _pool.connection()
+
+def get_pool_stats():
+    """Get connection pool statistics"""
+    return _pool.stats()
+
+# ============= WRITE-BEHIND QUEUE =============
+
+# Durability knobs. Rows wait in memory for at most WRITE_FLUSH_INTERVAL_MS
+# before being committed, so that is the window lost on a hard crash.
+# WRITE_SYNCHRONOUS=FULL additionally fsyncs every committed batch.
+WRITE_BEHIND_ENABLED = os.environ.get('ROAMGENIE_WRITE_BEHIND', '1') != '0'
+WRITE_BATCH_SIZE = int(os.environ.get('ROAMGENIE_WRITE_BATCH_SIZE', 200))
+WRITE_FLUSH_INTERVAL_MS = int(os.environ.get('ROAMGENIE_WRITE_FLUSH_MS', 250))
+WRITE_QUEUE_MAX = int(os.environ.get('ROAMGENIE_WRITE_QUEUE_MAX', 10000))
+WRITE_SYNCHRONOUS = os.environ.get('ROAMGENIE_WRITE_SYNCHRONOUS', 'NORMAL')
+
+class WriteBehindQueue:
+    """Background writer that commits buffered INSERTs in batched transactions"""
+
+    def __init__(self, pool, batch_size=WRITE_BATCH_SIZE, flush_interval_ms=WRITE_FLUSH_INTERVAL_MS,
+                 max_pending=WRITE_QUEUE_MAX, put_timeout=0.5, synchronous=WRITE_SYNCHRONOUS):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.put_timeout = put_timeout
+        self.synchronous = synchronous
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # The writer thread and submitting threads both update the counters
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'sync_fallbacks': 0,
+            'errors': 0,
+        }
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name='roamgenie-db-writer', daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, sql, params):
+        """Queue a write; blocks briefly when full, then writes inline"""
+        self.start()
+        try:
+            self._queue.put((sql, params), timeout=self.put_timeout)
+            with self._stats_lock:
+                self.stats['enqueued'] += 1
+        except queue.Full:
+            # Backpressure: never drop a row, pay for the write on this thread instead
+            with self._stats_lock:
+                self.stats['sync_fallbacks'] += 1
+            with self.pool.connection() as conn:
+                self._write_batch(conn, [(sql, params)])
+
+    def _run(self):
+        conn = self.pool._create_connection()
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+
+                batch = [first]
+                deadline = time.monotonic() + self.flush_interval
+                # A flush marker (sql None) ends the batch early
+                while len(batch) < self.batch_size and batch[-1][0] is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                try:
+                    self._write_items(conn, batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            conn.close()
+
+    def _write_items(self, conn, items):
+        # Rows are committed before any flush marker queued behind them is released
+        rows = [item for item in items if item[0] is not None]
+        try:
+            if rows:
+                self._write_batch(conn, rows)
+        finally:
+            for sql, marker in items:
+                if sql is None:
+                    marker.set()
+
+    def _write_batch(self, conn, batch):
+        try:
+            with conn:
+                # Group consecutive rows for the same statement into executemany calls
+                start = 0
+                while start < len(batch):
+                    sql = batch[start][0]
+                    end = start
+                    while end < len(batch) and batch[end][0] == sql:
+                        end += 1
+                    conn.executemany(sql, [params for _, params in batch[start:end]])
+                    start = end
+            invalidate_tables(*_tables_written(sql for sql, _ in batch))
+            with self._stats_lock:
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+        except sqlite3.Error as e:
+            if len(batch) == 1:
+                with self._stats_lock:
+                    self.stats['errors'] += 1
+                print(f"⚠️ Warning: Dropped queued write: {e}")
+                return
+            # Retry row by row so one bad row does not lose the whole batch
+            for item in batch:
+                self._write_batch(conn, [item])
+
+    def flush(self):
+        """Block until every row queued before this call has been committed"""
+        if self._thread is not None and self._thread.is_alive():
+            # Wait for a marker instead of queue.join(), which never returns
+            # while other threads keep submitting
+            marker = threading.Event()
+            self._queue.put((None, marker))
+            while not marker.wait(self.flush_interval):
+                if not self._thread.is_alive():
+                    self._drain_inline()
+                    break
+        else:
+            self._drain_inline()
+
+    def _drain_inline(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        if batch:
+            with self.pool.connection() as conn:
+                self._write_items(conn, batch)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the writer thread after flushing everything still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._drain_inline()
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['pending'] = self._queue.qsize()
+        return stats
+
+_write_queue = WriteBehindQueue(_pool)
+atexit.register(_write_queue.shutdown)
+
+def _submit_write(sql, params):
+    if WRITE_BEHIND_ENABLED:
+        _write_queue.submit(sql, params)
+    else:
+        with get_connection() as conn:
+            conn.execute(sql, params)
+            conn.commit()
+        invalidate_tables(*_tables_written([sql]))
+
+def flush_pending_writes():
+    """Commit all buffered log writes now"""
+    _write_queue.flush()
+
+def get_write_queue_stats():
+    """Get write-behind queue statistics"""
+    return _write_queue.get_stats()
+
+# ============= ANALYTICS CACHE =============
+
+# Process-wide, so every Streamlit session shares one result per query.
+# Entries are keyed by the generation of the tables they read; writers bump
+# those generations, which makes older entries unreachable immediately.
+# The TTL covers time-relative queries ('now') and other processes' writes.
+ANALYTICS_CACHE_ENABLED = os.environ.get('ROAMGENIE_ANALYTICS_CACHE', '1') != '0'
+ANALYTICS_CACHE_TTL = float(os.environ.get('ROAMGENIE_ANALYTICS_CACHE_TTL', 60))
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.environ.get('ROAMGENIE_ANALYTICS_CACHE_MAX', 256))
+
+class AnalyticsCache:
+    """TTL + LRU cache for analytics reads with generation-based invalidation"""
+
+    def __init__(self, max_entries=ANALYTICS_CACHE_MAX_ENTRIES, default_ttl=ANALYTICS_CACHE_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expirations': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+    def generation(self, tables):
+        with self._lock:
+            return tuple(self._generations[table] for table in tables)
+
+    def bump(self, *tables):
+        with self._lock:
+            for table in tables:
+                self._generations[table] += 1
+                self.stats['invalidations'] += 1
+
+    def _lookup(self, key):
+        # Caller holds self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats['expirations'] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return True, value
+
+    def get_or_compute(self, key, compute, ttl=None):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # One computation per key: concurrent viewers wait for the first one
+        with key_lock:
+            with self._lock:
+                found, value = self._lookup(key)
+                if found:
+                    return value
+                self.stats['misses'] += 1
+
+            stored = False
+            try:
+                value = compute()
+                # Store and retire the key lock together, so a caller arriving
+                # in between cannot start a second computation
+                with self._lock:
+                    ttl = self.default_ttl if ttl is None else ttl
+                    self._entries[key] = (time.monotonic() + ttl, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.stats['evictions'] += 1
+                    self._key_locks.pop(key, None)
+                    stored = True
+            finally:
+                if not stored:
+                    with self._lock:
+                        self._key_locks.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+_analytics_cache = AnalyticsCache()
+
+_WRITE_TABLE_PATTERN = re.compile(r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|UPDATE|DELETE\s+FROM)\s+(\w+)', re.IGNORECASE)
+
+def _tables_written(statements):
+    tables = set()
+    for sql in statements:
+        match = _WRITE_TABLE_PATTERN.match(sql)
+        if match:
+            tables.add(match.group(1))
+    return tables
+
+def invalidate_tables(*tables):
+    """Bump the cache generation of tables that were just written"""
+    if tables:
+        _analytics_cache.bump(*tables)
+
+def _copy_result(value):
+    # Callers mutate returned DataFrames (e.g. converting date columns)
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, (dict, list)):
+        return copy.copy(value)
+    if dataclasses.is_dataclass(value):
+        frames = {field.name: getattr(value, field.name).copy()
+                  for field in dataclasses.fields(value)
+                  if isinstance(getattr(value, field.name), pd.DataFrame)}
+        return dataclasses.replace(value, **frames) if frames else value
+    return value
+
+def cached_query(*tables, ttl=None):
+    """Cache a read function's result until TTL expiry or a write to `tables`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ANALYTICS_CACHE_ENABLED:
+                return func(*args, **kwargs)
+            key = (func.__name__, args, tuple(sorted(kwargs.items())),
+                   _analytics_cache.generation(tables))
+            value = _analytics_cache.get_or_compute(key, lambda: func(*args, **kwargs), ttl)
+            return _copy_result(value)
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def get_cache_stats():
+    """Get analytics cache hit/miss statistics"""
+    return _analytics_cache.get_stats()
+
+def clear_analytics_cache():
+    """Drop every cached analytics result"""
+    _analytics_cache.clear()
 
 def init_db():
     """Initialize database with all required tables"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
     
-    # Flight searches table (enhanced)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS flight_searches (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        # Flight searches table (enhanced)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS flight_searches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            departure_date TEXT NOT NULL,
+            return_date TEXT NOT NULL,
+            duration_days INTEGER,
+            budget_preference TEXT,
+            flight_class TEXT,
+            estimated_price REAL,
+            search_timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            user_session_id TEXT,
+            search_status TEXT DEFAULT 'completed'
+        )
+        ''')
+    
+        # Contacts table (enhanced)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            firstName TEXT NOT NULL,
+            secondName TEXT NOT NULL,
+            email TEXT NOT NULL UNIQUE,
+            phone TEXT,
+            source TEXT DEFAULT 'web_form',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_interaction DATETIME DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'active',
+            notes TEXT
+        )
+        ''')
+    
+        # Events/activity log table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            event_data TEXT,
+            user_identifier TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ip_address TEXT,
+            user_agent TEXT
+        )
+        ''')
+    
+        # System metrics table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            metric_name TEXT NOT NULL,
+            metric_value REAL NOT NULL,
+            metric_type TEXT DEFAULT 'counter',
+            recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            additional_data TEXT
+        )
+        ''')
+    
+        conn.commit()
+
+        # Bring older databases up to the current schema (indexes etc.)
+        run_migrations(conn)
+
+# ============= SEARCH ROLLUPS =============
+
+# Pre-aggregated counters for the dashboard. Triggers on flight_searches keep
+# them in step with every insert/update/delete inside the same transaction,
+# so the get_* analytics read a few thousand rollup rows instead of the raw
+# table. NULL budget/class are stored as char(0) so they can be part of the
+# key without being confused with a genuine empty-string preference.
+ROLLUP_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS search_rollup_daily (
+        day TEXT NOT NULL,
         origin TEXT NOT NULL,
         destination TEXT NOT NULL,
-        departure_date TEXT NOT NULL,
-        return_date TEXT NOT NULL,
-        duration_days INTEGER,
-        budget_preference TEXT,
-        flight_class TEXT,
-        estimated_price REAL,
-        search_timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        user_session_id TEXT,
-        search_status TEXT DEFAULT 'completed'
+        budget_preference TEXT NOT NULL,
+        flight_class TEXT NOT NULL,
+        search_count INTEGER NOT NULL DEFAULT 0,
+        duration_sum REAL NOT NULL DEFAULT 0,
+        duration_count INTEGER NOT NULL DEFAULT 0,
+        price_sum REAL NOT NULL DEFAULT 0,
+        price_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, origin, destination, budget_preference, flight_class)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS search_rollup_hourly (
+        day TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        search_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, hour)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS search_rollup_duration (
+        day TEXT NOT NULL,
+        duration_days INTEGER NOT NULL,
+        search_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, duration_days)
+    ) WITHOUT ROWID
+    ''',
+]
+
+def _rollup_upsert_sql(row, sign):
+    """Statements adding (sign=1) or removing (sign=-1) one search row"""
+    return [
+        f'''
+        INSERT INTO search_rollup_daily
+        (day, origin, destination, budget_preference, flight_class, search_count,
+         duration_sum, duration_count, price_sum, price_count)
+        SELECT date({row}.created_at), {row}.origin, {row}.destination,
+               COALESCE({row}.budget_preference, char(0)), COALESCE({row}.flight_class, char(0)), {sign},
+               {sign} * COALESCE({row}.duration_days, 0), {sign} * ({row}.duration_days IS NOT NULL),
+               {sign} * COALESCE({row}.estimated_price, 0), {sign} * ({row}.estimated_price IS NOT NULL)
+        WHERE true
+        ON CONFLICT (day, origin, destination, budget_preference, flight_class) DO UPDATE SET
+            search_count = search_count + excluded.search_count,
+            duration_sum = duration_sum + excluded.duration_sum,
+            duration_count = duration_count + excluded.duration_count,
+            price_sum = price_sum + excluded.price_sum,
+            price_count = price_count + excluded.price_count;
+        ''',
+        f'''
+        INSERT INTO search_rollup_hourly (day, hour, search_count)
+        SELECT date({row}.created_at), CAST(strftime('%H', {row}.created_at) AS INTEGER), {sign}
+        WHERE true
+        ON CONFLICT (day, hour) DO UPDATE SET
+            search_count = search_count + excluded.search_count;
+        ''',
+        f'''
+        INSERT INTO search_rollup_duration (day, duration_days, search_count)
+        SELECT date({row}.created_at), {row}.duration_days, {sign}
+        WHERE {row}.duration_days IS NOT NULL
+        ON CONFLICT (day, duration_days) DO UPDATE SET
+            search_count = search_count + excluded.search_count;
+        ''',
+    ]
+
+ROLLUP_TRIGGER_NAMES = [
+    'trg_flight_searches_rollup_insert',
+    'trg_flight_searches_rollup_delete',
+    'trg_flight_searches_rollup_update',
+]
+
+ROLLUP_TRIGGERS = [
+    f'CREATE TRIGGER IF NOT EXISTS {ROLLUP_TRIGGER_NAMES[0]} '
+    'AFTER INSERT ON flight_searches BEGIN '
+    + ''.join(_rollup_upsert_sql('NEW', 1)) + ' END',
+    f'CREATE TRIGGER IF NOT EXISTS {ROLLUP_TRIGGER_NAMES[1]} '
+    'AFTER DELETE ON flight_searches BEGIN '
+    + ''.join(_rollup_upsert_sql('OLD', -1)) + ' END',
+    f'CREATE TRIGGER IF NOT EXISTS {ROLLUP_TRIGGER_NAMES[2]} '
+    'AFTER UPDATE ON flight_searches BEGIN '
+    + ''.join(_rollup_upsert_sql('OLD', -1) + _rollup_upsert_sql('NEW', 1)) + ' END',
+]
+
+# Full recomputation from the raw table, used for backfill and compaction
+ROLLUP_REBUILD = [
+    "DELETE FROM search_rollup_daily",
+    "DELETE FROM search_rollup_hourly",
+    "DELETE FROM search_rollup_duration",
+    '''
+    INSERT INTO search_rollup_daily
+    (day, origin, destination, budget_preference, flight_class, search_count,
+     duration_sum, duration_count, price_sum, price_count)
+    SELECT date(created_at), origin, destination,
+           COALESCE(budget_preference, char(0)), COALESCE(flight_class, char(0)), COUNT(*),
+           COALESCE(SUM(duration_days), 0), COUNT(duration_days),
+           COALESCE(SUM(estimated_price), 0), COUNT(estimated_price)
+    FROM flight_searches
+    GROUP BY 1, 2, 3, 4, 5
+    ''',
+    '''
+    INSERT INTO search_rollup_hourly (day, hour, search_count)
+    SELECT date(created_at), CAST(strftime('%H', created_at) AS INTEGER), COUNT(*)
+    FROM flight_searches
+    GROUP BY 1, 2
+    ''',
+    '''
+    INSERT INTO search_rollup_duration (day, duration_days, search_count)
+    SELECT date(created_at), duration_days, COUNT(*)
+    FROM flight_searches
+    WHERE duration_days IS NOT NULL
+    GROUP BY 1, 2
+    ''',
+]
+
+def rebuild_search_rollups():
+    """Recompute all search rollups from flight_searches (compaction job)"""
+    flush_pending_writes()
+    start = time.perf_counter()
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in ROLLUP_REBUILD:
+                conn.execute(statement)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    invalidate_tables('flight_searches')
+    return time.perf_counter() - start
+
+# ============= CONTACT SEARCH =============
+
+# External-content FTS5 index over contacts. Triggers mirror every insert,
+# update and delete (including log_enhanced_contact's upsert path), and the
+# prefix indexes make 2-3 character prefix queries index lookups.
+CONTACTS_FTS = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+        firstName, secondName, email, phone,
+        content='contacts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
     )
-    ''')
-    
-    # Contacts table (enhanced)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS contacts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        firstName TEXT NOT NULL,
-        secondName TEXT NOT NULL,
-        email TEXT NOT NULL UNIQUE,
-        phone TEXT,
-        source TEXT DEFAULT 'web_form',
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_contacts_fts_insert AFTER INSERT ON contacts BEGIN
+        INSERT INTO contacts_fts (rowid, firstName, secondName, email, phone)
+        VALUES (NEW.id, NEW.firstName, NEW.secondName, NEW.email, NEW.phone);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_contacts_fts_delete AFTER DELETE ON contacts BEGIN
+        INSERT INTO contacts_fts (contacts_fts, rowid, firstName, secondName, email, phone)
+        VALUES ('delete', OLD.id, OLD.firstName, OLD.secondName, OLD.email, OLD.phone);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_contacts_fts_update AFTER UPDATE ON contacts BEGIN
+        INSERT INTO contacts_fts (contacts_fts, rowid, firstName, secondName, email, phone)
+        VALUES ('delete', OLD.id, OLD.firstName, OLD.secondName, OLD.email, OLD.phone);
+        INSERT INTO contacts_fts (rowid, firstName, secondName, email, phone)
+        VALUES (NEW.id, NEW.firstName, NEW.secondName, NEW.email, NEW.phone);
+    END
+    ''',
+    # Backfill existing contacts
+    "INSERT INTO contacts_fts (contacts_fts) VALUES ('rebuild')",
+]
+
+CONTACT_SORT_ORDERS = {
+    'relevance': 'rank, c.created_at DESC',
+    'created_at': 'c.created_at DESC, c.id DESC',
+    'name': 'c.firstName COLLATE NOCASE, c.secondName COLLATE NOCASE, c.id',
+    'email': 'c.email, c.id',
+}
+
+@dataclass
+class ContactSearchPage:
+    """One page of contact search results plus the total match count"""
+    rows: pd.DataFrame
+    total_count: int = 0
+    page: int = 1
+    # None when every match is on one page
+    page_size: Optional[int] = 25
+
+def build_contact_match_query(text):
+    """Turn free text into an FTS5 query where every word is a prefix match"""
+    terms = re.findall(r'\w+', text or '')
+    return ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+@cached_query('contacts')
+def count_contacts(text=''):
+    """Number of contacts matching a search (every contact when text is empty)"""
+    match = build_contact_match_query(text)
+    with get_connection() as conn:
+        if match:
+            return conn.execute(
+                "SELECT COUNT(*) FROM contacts_fts WHERE contacts_fts MATCH ?", (match,)
+            ).fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+def search_contacts(text='', sort_by='relevance', page=1, page_size=25):
+    """Full-text search over names, email and phone with ranking and paging
+
+    page_size=None returns every match on one page; pages past the end are
+    clamped to the last page.
+    """
+    match = build_contact_match_query(text)
+    if sort_by not in CONTACT_SORT_ORDERS:
+        raise ValueError(f"Unsupported sort order: {sort_by}")
+    if not match and sort_by == 'relevance':
+        sort_by = 'created_at'
+    total_count = count_contacts(text)
+    last_page = max(1, -(-total_count // page_size)) if page_size else 1
+    page = min(max(int(page), 1), last_page)
+    # LIMIT -1 is SQLite for "no limit"
+    limit = page_size or -1
+    offset = (page - 1) * page_size if page_size else 0
+
+    with get_connection() as conn:
+        if match:
+            rows = pd.read_sql_query(f'''
+            SELECT c.*, contacts_fts.rank AS rank
+            FROM contacts_fts
+            JOIN contacts c ON c.id = contacts_fts.rowid
+            WHERE contacts_fts MATCH ?
+            ORDER BY {CONTACT_SORT_ORDERS[sort_by]}
+            LIMIT ? OFFSET ?
+            ''', conn, params=[match, limit, offset])
+        else:
+            rows = pd.read_sql_query(f'''
+            SELECT c.* FROM contacts c
+            ORDER BY {CONTACT_SORT_ORDERS[sort_by]}
+            LIMIT ? OFFSET ?
+            ''', conn, params=[limit, offset])
+
+    return ContactSearchPage(rows=rows, total_count=total_count, page=page, page_size=page_size)
+
+# ============= PLAN JOBS =============
+
+# Queue store for background travel plan generation (see plan_jobs.py).
+# The partial unique index lets only one queued/running job exist per
+# request key, which is how identical in-flight requests are deduplicated.
+PLAN_JOBS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS plan_jobs (
+        id TEXT PRIMARY KEY,
+        request_key TEXT NOT NULL,
+        request TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        stage TEXT,
+        partial TEXT,
+        result TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        worker_id TEXT,
+        heartbeat_at REAL,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        last_interaction DATETIME DEFAULT CURRENT_TIMESTAMP,
-        status TEXT DEFAULT 'active',
-        notes TEXT
+        started_at DATETIME,
+        finished_at DATETIME
     )
-    ''')
-    
-    # Events/activity log table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS events (
+    ''',
+    '''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_plan_jobs_active_request
+    ON plan_jobs (request_key) WHERE status IN ('queued', 'running')
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_plan_jobs_status_created ON plan_jobs (status, created_at)",
+]
+
+# ============= CRM OUTBOX =============
+
+# Transactional outbox for CRM sync (see crm_outbox.py). A row is written in
+# the same transaction as the contact it describes, so a lead is never saved
+# without its CRM delivery being recorded, and vice versa.
+CRM_OUTBOX_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS crm_outbox (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        event_type TEXT NOT NULL,
-        event_data TEXT,
-        user_identifier TEXT,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        contact_id INTEGER,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        claimed_until REAL,
+        last_error TEXT,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        ip_address TEXT,
-        user_agent TEXT
-    )
-    ''')
-    
-    # System metrics table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS system_metrics (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        metric_name TEXT NOT NULL,
-        metric_value REAL NOT NULL,
-        metric_type TEXT DEFAULT 'counter',
-        recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        additional_data TEXT
+        sent_at DATETIME
     )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_crm_outbox_status_due ON crm_outbox (status, next_attempt_at)",
+]
+
+# ============= SCHEMA MIGRATIONS =============
+
+# Ordered (version, description, statements). The applied version is kept in
+# PRAGMA user_version, so append new entries here and never edit old ones.
+SCHEMA_MIGRATIONS = [
+    (1, 'covering indexes for analytics access paths', [
+        # Date-range counts and AVG(duration_days) over a window
+        "CREATE INDEX IF NOT EXISTS idx_flight_searches_created_at "
+        "ON flight_searches(created_at, duration_days)",
+        # GROUP BY destination / origin, optionally restricted by date
+        "CREATE INDEX IF NOT EXISTS idx_flight_searches_destination "
+        "ON flight_searches(destination, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_flight_searches_origin "
+        "ON flight_searches(origin, created_at)",
+        # Budget / class distributions
+        "CREATE INDEX IF NOT EXISTS idx_flight_searches_budget "
+        "ON flight_searches(budget_preference, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_flight_searches_class "
+        "ON flight_searches(flight_class, created_at)",
+        # ORDER BY created_at DESC LIMIT ? and 24h counts on contacts
+        "CREATE INDEX IF NOT EXISTS idx_contacts_created_at "
+        "ON contacts(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_events_type_created_at "
+        "ON events(event_type, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_system_metrics_name_recorded_at "
+        "ON system_metrics(metric_name, recorded_at)",
+    ]),
+    (2, 'incrementally maintained search rollup tables',
+        ROLLUP_TABLES + ROLLUP_TRIGGERS + ROLLUP_REBUILD),
+    (3, 'FTS5 full-text index over contacts', CONTACTS_FTS),
+    (4, 'background plan job queue', PLAN_JOBS_SCHEMA),
+    (5, 'CRM sync outbox', CRM_OUTBOX_SCHEMA),
+    (6, "rollups key NULL budget/class as char(0) instead of ''",
+        [f"DROP TRIGGER IF EXISTS {name}" for name in ROLLUP_TRIGGER_NAMES]
+        + ROLLUP_TRIGGERS + ROLLUP_REBUILD),
+    (7, 'CRM outbox claim tokens', [
+        # Identifies the dispatcher holding a row, so an expired claim
+        # cannot write over the row after another dispatcher took it
+        "ALTER TABLE crm_outbox ADD COLUMN claim_token TEXT",
+    ]),
+]
+
+def get_schema_version(conn=None):
+    """Get the schema version recorded in the database"""
+    if conn is None:
+        with get_connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations(conn):
+    """Apply pending schema migrations in place; returns the versions applied"""
+    applied = []
+    for version, description, statements in SCHEMA_MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+
+        # IMMEDIATE takes the write lock up front, so two processes starting
+        # together cannot both apply the same migration
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+        print(f"✅ Applied schema migration {version}: {description}")
+
+    if applied:
+        # Refresh planner statistics so the new indexes get used
+        conn.execute("PRAGMA optimize")
+    return applied
 
 # ============= ORIGINAL FUNCTIONS (Enhanced) =============
 
 def log_flight_search(origin, destination, departure_date, return_date, 
                      duration_days, budget_preference, flight_class, estimated_price=None):
     """Log flight search (original function enhanced)"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    _submit_write('''
     INSERT INTO flight_searches 
     (origin, destination, departure_date, return_date, duration_days, 
      budget_preference, flight_class, estimated_price)
     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     ''', (origin, destination, departure_date, return_date, duration_days,
           budget_preference, flight_class, estimated_price))
-    
-    conn.commit()
-    conn.close()
 
 def log_event(event_type, event_data=None, user_identifier=None):
     """Log system events"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    _submit_write('''
     INSERT INTO events (event_type, event_data, user_identifier)
     VALUES (?, ?, ?)
     ''', (event_type, str(event_data) if event_data else None, user_identifier))
-    
-    conn.commit()
-    conn.close()
 
+@cached_query('flight_searches')
 def get_total_searches_count():
     """Get total number of flight searches"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("SELECT COUNT(*) FROM flight_searches")
-    count = cursor.fetchone()[0]
-    
-    conn.close()
+        cursor.execute("SELECT COALESCE(SUM(search_count), 0) FROM search_rollup_daily")
+        count = cursor.fetchone()[0]
+
     return count
 
+@cached_query('flight_searches')
 def get_top_destinations(limit=10):
     """Get top destinations by search count"""
-    conn = sqlite3.connect('roamgenie.db')
+    with get_connection() as conn:
+        query = '''
+        SELECT destination, SUM(search_count) as count
+        FROM search_rollup_daily
+        GROUP BY destination
+        HAVING count > 0
+        ORDER BY count DESC
+        LIMIT ?
+        '''
     
-    query = '''
-    SELECT destination, COUNT(*) as count 
-    FROM flight_searches 
-    GROUP BY destination 
-    ORDER BY count DESC 
-    LIMIT ?
-    '''
-    
-    df = pd.read_sql_query(query, conn, params=[limit])
-    conn.close()
+        df = pd.read_sql_query(query, conn, params=[limit])
     return df
 
+@cached_query('flight_searches')
 def get_top_departures(limit=10):
     """Get top departure cities by search count"""
-    conn = sqlite3.connect('roamgenie.db')
-    
-    query = '''
-    SELECT origin, COUNT(*) as count 
-    FROM flight_searches 
-    GROUP BY origin 
-    ORDER BY count DESC 
-    LIMIT ?
-    '''
+    with get_connection() as conn:
+        query = '''
+        SELECT origin, SUM(search_count) as count
+        FROM search_rollup_daily
+        GROUP BY origin
+        HAVING count > 0
+        ORDER BY count DESC
+        LIMIT ?
+        '''
     
-    df = pd.read_sql_query(query, conn, params=[limit])
-    conn.close()
+        df = pd.read_sql_query(query, conn, params=[limit])
     return df
 
+@cached_query('flight_searches')
 def get_searches_over_time():
     """Get search counts over time"""
-    conn = sqlite3.connect('roamgenie.db')
-    
-    query = '''
-    SELECT DATE(created_at) as date, COUNT(*) as count 
-    FROM flight_searches 
-    GROUP BY DATE(created_at) 
-    ORDER BY date DESC
-    LIMIT 30
-    '''
-    
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    with get_connection() as conn:
+        query = '''
+        SELECT day as date, SUM(search_count) as count
+        FROM search_rollup_daily
+        GROUP BY day
+        HAVING count > 0
+        ORDER BY date DESC
+        LIMIT 30
+        '''
+    
+        df = pd.read_sql_query(query, conn)
     return df
 
+@cached_query('flight_searches')
 def fetch_recent_searches(limit=50):
     """Fetch recent flight searches"""
-    conn = sqlite3.connect('roamgenie.db')
+    with get_connection() as conn:
+        query = '''
+        SELECT * FROM flight_searches 
+        ORDER BY created_at DESC 
+        LIMIT ?
+        '''
     
-    query = '''
-    SELECT * FROM flight_searches 
-    ORDER BY created_at DESC 
-    LIMIT ?
-    '''
-    
-    df = pd.read_sql_query(query, conn, params=[limit])
-    conn.close()
+        df = pd.read_sql_query(query, conn, params=[limit])
     return df
 
+@cached_query('contacts')
 def fetch_contacts(limit=100):
     """Fetch contacts from CRM"""
-    conn = sqlite3.connect('roamgenie.db')
+    with get_connection() as conn:
+        query = '''
+        SELECT * FROM contacts 
+        ORDER BY created_at DESC 
+        LIMIT ?
+        '''
     
-    query = '''
-    SELECT * FROM contacts 
-    ORDER BY created_at DESC 
-    LIMIT ?
-    '''
-    
-    try:
-        df = pd.read_sql_query(query, conn, params=[limit])
-    except:
-        # If table doesn't exist or is empty, return empty DataFrame
-        df = pd.DataFrame()
+        try:
+            df = pd.read_sql_query(query, conn, params=[limit])
+        except:
+            # If table doesn't exist or is empty, return empty DataFrame
+            df = pd.DataFrame()
     
-    conn.close()
     return df
 
 # ============= NEW ENHANCED FUNCTIONS =============
 
+@cached_query('flight_searches')
 def get_recent_searches_count(days=7):
     """Get number of searches in last N days"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('''
-    SELECT COUNT(*) FROM flight_searches 
-    WHERE created_at >= date('now', '-{} days')
-    '''.format(days))
+        # Bound parameter keeps a single cached prepared statement for all N
+        cursor.execute('''
+        SELECT COALESCE(SUM(search_count), 0) FROM search_rollup_daily
+        WHERE day >= date('now', ?)
+        ''', (f'-{int(days)} days',))
     
-    count = cursor.fetchone()[0]
-    conn.close()
+        count = cursor.fetchone()[0]
     return count
 
+@cached_query('flight_searches')
 def get_average_trip_duration():
     """Get average trip duration"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("SELECT AVG(duration_days) FROM flight_searches WHERE duration_days IS NOT NULL")
-    avg_duration = cursor.fetchone()[0]
-    
-    conn.close()
+        cursor.execute('''
+        SELECT SUM(duration_sum) / NULLIF(SUM(duration_count), 0) FROM search_rollup_daily
+        ''')
+        avg_duration = cursor.fetchone()[0]
+
     return avg_duration if avg_duration else 0
 
-def get_budget_distribution():
-    """Get budget preference distribution"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    SELECT budget_preference, COUNT(*) as count 
-    FROM flight_searches 
-    WHERE budget_preference IS NOT NULL
-    GROUP BY budget_preference 
-    ORDER BY count DESC
-    ''')
-    
-    results = cursor.fetchall()
-    conn.close()
+@cached_query('flight_searches')
+def get_budget_distribution(days=None):
+    """Get budget preference distribution, optionally for the last N days"""
+    since = f'-{int(days)} days' if days else None
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+        SELECT budget_preference, SUM(search_count) as count
+        FROM search_rollup_daily
+        WHERE budget_preference != char(0)
+        AND (? IS NULL OR day >= date('now', ?))
+        GROUP BY budget_preference
+        HAVING count > 0
+        ORDER BY count DESC
+        ''', (since, since))
+    
+        results = cursor.fetchall()
     return results
 
-def get_class_distribution():
-    """Get flight class distribution"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    SELECT flight_class, COUNT(*) as count 
-    FROM flight_searches 
-    WHERE flight_class IS NOT NULL
-    GROUP BY flight_class 
-    ORDER BY count DESC
-    ''')
-    
-    results = cursor.fetchall()
-    conn.close()
+@cached_query('flight_searches')
+def get_class_distribution(days=None):
+    """Get flight class distribution, optionally for the last N days"""
+    since = f'-{int(days)} days' if days else None
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+        SELECT flight_class, SUM(search_count) as count
+        FROM search_rollup_daily
+        WHERE flight_class != char(0)
+        AND (? IS NULL OR day >= date('now', ?))
+        GROUP BY flight_class
+        HAVING count > 0
+        ORDER BY count DESC
+        ''', (since, since))
+    
+        results = cursor.fetchall()
     return results
 
+@cached_query('flight_searches')
 def get_monthly_searches():
     """Get searches for current month"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('''
-    SELECT COUNT(*) FROM flight_searches 
-    WHERE created_at >= date('now', 'start of month')
-    ''')
+        cursor.execute('''
+        SELECT COALESCE(SUM(search_count), 0) FROM search_rollup_daily
+        WHERE day >= date('now', 'start of month')
+        ''')
     
-    count = cursor.fetchone()[0]
-    conn.close()
+        count = cursor.fetchone()[0]
     return count
 
+@cached_query('flight_searches')
 def get_weekly_growth_rate():
     """Calculate weekly growth rate"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
-    
-    # This week
-    cursor.execute('''
-    SELECT COUNT(*) FROM flight_searches 
-    WHERE created_at >= date('now', '-7 days')
-    ''')
-    this_week = cursor.fetchone()[0]
-    
-    # Last week
-    cursor.execute('''
-    SELECT COUNT(*) FROM flight_searches 
-    WHERE created_at >= date('now', '-14 days') 
-    AND created_at < date('now', '-7 days')
-    ''')
-    last_week = cursor.fetchone()[0]
-    
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute('''
+        SELECT
+            COALESCE(SUM(CASE WHEN day >= date('now', '-7 days') THEN search_count END), 0),
+            COALESCE(SUM(CASE WHEN day < date('now', '-7 days') THEN search_count END), 0)
+        FROM search_rollup_daily
+        WHERE day >= date('now', '-14 days')
+        ''')
+        this_week, last_week = cursor.fetchone()
     
     if last_week == 0:
         return 0
@@ -298,91 +1134,125 @@ def get_weekly_growth_rate():
     growth_rate = ((this_week - last_week) / last_week) * 100
     return growth_rate
 
+@cached_query('flight_searches')
+def get_hourly_distribution(days=90):
+    """Get search counts by hour of day for the last N days"""
+    with get_connection() as conn:
+        query = '''
+        SELECT hour as hour_of_day, SUM(search_count) as count
+        FROM search_rollup_hourly
+        WHERE day >= date('now', ?)
+        GROUP BY hour
+        HAVING count > 0
+        ORDER BY hour
+        '''
+
+        df = pd.read_sql_query(query, conn, params=[f'-{int(days)} days'])
+    return df
+
+@cached_query('flight_searches')
+def get_duration_distribution(days=90):
+    """Get search counts by trip duration for the last N days"""
+    with get_connection() as conn:
+        query = '''
+        SELECT duration_days, SUM(search_count) as count
+        FROM search_rollup_duration
+        WHERE day >= date('now', ?)
+        GROUP BY duration_days
+        HAVING count > 0
+        ORDER BY duration_days
+        '''
+
+        df = pd.read_sql_query(query, conn, params=[f'-{int(days)} days'])
+    return df
+
 def fetch_all_searches():
     """Fetch all flight searches for export"""
-    conn = sqlite3.connect('roamgenie.db')
-    
-    query = '''
-    SELECT 
-        origin as "Departure City",
-        destination as "Destination",
-        departure_date as "Departure Date",
-        return_date as "Return Date",
-        duration_days as "Trip Duration (Days)",
-        budget_preference as "Budget Preference",
-        flight_class as "Flight Class",
-        estimated_price as "Estimated Price",
-        created_at as "Search Date"
-    FROM flight_searches 
-    ORDER BY created_at DESC
-    '''
-    
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    with get_connection() as conn:
+        query = '''
+        SELECT 
+            origin as "Departure City",
+            destination as "Destination",
+            departure_date as "Departure Date",
+            return_date as "Return Date",
+            duration_days as "Trip Duration (Days)",
+            budget_preference as "Budget Preference",
+            flight_class as "Flight Class",
+            estimated_price as "Estimated Price",
+            created_at as "Search Date"
+        FROM flight_searches 
+        ORDER BY created_at DESC
+        '''
+    
+        df = pd.read_sql_query(query, conn)
     return df
 
+@cached_query('flight_searches', 'contacts')
 def generate_analytics_summary():
     """Generate analytics summary for export"""
-    conn = sqlite3.connect('roamgenie.db')
-    
-    # Summary statistics
-    summary_data = []
-    
-    # Total searches
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM flight_searches")
-    total_searches = cursor.fetchone()[0]
-    summary_data.append(["Total Flight Searches", total_searches])
-    
-    # Total contacts
-    cursor.execute("SELECT COUNT(*) FROM contacts")
-    total_contacts = cursor.fetchone()[0]
-    summary_data.append(["Total CRM Contacts", total_contacts])
-    
-    # Top destination
-    cursor.execute('''
-    SELECT destination, COUNT(*) as count 
-    FROM flight_searches 
-    GROUP BY destination 
-    ORDER BY count DESC 
-    LIMIT 1
-    ''')
-    top_dest = cursor.fetchone()
-    if top_dest:
-        summary_data.append(["Top Destination", f"{top_dest[0]} ({top_dest[1]} searches)"])
-    
-    # Top departure
-    cursor.execute('''
-    SELECT origin, COUNT(*) as count 
-    FROM flight_searches 
-    GROUP BY origin 
-    ORDER BY count DESC 
-    LIMIT 1
-    ''')
-    top_origin = cursor.fetchone()
-    if top_origin:
-        summary_data.append(["Top Departure City", f"{top_origin[0]} ({top_origin[1]} searches)"])
-    
-    # Most popular budget
-    cursor.execute('''
-    SELECT budget_preference, COUNT(*) as count 
-    FROM flight_searches 
-    WHERE budget_preference IS NOT NULL
-    GROUP BY budget_preference 
-    ORDER BY count DESC 
-    LIMIT 1
-    ''')
-    top_budget = cursor.fetchone()
-    if top_budget:
-        summary_data.append(["Most Popular Budget", f"{top_budget[0]} ({top_budget[1]} searches)"])
-    
-    # Average trip duration
-    cursor.execute("SELECT AVG(duration_days) FROM flight_searches WHERE duration_days IS NOT NULL")
-    avg_duration = cursor.fetchone()[0]
-    if avg_duration:
-        summary_data.append(["Average Trip Duration", f"{avg_duration:.1f} days"])
-    
-    conn.close()
+    with get_connection() as conn:
+        # Summary statistics
+        summary_data = []
+    
+        # Total searches
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(SUM(search_count), 0) FROM search_rollup_daily")
+        total_searches = cursor.fetchone()[0]
+        summary_data.append(["Total Flight Searches", total_searches])
+    
+        # Total contacts
+        cursor.execute("SELECT COUNT(*) FROM contacts")
+        total_contacts = cursor.fetchone()[0]
+        summary_data.append(["Total CRM Contacts", total_contacts])
+    
+        # Top destination
+        cursor.execute('''
+        SELECT destination, SUM(search_count) as count
+        FROM search_rollup_daily
+        GROUP BY destination
+        HAVING count > 0
+        ORDER BY count DESC
+        LIMIT 1
+        ''')
+        top_dest = cursor.fetchone()
+        if top_dest:
+            summary_data.append(["Top Destination", f"{top_dest[0]} ({top_dest[1]} searches)"])
+    
+        # Top departure
+        cursor.execute('''
+        SELECT origin, SUM(search_count) as count
+        FROM search_rollup_daily
+        GROUP BY origin
+        HAVING count > 0
+        ORDER BY count DESC
+        LIMIT 1
+        ''')
+        top_origin = cursor.fetchone()
+        if top_origin:
+            summary_data.append(["Top Departure City", f"{top_origin[0]} ({top_origin[1]} searches)"])
+    
+        # Most popular budget
+        cursor.execute('''
+        SELECT budget_preference, SUM(search_count) as count
+        FROM search_rollup_daily
+        WHERE budget_preference != char(0)
+        GROUP BY budget_preference
+        HAVING count > 0
+        ORDER BY count DESC
+        LIMIT 1
+        ''')
+        top_budget = cursor.fetchone()
+        if top_budget:
+            summary_data.append(["Most Popular Budget", f"{top_budget[0]} ({top_budget[1]} searches)"])
+    
+        # Average trip duration
+        cursor.execute('''
+        SELECT SUM(duration_sum) / NULLIF(SUM(duration_count), 0) FROM search_rollup_daily
+        ''')
+        avg_duration = cursor.fetchone()[0]
+        if avg_duration:
+            summary_data.append(["Average Trip Duration", f"{avg_duration:.1f} days"])
+    
     
     # Convert to DataFrame and then CSV
     df = pd.DataFrame(summary_data, columns=["Metric", "Value"])
@@ -394,116 +1264,278 @@ def log_enhanced_flight_search(origin, destination, departure_date, return_date,
                              duration_days, budget_preference, flight_class, 
                              estimated_price=None, user_session_id=None):
     """Enhanced flight search logging with session tracking"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    _submit_write('''
     INSERT INTO flight_searches 
     (origin, destination, departure_date, return_date, duration_days, 
      budget_preference, flight_class, estimated_price, user_session_id)
     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (origin, destination, departure_date, return_date, duration_days,
           budget_preference, flight_class, estimated_price, user_session_id))
-    
-    conn.commit()
-    conn.close()
 
-def log_enhanced_contact(firstName, secondName, email, phone, source='web_form'):
-    """Enhanced contact logging with duplicate handling"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
+def log_enhanced_contact(firstName, secondName, email, phone, source='web_form', crm_payload=None):
+    """Enhanced contact logging with duplicate handling (and an optional CRM outbox row)"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        cursor.execute('''
-        INSERT INTO contacts (firstName, secondName, email, phone, source)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (firstName, secondName, email, phone, source))
-        
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        # Email already exists, update instead
-        cursor.execute('''
-        UPDATE contacts 
-        SET firstName=?, secondName=?, phone=?, last_interaction=CURRENT_TIMESTAMP
-        WHERE email=?
-        ''', (firstName, secondName, phone, email))
+        try:
+            cursor.execute('''
+            INSERT INTO contacts (firstName, secondName, email, phone, source)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (firstName, secondName, email, phone, source))
+            created = True
+            contact_id = cursor.lastrowid
+        except sqlite3.IntegrityError:
+            existing = cursor.execute("SELECT id FROM contacts WHERE email=?", (email,)).fetchone()
+            if existing is None:
+                # Not a duplicate email (e.g. a missing required field)
+                raise
+            # Email already exists, update instead
+            cursor.execute('''
+            UPDATE contacts 
+            SET firstName=?, secondName=?, phone=?, last_interaction=CURRENT_TIMESTAMP
+            WHERE email=?
+            ''', (firstName, secondName, phone, email))
+            created = False
+            contact_id = existing[0]
+
+        if crm_payload is not None:
+            # Same transaction as the contact: both are saved or neither is
+            cursor.execute('''
+            INSERT INTO crm_outbox (idempotency_key, contact_id, payload)
+            VALUES (?, ?, ?)
+            ''', (uuid.uuid4().hex, contact_id, json.dumps(crm_payload)))
+
         conn.commit()
-        return False
-    finally:
-        conn.close()
+        invalidate_tables('contacts')
+        return created
 
+@cached_query('flight_searches')
 def get_flight_analytics():
     """Get comprehensive flight analytics for admin dashboard"""
-    conn = sqlite3.connect('roamgenie.db')
-    
-    query = '''
-    SELECT 
-        fs.*,
-        DATE(fs.created_at) as search_date,
-        strftime('%Y-%m', fs.created_at) as search_month,
-        strftime('%w', fs.created_at) as day_of_week,
-        strftime('%H', fs.created_at) as hour_of_day
-    FROM flight_searches fs 
-    WHERE fs.created_at >= date('now', '-90 days')
-    ORDER BY fs.created_at DESC
-    '''
-    
-    df = pd.read_sql_query(query, conn)
+    with get_connection() as conn:
+        query = '''
+        SELECT 
+            fs.*,
+            DATE(fs.created_at) as search_date,
+            strftime('%Y-%m', fs.created_at) as search_month,
+            strftime('%w', fs.created_at) as day_of_week,
+            strftime('%H', fs.created_at) as hour_of_day
+        FROM flight_searches fs 
+        WHERE fs.created_at >= date('now', '-90 days')
+        ORDER BY fs.created_at DESC
+        '''
+    
+        df = pd.read_sql_query(query, conn)
     
     if not df.empty:
         df['created_at'] = pd.to_datetime(df['created_at'])
         df['search_date'] = pd.to_datetime(df['search_date'])
     
-    conn.close()
     return df
 
+FLIGHT_SEARCH_COLUMNS = [
+    'id', 'origin', 'destination', 'departure_date', 'return_date',
+    'duration_days', 'budget_preference', 'flight_class', 'estimated_price',
+    'created_at'
+]
+
+# Sortable columns must be NOT NULL so (column, id) is a total keyset order
+FLIGHT_SEARCH_SORT_COLUMNS = ('created_at', 'departure_date')
+
+@dataclass
+class FlightSearchPage:
+    """One page of filtered flight searches plus totals for the whole filter"""
+    rows: pd.DataFrame
+    total_count: int = 0
+    avg_duration: Optional[float] = None
+    avg_price: Optional[float] = None
+    next_cursor: Optional[tuple] = None
+
+@cached_query('flight_searches')
+def get_flight_filter_options(days=90):
+    """Get distinct origin/destination/budget/class values for the filter widgets"""
+    since = f'-{int(days)} days'
+    options = {}
+    with get_connection() as conn:
+        # The rollup primary key already holds every distinct combination
+        for column in ('origin', 'destination', 'budget_preference', 'flight_class'):
+            rows = conn.execute(f'''
+            SELECT DISTINCT {column} FROM search_rollup_daily
+            WHERE day >= date('now', ?) AND {column} != char(0)
+            ORDER BY {column}
+            ''', (since,)).fetchall()
+            options[column] = [row[0] for row in rows]
+    return options
+
+@cached_query('flight_searches')
+def query_flight_searches(origin=None, destination=None, budget_preference=None,
+                          flight_class=None, days=90, sort_by='created_at',
+                          descending=True, page_size=50, cursor=None):
+    """Filter, sort and keyset-paginate flight searches inside SQLite
+
+    `cursor` is the `next_cursor` of the previous page, or None for the first.
+    """
+    if sort_by not in FLIGHT_SEARCH_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {sort_by}")
+
+    conditions = []
+    params = []
+    if days:
+        conditions.append("created_at >= date('now', ?)")
+        params.append(f'-{int(days)} days')
+    for column, value in (('origin', origin), ('destination', destination),
+                          ('budget_preference', budget_preference),
+                          ('flight_class', flight_class)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    where = ' AND '.join(conditions) or '1'
+
+    direction = 'DESC' if descending else 'ASC'
+    page_conditions = [where]
+    page_params = list(params)
+    if cursor is not None:
+        page_conditions.append(f"({sort_by}, id) {'<' if descending else '>'} (?, ?)")
+        page_params.extend(cursor)
+
+    with get_connection() as conn:
+        total_count, avg_duration, avg_price = conn.execute(f'''
+        SELECT COUNT(*), AVG(duration_days), AVG(estimated_price)
+        FROM flight_searches WHERE {where}
+        ''', params).fetchone()
+
+        rows = pd.read_sql_query(f'''
+        SELECT {', '.join(FLIGHT_SEARCH_COLUMNS)}
+        FROM flight_searches
+        WHERE {' AND '.join(page_conditions)}
+        ORDER BY {sort_by} {direction}, id {direction}
+        LIMIT ?
+        ''', conn, params=page_params + [page_size])
+
+    next_cursor = None
+    if len(rows) == page_size:
+        last = rows.iloc[-1]
+        next_cursor = (last[sort_by], int(last['id']))
+
+    return FlightSearchPage(
+        rows=rows,
+        total_count=total_count,
+        avg_duration=avg_duration,
+        avg_price=avg_price,
+        next_cursor=next_cursor,
+    )
+
+@cached_query('flight_searches', 'contacts')
 def get_admin_summary_stats():
     """Get summary statistics for admin dashboard"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
-    
-    stats = {}
-    
-    # Total counts
-    cursor.execute("SELECT COUNT(*) FROM flight_searches")
-    stats['total_searches'] = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM contacts")
-    stats['total_contacts'] = cursor.fetchone()[0]
-    
-    # Recent activity (last 24 hours)
-    cursor.execute("""
-    SELECT COUNT(*) FROM flight_searches 
-    WHERE created_at >= datetime('now', '-1 day')
-    """)
-    stats['searches_24h'] = cursor.fetchone()[0]
-    
-    cursor.execute("""
-    SELECT COUNT(*) FROM contacts 
-    WHERE created_at >= datetime('now', '-1 day')
-    """)
-    stats['contacts_24h'] = cursor.fetchone()[0]
-    
-    # Top destinations this month
-    cursor.execute("""
-    SELECT destination, COUNT(*) as count 
-    FROM flight_searches 
-    WHERE created_at >= date('now', 'start of month')
-    GROUP BY destination 
-    ORDER BY count DESC 
-    LIMIT 5
-    """)
-    stats['top_destinations'] = cursor.fetchall()
-    
-    # Average trip duration
-    cursor.execute("SELECT AVG(duration_days) FROM flight_searches WHERE duration_days IS NOT NULL")
-    avg_duration = cursor.fetchone()[0]
-    stats['avg_trip_duration'] = round(avg_duration, 1) if avg_duration else 0
-    
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+    
+        stats = {}
+    
+        # Total counts
+        cursor.execute("SELECT COALESCE(SUM(search_count), 0) FROM search_rollup_daily")
+        stats['total_searches'] = cursor.fetchone()[0]
+    
+        cursor.execute("SELECT COUNT(*) FROM contacts")
+        stats['total_contacts'] = cursor.fetchone()[0]
+    
+        # Recent activity (last 24 hours)
+        cursor.execute("""
+        SELECT COUNT(*) FROM flight_searches 
+        WHERE created_at >= datetime('now', '-1 day')
+        """)
+        stats['searches_24h'] = cursor.fetchone()[0]
+    
+        cursor.execute("""
+        SELECT COUNT(*) FROM contacts 
+        WHERE created_at >= datetime('now', '-1 day')
+        """)
+        stats['contacts_24h'] = cursor.fetchone()[0]
+    
+        # Top destinations this month
+        cursor.execute("""
+        SELECT destination, SUM(search_count) as count
+        FROM search_rollup_daily
+        WHERE day >= date('now', 'start of month')
+        GROUP BY destination
+        HAVING count > 0
+        ORDER BY count DESC
+        LIMIT 5
+        """)
+        stats['top_destinations'] = cursor.fetchall()
+    
+        # Average trip duration
+        cursor.execute('''
+        SELECT SUM(duration_sum) / NULLIF(SUM(duration_count), 0) FROM search_rollup_daily
+        ''')
+        avg_duration = cursor.fetchone()[0]
+        stats['avg_trip_duration']= round(avg_duration, 1) if avg_duration else 0
+
     return stats
 
+@dataclass
+class OverviewStats:
+    """Every KPI shown on the admin Overview page"""
+    total_searches: int = 0
+    total_contacts: int = 0
+    searches_24h: int = 0
+    contacts_24h: int = 0
+    searches_7d: int = 0
+    searches_prev_7d: int = 0
+    searches_this_month: int = 0
+    avg_trip_duration: float = 0.0
+    top_budget: Optional[str] = None
+    top_class: Optional[str] = None
+
+    @property
+    def weekly_growth_rate(self):
+        if self.searches_prev_7d == 0:
+            return 0
+        return ((self.searches_7d - self.searches_prev_7d) / self.searches_prev_7d) * 100
+
+@cached_query('flight_searches', 'contacts')
+def get_overview_stats():
+    """Compute all Overview KPIs in one statement using conditional aggregation"""
+    # Everything but the 24h window comes from the daily rollup; the 24h
+    # count is an index range scan over the last day of raw rows only.
+    query = '''
+    SELECT
+        COALESCE(SUM(search_count), 0),
+        (SELECT COUNT(*) FROM flight_searches
+         WHERE created_at >= datetime('now', '-1 day')),
+        COALESCE(SUM(CASE WHEN day >= date('now', '-7 days') THEN search_count END), 0),
+        COALESCE(SUM(CASE WHEN day >= date('now', '-14 days')
+                          AND day < date('now', '-7 days') THEN search_count END), 0),
+        COALESCE(SUM(CASE WHEN day >= date('now', 'start of month') THEN search_count END), 0),
+        SUM(duration_sum) / NULLIF(SUM(duration_count), 0),
+        (SELECT COUNT(*) FROM contacts),
+        (SELECT COUNT(*) FROM contacts
+         WHERE created_at >= datetime('now', '-1 day')),
+        (SELECT budget_preference FROM search_rollup_daily
+         WHERE budget_preference != char(0)
+         GROUP BY budget_preference ORDER BY SUM(search_count) DESC LIMIT 1),
+        (SELECT flight_class FROM search_rollup_daily
+         WHERE flight_class != char(0)
+         GROUP BY flight_class ORDER BY SUM(search_count) DESC LIMIT 1)
+    FROM search_rollup_daily
+    '''
+    with get_connection() as conn:
+        row = conn.execute(query).fetchone()
+
+    return OverviewStats(
+        total_searches=row[0],
+        searches_24h=row[1],
+        searches_7d=row[2],
+        searches_prev_7d=row[3],
+        searches_this_month=row[4],
+        avg_trip_duration=round(row[5], 1) if row[5] else 0.0,
+        total_contacts=row[6],
+        contacts_24h=row[7],
+        top_budget=row[8],
+        top_class=row[9],
+    )
+
 def initialize_admin_system():
     """Initialize the complete system"""
     init_db()
@@ -521,110 +1553,70 @@ except Exception as e:
 
 # ============= UTILITY FUNCTIONS =============
 
-def backup_database():
-    """Create a backup of the database"""
-    import shutil
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_name = f"roamgenie_backup_{timestamp}.db"
+def backup_database(kind='full'):
+    """Take an online backup of the database; returns the backup path"""
+    from db_backup import create_backup
     
     try:
-        shutil.copy('roamgenie.db', backup_name)
-        return backup_name
+        return create_backup(kind).path
     except Exception as e:
         print(f"Backup failed: {e}")
         return None
 
 def get_database_info():
     """Get database information and statistics"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
-    
-    info = {}
-    
-    # Get table names
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [row[0] for row in cursor.fetchall()]
-    info['tables'] = tables
-    
-    # Get row counts for each table
-    table_counts = {}
-    for table in tables:
-        cursor.execute(f"SELECT COUNT(*) FROM {table}")
-        table_counts[table] = cursor.fetchone()[0]
-    info['table_counts'] = table_counts
-    
-    # Database file size
-    import os
-    if os.path.exists('roamgenie.db'):
-        info['file_size_mb'] = round(os.path.getsize('roamgenie.db') / (1024*1024), 2)
-    
-    conn.close()
-    return info
-def get_database_info():
-    """Get database information and statistics"""
-    conn = sqlite3.connect('roamgenie.db')
-    cursor = conn.cursor()
-    
-    info = {}
-    
-    # Get table names
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [row[0] for row in cursor.fetchall()]
-    info['tables'] = tables
-    
-    # Get row counts for each table
-    table_counts = {}
-    for table in tables:
-        try:
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            table_counts[table] = cursor.fetchone()[0]
-        except:
-            table_counts[table] = 0
-    info['table_counts'] = table_counts
-    
-    # Database file size
-    import os
-    if os.path.exists('roamgenie.db'):
-        info['file_size_mb'] = round(os.path.getsize('roamgenie.db') / (1024*1024), 2)
-    else:
-        info['file_size_mb'] = 0
-    
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+    
+        info = {}
+    
+        # Get table names
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        tables = [row[0] for row in cursor.fetchall()]
+        info['tables'] = tables
+    
+        # Get row counts for each table
+        table_counts = {}
+        for table in tables:
+            try:
+                cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                table_counts[table] = cursor.fetchone()[0]
+            except:
+                table_counts[table] = 0
+        info['table_counts'] = table_counts
+    
+        # Database file size
+        if os.path.exists(DB_PATH):
+            info['file_size_mb'] = round(os.path.getsize(DB_PATH) / (1024*1024), 2)
+        else:
+            info['file_size_mb'] = 0
+    
+    info['schema_version'] = get_schema_version()
+    info['connection_pool'] = get_pool_stats()
+    info['write_queue'] = get_write_queue_stats()
+    info['analytics_cache'] = get_cache_stats()
     return info
 
-def backup_database():
-    """Create a backup of the database"""
-    import shutil
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_name = f"roamgenie_backup_{timestamp}.db"
-    
-    try:
-        shutil.copy('roamgenie.db', backup_name)
-        return backup_name
-    except Exception as e:
-        print(f"Backup failed: {e}")
-        return None
+@cached_query('flight_searches')
 def get_flight_analytic():
     """Get comprehensive flight analytics for admin dashboard"""
-    conn = sqlite3.connect('roamgenie.db')
-    
-    query = '''
-    SELECT 
-        fs.*,
-        DATE(fs.created_at) as search_date,
-        strftime('%Y-%m', fs.created_at) as search_month,
-        strftime('%w', fs.created_at) as day_of_week,
-        strftime('%H', fs.created_at) as hour_of_day
-    FROM flight_searches fs 
-    WHERE fs.created_at >= date('now', '-90 days')
-    ORDER BY fs.created_at DESC
-    '''
-    
-    df = pd.read_sql_query(query, conn)
+    with get_connection() as conn:
+        query = '''
+        SELECT 
+            fs.*,
+            DATE(fs.created_at) as search_date,
+            strftime('%Y-%m', fs.created_at) as search_month,
+            strftime('%w', fs.created_at) as day_of_week,
+            strftime('%H', fs.created_at) as hour_of_day
+        FROM flight_searches fs 
+        WHERE fs.created_at >= date('now', '-90 days')
+        ORDER BY fs.created_at DESC
+        '''
+    
+        df = pd.read_sql_query(query, conn)
     
     if not df.empty:
         df['created_at'] = pd.to_datetime(df['created_at'])
         df['search_date'] = pd.to_datetime(df['search_date'])
     
-    conn.close()
     return df
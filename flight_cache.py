@@ -0,0 +1,253 @@
+"""Persistent cache for SerpAPI Google Flights responses.
+
+Results are keyed by (departure_id, arrival_id, outbound_date, return_date,
+currency) and stored in a small SQLite file, so every Streamlit worker
+process shares them. Within the TTL a cached response is returned as is;
+for a further stale window it is still returned immediately while one
+background refresh fetches a new copy (stale-while-revalidate). Past that
+the caller fetches synchronously. The least recently used rows are evicted
+once the cache holds more than max_entries responses.
+
+The search client is injectable, so a local stub can stand in for SerpAPI:
+
+    cache = FlightResultCache(':memory:', search=lambda params: {...})
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    from serpapi import GoogleSearch
+except ImportError:
+    GoogleSearch = None
+
+from single_flight import SingleFlight, get_single_flight
+
+FLIGHT_CACHE_PATH = os.environ.get('ROAMGENIE_FLIGHT_CACHE_PATH', 'flight_cache.db')
+FLIGHT_CACHE_TTL = float(os.environ.get('ROAMGENIE_FLIGHT_CACHE_TTL', 30 * 60))
+FLIGHT_CACHE_STALE_TTL = float(os.environ.get('ROAMGENIE_FLIGHT_CACHE_STALE_TTL', 6 * 60 * 60))
+FLIGHT_CACHE_MAX_ENTRIES = int(os.environ.get('ROAMGENIE_FLIGHT_CACHE_MAX', 5000))
+
+FLIGHT_CACHE_KEY_FIELDS = ('departure_id', 'arrival_id', 'outbound_date', 'return_date', 'currency')
+
+# A refresh claimed by one worker is not retried by others for this long
+REFRESH_CLAIM_SECONDS = 60
+
+FLIGHT_CACHE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS flight_cache (
+    cache_key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    refresh_claimed_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_flight_cache_last_access ON flight_cache (last_access);
+'''
+
+def serpapi_search(params):
+    """Run a Google Flights search through the SerpAPI client"""
+    if GoogleSearch is None:
+        raise RuntimeError("google-search-results is not installed")
+    return GoogleSearch(params).get_dict()
+
+def flight_cache_key(params):
+    """Normalized cache key for a set of Google Flights search params"""
+    parts = []
+    for field in FLIGHT_CACHE_KEY_FIELDS:
+        value = str(params.get(field) or '').strip()
+        parts.append(value.upper() if field in ('departure_id', 'arrival_id', 'currency') else value)
+    return '|'.join(parts)
+
+class FlightResultCache:
+    """SQLite-backed TTL + LRU cache with stale-while-revalidate refreshes"""
+
+    def __init__(self, path=FLIGHT_CACHE_PATH, search=serpapi_search, ttl=FLIGHT_CACHE_TTL,
+                 stale_ttl=FLIGHT_CACHE_STALE_TTL, max_entries=FLIGHT_CACHE_MAX_ENTRIES, inflight=None):
+        self.path = path
+        self.search = search
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight = inflight or SingleFlight('flights')
+        self._refreshing = set()
+        self._shared_conn = None
+        # Script threads and refresh threads both update the counters
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'errors': 0,
+            'evictions': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _connection(self):
+        if self.path == ':memory:':
+            # One shared connection, otherwise each thread sees its own empty cache
+            with self._lock:
+                if self._shared_conn is None:
+                    self._shared_conn = self._create_connection()
+                return self._shared_conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._create_connection()
+            self._local.conn = conn
+        return conn
+
+    def _create_connection(self):
+        conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(FLIGHT_CACHE_SCHEMA)
+        return conn
+
+    def _read(self, key):
+        row = self._connection().execute(
+            "SELECT response, fetched_at FROM flight_cache WHERE cache_key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def _touch(self, key, now):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE flight_cache SET last_access = ?, hits = hits + 1 WHERE cache_key = ?",
+                (now, key),
+            )
+
+    def _store(self, key, response):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute('''
+            INSERT INTO flight_cache (cache_key, response, fetched_at, last_access)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                response = excluded.response,
+                fetched_at = excluded.fetched_at,
+                last_access = excluded.last_access,
+                refresh_claimed_until = 0
+            ''', (key, json.dumps(response), now, now))
+            evicted = conn.execute('''
+            DELETE FROM flight_cache WHERE cache_key IN (
+                SELECT cache_key FROM flight_cache
+                ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )
+            ''', (self.max_entries,)).rowcount
+        self._count('evictions', max(evicted, 0))
+
+    def _fetch(self, key, params):
+        response = self.search(params)
+        # SerpAPI reports failures in the body; never cache those
+        if isinstance(response, dict) and not response.get('error'):
+            self._store(key, response)
+        return response
+
+    def _claim_refresh(self, key, now):
+        # Only one worker process refreshes a stale key at a time
+        conn = self._connection()
+        with conn:
+            claimed = conn.execute('''
+            UPDATE flight_cache SET refresh_claimed_until = ?
+            WHERE cache_key = ? AND refresh_claimed_until < ?
+            ''', (now + REFRESH_CLAIM_SECONDS, key, now)).rowcount
+        return claimed == 1
+
+    def _refresh_in_background(self, key, params):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetch(key, params)
+                self._count('refreshes')
+            except Exception as e:
+                self._count('errors')
+                print(f"⚠️ Warning: Background flight refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name='roamgenie-flight-refresh', daemon=True).start()
+
+    def get(self, params):
+        """Return the search response for params, fetching only when needed"""
+        key = flight_cache_key(params)
+        now = time.time()
+        response, fetched_at = self._read(key)
+        if response is not None:
+            age = now - fetched_at
+            if age < self.ttl:
+                self._count('hits')
+                self._touch(key, now)
+                return response
+            if age < self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                self._touch(key, now)
+                if self._claim_refresh(key, now):
+                    self._refresh_in_background(key, params)
+                return response
+
+        # Miss: concurrent callers for the same route share one fetch,
+        # including its error response
+        return self._inflight.do(key, lambda: self._fetch_miss(key, params))
+
+    def _fetch_miss(self, key, params):
+        # Another worker process may have stored the route in the meantime
+        response, fetched_at = self._read(key)
+        if response is not None and time.time() - fetched_at < self.ttl:
+            self._count('hits')
+            return response
+        self._count('misses')
+        return self._fetch(key, params)
+
+    def invalidate(self, params=None):
+        """Drop one cached route, or everything when params is None"""
+        conn = self._connection()
+        with conn:
+            if params is None:
+                conn.execute("DELETE FROM flight_cache")
+            else:
+                conn.execute("DELETE FROM flight_cache WHERE cache_key = ?", (flight_cache_key(params),))
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['entries'] = self._connection().execute("SELECT COUNT(*) FROM flight_cache").fetchone()[0]
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['stale_hits']) / lookups if lookups else 0.0
+        return stats
+
+_flight_cache = None
+_flight_cache_lock = threading.Lock()
+
+def get_flight_cache():
+    """Process-wide flight cache backed by FLIGHT_CACHE_PATH"""
+    global _flight_cache
+    with _flight_cache_lock:
+        if _flight_cache is None:
+            _flight_cache = FlightResultCache(inflight=get_single_flight('flights'))
+        return _flight_cache
+
+def cached_flight_search(params):
+    """Google Flights search through the shared response cache"""
+    return get_flight_cache().get(params)
+
+def get_flight_cache_stats():
+    """Get flight response cache statistics"""
+    return get_flight_cache().get_stats()
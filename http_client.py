@@ -0,0 +1,283 @@
+"""Shared outbound HTTP client for webhooks and CRM calls.
+
+Every client keeps one pooled keep-alive requests.Session, uses tight
+connect/read timeouts, and retries transient failures with jittered
+exponential backoff. Each endpoint (scheme://host/path) has its own
+circuit breaker: after a run of failures the endpoint is skipped for a
+cool-down period, so a dead webhook fails fast instead of blocking the
+page. Per-endpoint latency histograms are kept for the System page.
+
+Retries only happen when they are safe. Idempotent methods are retried on
+any transient failure. POSTs are retried only when the request never
+reached the server (connect errors) or the server said so (429/503).
+
+    client = get_http_client('n8n')
+    response = client.post(url, json=payload)
+"""
+import bisect
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('ROAMGENIE_HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.environ.get('ROAMGENIE_HTTP_READ_TIMEOUT', 10))
+HTTP_MAX_RETRIES = int(os.environ.get('ROAMGENIE_HTTP_RETRIES', 2))
+HTTP_BACKOFF_BASE = 0.25
+HTTP_BACKOFF_MAX = 2.0
+HTTP_POOL_SIZE = int(os.environ.get('ROAMGENIE_HTTP_POOL_SIZE', 10))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('ROAMGENIE_HTTP_BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.environ.get('ROAMGENIE_HTTP_BREAKER_RESET', 30))
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+# Statuses that mean the server did not act on the request
+NOT_PROCESSED_STATUSES = frozenset([429, 503])
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an endpoint whose breaker is open"""
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cool-down"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a request may go out now; half-open lets a single probe through"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    return False
+                self.state = 'half_open'
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def retry_after(self):
+        """Seconds until the next probe is allowed (0 unless open)"""
+        with self._lock:
+            if self.state != 'open':
+                return 0.0
+            return max(self.reset_seconds - (time.monotonic() - self.opened_at), 0.0)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with approximate percentiles"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.total += 1
+            self.sum_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples"""
+        with self._lock:
+            if not self.total:
+                return None
+            target = fraction * self.total
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    return self.buckets[index] if index < len(self.buckets) else self.max_ms
+            return self.max_ms
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in self.buckets] + [f">{self.buckets[-1]}ms"]
+            return {
+                'count': self.total,
+                'avg_ms': self.sum_ms / self.total if self.total else 0.0,
+                'max_ms': self.max_ms,
+                'buckets': dict(zip(labels, self.counts)),
+            }
+
+def _never_sent(error):
+    """Whether a requests error happened before the request reached the server"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+def endpoint_key(url):
+    """Breaker/histogram key: scheme://host/path without the query string"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+class HttpClient:
+    """Pooled requests.Session with timeouts, jittered retries and per-endpoint breakers"""
+
+    def __init__(self, name, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 retries=HTTP_MAX_RETRIES, backoff_base=HTTP_BACKOFF_BASE, backoff_max=HTTP_BACKOFF_MAX,
+                 pool_size=HTTP_POOL_SIZE, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.session = requests.Session()
+        # Retries are handled here, so urllib3's own retry is disabled
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, url):
+        key = endpoint_key(url)
+        with self._lock:
+            endpoint = self._endpoints.get(key)
+            if endpoint is None:
+                endpoint = self._endpoints[key] = {
+                    'breaker': CircuitBreaker(self.failure_threshold, self.reset_seconds),
+                    'latency': LatencyHistogram(),
+                    'requests': 0,
+                    'failures': 0,
+                    'retries': 0,
+                    'short_circuited': 0,
+                }
+            return key, endpoint
+
+    def _backoff(self, attempt):
+        # Full jitter keeps many sessions from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _should_retry(self, method, error=None, status=None):
+        if method in IDEMPOTENT_METHODS:
+            return True
+        if error is not None:
+            return _never_sent(error)
+        return status in NOT_PROCESSED_STATUSES
+
+    def request(self, method, url, retries=None, timeout=None, **kwargs):
+        """Send a request; raises CircuitOpenError while the endpoint is cooling down"""
+        method = method.upper()
+        retries = self.retries if retries is None else retries
+        key, endpoint = self._endpoint(url)
+        breaker = endpoint['breaker']
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                endpoint['short_circuited'] += 1
+                raise CircuitOpenError(
+                    f"{key} is failing; skipping calls for another {breaker.retry_after():.0f}s"
+                )
+            endpoint['requests'] += 1
+            started = time.perf_counter()
+            error = response = None
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                error = e
+            endpoint['latency'].observe((time.perf_counter() - started) * 1000)
+
+            if error is None and response.status_code not in RETRY_STATUSES:
+                # 4xx is the caller's problem, not the endpoint's health
+                breaker.record_success()
+                return response
+
+            endpoint['failures'] += 1
+            breaker.record_failure()
+            status = None if response is None else response.status_code
+            if attempt >= retries or not self._should_retry(method, error, status):
+                if error is not None:
+                    raise error
+                return response
+            endpoint['retries'] += 1
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get_stats(self):
+        """Per-endpoint counters, breaker state and latency percentiles"""
+        with self._lock:
+            endpoints = dict(self._endpoints)
+        stats = {}
+        for key, endpoint in endpoints.items():
+            latency = endpoint['latency']
+            stats[key] = {
+                'requests': endpoint['requests'],
+                'failures': endpoint['failures'],
+                'retries': endpoint['retries'],
+                'short_circuited': endpoint['short_circuited'],
+                'breaker': endpoint['breaker'].state,
+                'times_opened': endpoint['breaker'].times_opened,
+                'p50_ms': latency.percentile(0.50),
+                'p95_ms': latency.percentile(0.95),
+                'p99_ms': latency.percentile(0.99),
+                'latency': latency.snapshot(),
+            }
+        return stats
+
+    def close(self):
+        self.session.close()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_http_client(name='default', **options):
+    """Process-wide client for one outbound integration (options apply on first use)"""
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = HttpClient(name, **options)
+        return client
+
+def get_http_stats():
+    """Endpoint statistics for every outbound client"""
+    with _clients_lock:
+        clients = dict(_clients)
+    return {name: client.get_stats() for name, client in clients.items()}
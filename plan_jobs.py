@@ -0,0 +1,310 @@
+"""Background job queue for travel plan generation.
+
+Plan requests are persisted in the plan_jobs table and executed by a pool
+of worker threads, so a slow Gemini/SerpAPI call no longer pins a
+session's script thread and a browser refresh does not lose the work: the
+page keeps the job id and polls for progress and the result.
+
+Identical requests that are already queued or running share one job.
+Workers in several Streamlit processes can serve the same table; a job
+is claimed with a single conditional UPDATE, and jobs whose worker stops
+sending heartbeats are put back on the queue. Each claim records its own
+owner token, and a worker only writes to a job while it still holds it.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from db_utils import get_connection
+
+PLAN_JOB_WORKERS = int(os.environ.get('ROAMGENIE_PLAN_JOB_WORKERS', 2))
+PLAN_JOB_POLL_SECONDS = float(os.environ.get('ROAMGENIE_PLAN_JOB_POLL_SECONDS', 0.5))
+PLAN_JOB_STALE_SECONDS = float(os.environ.get('ROAMGENIE_PLAN_JOB_STALE_SECONDS', 120))
+PLAN_JOB_MAX_ATTEMPTS = int(os.environ.get('ROAMGENIE_PLAN_JOB_MAX_ATTEMPTS', 2))
+PLAN_JOB_RETENTION_DAYS = int(os.environ.get('ROAMGENIE_PLAN_JOB_RETENTION_DAYS', 7))
+HEARTBEAT_SECONDS = 15
+PROGRESS_INTERVAL = 0.5
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+@dataclass
+class PlanJob:
+    """A persisted plan job as seen by the page"""
+    id: str
+    status: str
+    request: dict
+    stage: Optional[str] = None
+    partial: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+    @property
+    def finished(self):
+        return self.status not in ACTIVE_STATUSES
+
+def plan_request_key(request):
+    """Stable hash of a plan request, used to deduplicate in-flight jobs"""
+    canonical = json.dumps(request, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class JobProgress:
+    """Handed to the runner to publish the current stage and partial output"""
+
+    def __init__(self, job_queue, job_id, owner):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.owner = owner
+        self.partial = {}
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+
+    def stage(self, name):
+        self.job_queue._update(self.job_id, self.owner, stage=name)
+
+    def update(self, section, text, force=False):
+        """Record in-progress text for a section; writes are throttled"""
+        with self._lock:
+            self.partial[section] = text
+            now = time.monotonic()
+            if not force and now - self._last_write < PROGRESS_INTERVAL:
+                return
+            self._last_write = now
+            partial = json.dumps(self.partial)
+        self.job_queue._update(self.job_id, self.owner, partial=partial)
+
+class PlanJobQueue:
+    """SQLite-backed plan job queue with an in-process worker pool"""
+
+    def __init__(self, runner, workers=PLAN_JOB_WORKERS, poll_seconds=PLAN_JOB_POLL_SECONDS,
+                 stale_seconds=PLAN_JOB_STALE_SECONDS, max_attempts=PLAN_JOB_MAX_ATTEMPTS):
+        self.runner = runner
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._threads = []
+        # job id -> owner token of the claim being run here
+        self._running_jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'deduplicated': 0,
+            'completed': 0,
+            'failed': 0,
+            'requeued': 0,
+            'superseded': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    # ----- lifecycle -----
+
+    def start(self):
+        """Recover abandoned jobs, purge old ones and start the workers"""
+        self.requeue_stale()
+        self.purge_finished()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'roamgenie-plan-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='roamgenie-plan-heartbeat', daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        return self
+
+    def shutdown(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    # ----- producer side -----
+
+    def submit(self, request):
+        """Queue a plan request, or join the identical job already in flight"""
+        key = plan_request_key(request)
+        payload = json.dumps(request, default=str)
+        for _ in range(3):
+            job_id = uuid.uuid4().hex
+            with get_connection() as conn:
+                inserted = conn.execute('''
+                INSERT INTO plan_jobs (id, request_key, request) VALUES (?, ?, ?)
+                ON CONFLICT DO NOTHING
+                ''', (job_id, key, payload)).rowcount
+                conn.commit()
+                row = conn.execute(f'''
+                SELECT id FROM plan_jobs
+                WHERE request_key = ? AND status IN {ACTIVE_STATUSES}
+                ''', (key,)).fetchone()
+            if row is not None:
+                self._count('submitted' if inserted else 'deduplicated')
+                self._wake.set()
+                return row[0]
+            # The in-flight job finished between the insert and the lookup
+        raise RuntimeError("Could not queue plan job")
+
+    def get(self, job_id):
+        """Load a job by id, or None if it does not exist"""
+        with get_connection() as conn:
+            row = conn.execute('''
+            SELECT id, status, request, stage, partial, result, error, attempts,
+                   created_at, started_at, finished_at
+            FROM plan_jobs WHERE id = ?
+            ''', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return PlanJob(
+            id=row[0], status=row[1], request=json.loads(row[2]), stage=row[3],
+            partial=json.loads(row[4]) if row[4] else None,
+            result=json.loads(row[5]) if row[5] else None,
+            error=row[6], attempts=row[7],
+            created_at=row[8], started_at=row[9], finished_at=row[10],
+        )
+
+    # ----- worker side -----
+
+    def _update(self, job_id, owner, **fields):
+        """Write fields while this claim still owns the job; returns whether it did"""
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        with get_connection() as conn:
+            updated = conn.execute(f'''
+            UPDATE plan_jobs SET {assignments}, heartbeat_at = ?
+            WHERE id = ? AND worker_id = ? AND status = 'running'
+            ''', (*fields.values(), time.time(), job_id, owner)).rowcount
+            conn.commit()
+        return updated == 1
+
+    def _claim(self):
+        # A fresh owner token per claim, so a requeued job picked up again by
+        # this same process is not confused with the earlier attempt
+        owner = f"{self.worker_id}-{uuid.uuid4().hex[:8]}"
+        with get_connection() as conn:
+            row = conn.execute('''
+            UPDATE plan_jobs
+            SET status = 'running', worker_id = ?, heartbeat_at = ?,
+                started_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+            WHERE id = (
+                SELECT id FROM plan_jobs WHERE status = 'queued'
+                ORDER BY created_at LIMIT 1
+            ) AND status = 'queued'
+            RETURNING id, request
+            ''', (owner, time.time())).fetchone()
+            conn.commit()
+        if row is None:
+            return None
+        return row[0], row[1], owner
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                print(f"⚠️ Warning: Could not claim plan job: {e}")
+                claimed = None
+            if claimed is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            job_id, request, owner = claimed
+            self._run(job_id, json.loads(request), owner)
+
+    def _run(self, job_id, request, owner):
+        with self._lock:
+            self._running_jobs[job_id] = owner
+        progress = JobProgress(self, job_id, owner)
+        try:
+            result = self.runner(request, progress)
+            finished = self._update(job_id, owner, status='done', stage=None,
+                                    result=json.dumps(result, default=str),
+                                    partial=json.dumps(progress.partial), finished_at=_now())
+            outcome = 'completed'
+        except Exception as e:
+            traceback.print_exc()
+            finished = self._update(job_id, owner, status='failed',
+                                    error=str(e) or type(e).__name__, finished_at=_now())
+            outcome = 'failed'
+        finally:
+            with self._lock:
+                self._running_jobs.pop(job_id, None)
+        # The job was requeued or failed behind our back; its new owner reports it
+        self._count(outcome if finished else 'superseded')
+
+    def _heartbeat_loop(self):
+        # Long silent stages (a single slow model call) still count as alive
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            try:
+                with self._lock:
+                    claims = list(self._running_jobs.items())
+                if claims:
+                    with get_connection() as conn:
+                        conn.executemany('''
+                        UPDATE plan_jobs SET heartbeat_at = ?
+                        WHERE id = ? AND worker_id = ? AND status = 'running'
+                        ''', [(time.time(), job_id, owner) for job_id, owner in claims])
+                        conn.commit()
+                self.requeue_stale()
+            except Exception as e:
+                print(f"⚠️ Warning: Plan job heartbeat failed: {e}")
+
+    # ----- maintenance -----
+
+    def requeue_stale(self):
+        """Put jobs whose worker went silent back on the queue (or fail them)"""
+        with get_connection() as conn:
+            requeued = conn.execute('''
+            UPDATE plan_jobs
+            SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                error = CASE WHEN attempts >= ? THEN 'Worker stopped responding' END,
+                finished_at = CASE WHEN attempts >= ? THEN CURRENT_TIMESTAMP END,
+                worker_id = NULL
+            WHERE status = 'running' AND heartbeat_at < ?
+            ''', (self.max_attempts, self.max_attempts, self.max_attempts,
+                  time.time() - self.stale_seconds)).rowcount
+            conn.commit()
+        if requeued:
+            self._count('requeued', requeued)
+            self._wake.set()
+        return requeued
+
+    def purge_finished(self, days=PLAN_JOB_RETENTION_DAYS):
+        """Delete finished jobs older than the retention window"""
+        with get_connection() as conn:
+            deleted = conn.execute(f'''
+            DELETE FROM plan_jobs
+            WHERE status NOT IN {ACTIVE_STATUSES} AND created_at < datetime('now', ?)
+            ''', (f'-{int(days)} days',)).rowcount
+            conn.commit()
+        return deleted
+
+    def get_stats(self):
+        """Queue depth by status plus this process's counters"""
+        with get_connection() as conn:
+            by_status = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM plan_jobs GROUP BY status"
+            ).fetchall())
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['by_status'] = by_status
+        stats['workers'] = self.workers
+        with self._lock:
+            stats['running_here'] = len(self._running_jobs)
+        return stats
+
+def _now():
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
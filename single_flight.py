@@ -0,0 +1,174 @@
+"""Request coalescing for identical concurrent upstream calls.
+
+When many sessions ask for the same thing at once (a promotion sends
+everyone to the same route and dates), only the first caller runs the
+upstream call; the others wait for it and receive the same result, or the
+same exception. Nothing is kept once the call finishes -- caching is the
+job of the flight and agent response caches -- so this only removes
+duplicate work that is in progress at the same moment.
+
+    flights = get_single_flight('flights')
+    response = flights.do(key, lambda: search(params))
+
+stream() does the same for chunked agent output: followers replay the
+chunks the leader has already received and then follow it live.
+"""
+import os
+import threading
+import time
+
+SINGLE_FLIGHT_ENABLED = os.environ.get('ROAMGENIE_SINGLE_FLIGHT', '1') != '0'
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.environ.get('ROAMGENIE_SINGLE_FLIGHT_WAIT', 180))
+
+class _Call:
+    """One in-progress upstream call and everything its followers need"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.done = False
+        self.result = None
+        self.error = None
+        self.chunks = []
+        self.followers = 0
+
+    def finish(self, result=None, error=None):
+        with self.condition:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.condition.notify_all()
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution"""
+
+    def __init__(self, name, wait_seconds=SINGLE_FLIGHT_WAIT_SECONDS, enabled=SINGLE_FLIGHT_ENABLED):
+        self.name = name
+        self.wait_seconds = wait_seconds
+        self.enabled = enabled
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'executed': 0,
+            'shared': 0,
+            'errors': 0,
+            'peak_followers': 0,
+        }
+
+    def _join(self, key):
+        """Return (call, is_leader) for key, registering a new call if needed"""
+        with self._lock:
+            self.stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.stats['executed'] += 1
+                return call, True
+            call.followers += 1
+            self.stats['shared'] += 1
+            self.stats['peak_followers'] = max(self.stats['peak_followers'], call.followers)
+            return call, False
+
+    def _leave(self, key, call, error=None):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            if error is not None:
+                self.stats['errors'] += 1
+
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers with the same key"""
+        if not self.enabled:
+            return fn()
+        call, is_leader = self._join(key)
+        if is_leader:
+            try:
+                result = fn()
+            except BaseException as e:
+                self._leave(key, call, error=e)
+                call.finish(error=e)
+                raise
+            self._leave(key, call)
+            call.finish(result=result)
+            return result
+
+        with call.condition:
+            if not call.condition.wait_for(lambda: call.done, self.wait_seconds):
+                raise TimeoutError(f"Timed out waiting for shared {self.name} call")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stream(self, key, factory):
+        """Yield the chunks of factory() once for all concurrent callers with the same key"""
+        if not self.enabled:
+            yield from factory()
+            return
+        call, is_leader = self._join(key)
+        if is_leader:
+            try:
+                for chunk in factory():
+                    with call.condition:
+                        call.chunks.append(chunk)
+                        call.condition.notify_all()
+                    yield chunk
+            except GeneratorExit:
+                # The leader stopped reading; followers must not hang or see GeneratorExit
+                error = RuntimeError(f"Shared {self.name} stream was abandoned")
+                self._leave(key, call, error=error)
+                call.finish(error=error)
+                raise
+            except BaseException as e:
+                self._leave(key, call, error=e)
+                call.finish(error=e)
+                raise
+            self._leave(key, call)
+            call.finish()
+            return
+
+        position = 0
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            with call.condition:
+                ready = call.condition.wait_for(
+                    lambda: call.done or len(call.chunks) > position,
+                    max(deadline - time.monotonic(), 0),
+                )
+                if not ready:
+                    raise TimeoutError(f"Timed out waiting for shared {self.name} stream")
+                chunks = call.chunks[position:]
+                done = call.done
+            position += len(chunks)
+            yield from chunks
+            if done:
+                break
+        if call.error is not None:
+            raise call.error
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._calls)
+        stats['share_rate'] = stats['shared'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+def get_single_flight(name):
+    """Process-wide coalescing group for one kind of upstream call"""
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight(name)
+        return group
+
+def get_single_flight_stats():
+    """Per-group counters plus the total number of upstream calls saved"""
+    with _groups_lock:
+        groups = dict(_groups)
+    per_group = {name: group.get_stats() for name, group in groups.items()}
+    return {
+        'groups': per_group,
+        'saved_calls': sum(stats['shared'] for stats in per_group.values()),
+    }
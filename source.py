@@ -1,5 +1,4 @@
 import streamlit as st
-import json
 import os
 import requests
 import pandas as pd
@@ -8,7 +7,6 @@ from PIL import Image
 import io
 import cv2
 import numpy as np
-from serpapi import GoogleSearch
 from agno.agent import Agent
 from agno.tools.serpapi import SerpApiTools
 from agno.models.google import Gemini
@@ -17,8 +15,22 @@ from datetime import datetime
 import pytesseract
 import re
 import sqlite3
-import json
 import db_utils            # <-- new
+import tempfile
+import time
+from data_export import export_dataset, default_export_filename, EXPORT_FORMATS, PARQUET_AVAILABLE
+from db_backup import get_backup_stats, list_backups, verify_backup, restore_backup
+from flight_cache import cached_flight_search, get_flight_cache_stats
+from single_flight import get_single_flight_stats
+from http_client import get_http_client, get_http_stats, CircuitOpenError
+from plan_jobs import PlanJobQueue, PLAN_JOB_POLL_SECONDS
+from crm_outbox import CrmOutboxDispatcher
+from visa_dataset import VisaDatasetStore, bucket_frame, load_bucket_file
+from countries import country_flag, country_info, country_iso3, region_breakdown
+from travel_planner import (
+    run_stages, run_stage, format_stage_timings, agent_output, TextStream, get_agent_cache_stats,
+    AgentRegistry, build_planning_prompt, format_token_report, estimate_tokens,
+)
 # Save the provided code as 'roamgenie_db.py' and then use these imports:
 
 # Basic imports for core functionality
@@ -31,18 +43,15 @@ from db_utils import (
     log_flight_search,
     log_enhanced_flight_search,
     fetch_recent_searches,
-    fetch_all_searches,
     
     # Contact management
     log_enhanced_contact,
     fetch_contacts,
-    
+    search_contacts,
+    count_contacts,
+
     # Analytics functions
     get_total_searches_count,
-    get_recent_searches_count,
-    get_monthly_searches,
-    get_average_trip_duration,
-    get_weekly_growth_rate,
     
     # Top destinations and origins
     get_top_destinations,
@@ -54,16 +63,21 @@ from db_utils import (
     
     # Time-based analytics
     get_searches_over_time,
-    get_flight_analytics,
+    get_hourly_distribution,
+    get_duration_distribution,
+    get_flight_filter_options,
+    query_flight_searches,
     
     # Admin functions
-    get_admin_summary_stats,
+    get_overview_stats,
+    OverviewStats,
     generate_analytics_summary,
     
     # Event logging
     log_event,
     
     # Utility functions
+    rebuild_search_rollups,
     backup_database,
     get_database_info,
     get_flight_analytic
@@ -140,35 +154,26 @@ def display_overview_metrics():
     """Display comprehensive overview metrics"""
     st.markdown("## 📊 Key Performance Indicators")
     
-    # Get comprehensive stats
+    # All KPIs come from a single aggregated query
     try:
-        stats = get_admin_summary_stats()
-        total_searches = get_total_searches_count()
-        contacts_df = fetch_contacts()
-        total_contacts = len(contacts_df) if contacts_df is not None and not contacts_df.empty else 0
-        recent_searches = get_recent_searches_count(7)
-        avg_duration = get_average_trip_duration()
+        stats = get_overview_stats()
     except Exception as e:
         st.error(f"Error fetching metrics: {e}")
-        stats = {}
-        total_searches = 0
-        total_contacts = 0
-        recent_searches = 0
-        avg_duration = 0
+        stats = OverviewStats()
     
     # Main KPIs Row 1
     kpi1, kpi2, kpi3, kpi4, kpi5 = st.columns(5)
     
     with kpi1:
-        st.metric("Total Searches", stats.get('total_searches', total_searches))
+        st.metric("Total Searches", stats.total_searches)
     with kpi2:
-        st.metric("Total Contacts", stats.get('total_contacts', total_contacts))
+        st.metric("Total Contacts", stats.total_contacts)
     with kpi3:
-        st.metric("Last 7 Days", stats.get('searches_7d', recent_searches))
+        st.metric("Last 7 Days", stats.searches_7d)
     with kpi4:
-        st.metric("Last 24h Searches", stats.get('searches_24h', 0))
+        st.metric("Last 24h Searches", stats.searches_24h)
     with kpi5:
-        st.metric("Avg Trip Duration", f"{stats.get('avg_trip_duration', avg_duration):.1f} days")
+        st.metric("Avg Trip Duration", f"{stats.avg_trip_duration:.1f} days")
     
     st.markdown("---")
     
@@ -176,45 +181,25 @@ def display_overview_metrics():
     stat1, stat2, stat3, stat4 = st.columns(4)
     
     with stat1:
-        try:
-            budget_stats = get_budget_distribution()
-            most_popular_budget = budget_stats[0][0] if budget_stats and len(budget_stats) > 0 else "N/A"
-        except:
-            most_popular_budget = "N/A"
-        st.metric("Popular Budget", most_popular_budget)
+        st.metric("Popular Budget", stats.top_budget or "N/A")
     
     with stat2:
-        try:
-            class_stats = get_class_distribution()
-            most_popular_class = class_stats[0][0] if class_stats and len(class_stats) > 0 else "N/A"
-        except:
-            most_popular_class = "N/A"
-        st.metric("Popular Class", most_popular_class)
+        st.metric("Popular Class", stats.top_class or "N/A")
     
     with stat3:
-        try:
-            monthly_searches = get_monthly_searches()
-        except:
-            monthly_searches = 0
-        st.metric("This Month", monthly_searches)
+        st.metric("This Month", stats.searches_this_month)
     
     with stat4:
-        try:
-            weekly_growth = get_weekly_growth_rate()
-        except:
-            weekly_growth = 0
-        st.metric("Weekly Growth", f"{weekly_growth:+.1f}%")
+        st.metric("Weekly Growth", f"{stats.weekly_growth_rate:+.1f}%")
 
 def display_charts_section():
     """Display comprehensive charts and analytics"""
     st.markdown("## 📈 Analytics & Trends")
     
-    flight_data = get_flight_analytics()
-    
-    if flight_data.empty:
+    if get_total_searches_count() == 0:
         st.info("No flight data available for charts.")
         return
-    
+
     # Top section - Destination and Departure charts
     st.markdown("### 🌍 Geographic Analytics")
     dest_col, dep_col = st.columns(2)
@@ -299,9 +284,10 @@ def display_charts_section():
     with time_col2:
         # Budget distribution
         st.markdown("#### Budget Distribution")
-        if 'budget_preference' in flight_data.columns:
-            budget_dist = flight_data['budget_preference'].value_counts()
-            fig_budget = px.pie(values=budget_dist.values, names=budget_dist.index, 
+        budget_dist = get_budget_distribution(90)
+        if budget_dist:
+            fig_budget = px.pie(values=[count for _, count in budget_dist],
+                       names=[budget for budget, _ in budget_dist],
                        title='Budget Preference Distribution')
             fig_budget.update_layout(height=400)
             st.plotly_chart(fig_budget, use_container_width=True)
@@ -314,9 +300,9 @@ def display_charts_section():
     
     with advanced_col1:
         # Hourly search pattern
-        if 'hour_of_day' in flight_data.columns:
-            hourly_data = flight_data['hour_of_day'].value_counts().sort_index()
-            fig_hourly = px.bar(x=hourly_data.index, y=hourly_data.values,
+        hourly_data = get_hourly_distribution(90)
+        if not hourly_data.empty:
+            fig_hourly = px.bar(x=hourly_data['hour_of_day'], y=hourly_data['count'],
                        title='Search Activity by Hour of Day',
                        labels={'x': 'Hour', 'y': 'Number of Searches'})
             fig_hourly.update_layout(height=350)
@@ -324,17 +310,19 @@ def display_charts_section():
     
     with advanced_col2:
         # Flight class distribution
-        if 'flight_class' in flight_data.columns:
-            class_dist = flight_data['flight_class'].value_counts()
-            fig_class = px.pie(values=class_dist.values, names=class_dist.index,
+        class_dist = get_class_distribution(90)
+        if class_dist:
+            fig_class = px.pie(values=[count for _, count in class_dist],
+                       names=[flight_class for flight_class, _ in class_dist],
                        title='Flight Class Distribution')
             fig_class.update_layout(height=350)
             st.plotly_chart(fig_class, use_container_width=True)
     
     with advanced_col3:
         # Trip duration distribution
-        if 'duration_days' in flight_data.columns:
-            fig_duration = px.histogram(flight_data, x='duration_days',
+        duration_data = get_duration_distribution(90)
+        if not duration_data.empty:
+            fig_duration = px.histogram(duration_data, x='duration_days', y='count',
                              title='Trip Duration Distribution',
                              labels={'duration_days': 'Days', 'count': 'Frequency'})
             fig_duration.update_layout(height=350)
@@ -344,52 +332,51 @@ def display_customer_management():
     """Display comprehensive customer management"""
     st.markdown("## 👥 Customer Management")
     
-    # Get customer data
-    customers = fetch_contacts(1000)  # Get more for admin
-    
-    if customers is None or customers.empty:
-        st.info("No customer data available.")
-        return
-    
     # Search and filter section
     st.markdown("### 🔍 Search & Filter")
-    filter_col1, filter_col2, filter_col3 = st.columns(3)
+    filter_col1, filter_col2, filter_col3, filter_col4 = st.columns([3, 1, 1, 1])
     
     with filter_col1:
         search_term = st.text_input("🔍 Search customers", 
-                                   placeholder="Name, email, or phone")
+                                   placeholder="Name, email, or phone (prefix match)")
     with filter_col2:
         show_count = st.selectbox("Show records", [25, 50, 100, 200, "All"])
     with filter_col3:
-        sort_by = st.selectbox("Sort by", ["Registration Date", "Name", "Email"])
-    
-    # Filter customers
-    filtered_customers = customers.copy()
+        sort_options = {
+            "Relevance": "relevance",
+            "Registration Date": "created_at",
+            "Name": "name",
+            "Email": "email",
+        }
+        sort_by = st.selectbox("Sort by", list(sort_options))
+    page_size = None if show_count == "All" else show_count
     
-    if search_term:
-        mask = (
-            customers['firstName'].str.contains(search_term, case=False, na=False) |
-            customers['secondName'].str.contains(search_term, case=False, na=False) |
-            customers['email'].str.contains(search_term, case=False, na=False) |
-            customers['phone'].str.contains(search_term, case=False, na=False)
-        )
-        filtered_customers = customers[mask]
+    # Matching, ranking and paging all happen in SQLite via the FTS5 index
+    try:
+        total_count = count_contacts(search_term)
+        total_pages = max(1, -(-total_count // page_size)) if page_size else 1
+        # Keep the page inside the current result set when it shrinks
+        if st.session_state.get("contact_page", 1) > total_pages:
+            st.session_state.contact_page = total_pages
+        with filter_col4:
+            page_number = st.number_input("Page", min_value=1, max_value=total_pages, step=1,
+                                          key="contact_page")
+        result = search_contacts(search_term, sort_by=sort_options[sort_by],
+                                 page=int(page_number), page_size=page_size)
+    except Exception as e:
+        st.error(f"Error searching customers: {e}")
+        return
     
-    # Sort customers
-    if sort_by == "Registration Date" and 'created_at' in filtered_customers.columns:
-        filtered_customers = filtered_customers.sort_values('created_at', ascending=False)
-    elif sort_by == "Name":
-        filtered_customers = filtered_customers.sort_values(['firstName', 'secondName'])
-    elif sort_by == "Email":
-        filtered_customers = filtered_customers.sort_values('email')
+    if result.total_count == 0:
+        st.info("No customers match your search." if search_term else "No customer data available.")
+        return
     
-    # Limit results
-    if show_count != "All":
-        filtered_customers = filtered_customers.head(show_count)
+    filtered_customers = result.rows
     
     # Display results
-    st.markdown(f"### 📊 Customer Records ({len(filtered_customers)} shown)")
-    
+    st.markdown(f"### 📊 Customer Records ({len(filtered_customers)} shown of "
+                f"{result.total_count} · page {result.page} of {total_pages})")
+
     if not filtered_customers.empty:
         # Prepare display data
         display_data = filtered_customers.copy()
@@ -456,86 +443,110 @@ def display_flight_management():
     """Display comprehensive flight search management"""
     st.markdown("## ✈️ Flight Search Management")
     
-    # Get flight data
-    flight_data = get_flight_analytics()
+    # Filter values come from the rollup index, rows from a paged SQL query
+    filter_options = get_flight_filter_options(90)
     
-    if flight_data.empty:
+    if not filter_options['origin']:
         st.info("No flight search data available.")
         return
     
     # Filters section
     st.markdown("### 🔧 Filters")
-    filter1, filter2, filter3, filter4 = st.columns(4)
+    filter1, filter2, filter3, filter4, filter5 = st.columns(5)
     
     with filter1:
-        origins = ['All'] + sorted(flight_data['origin'].unique().tolist())
-        selected_origin = st.selectbox("Origin", origins)
+        selected_origin = st.selectbox("Origin", ['All'] + filter_options['origin'])
     
     with filter2:
-        destinations = ['All'] + sorted(flight_data['destination'].unique().tolist())
-        selected_destination = st.selectbox("Destination", destinations)
+        selected_destination = st.selectbox("Destination", ['All'] + filter_options['destination'])
     
     with filter3:
-        budgets = ['All'] + sorted(flight_data['budget_preference'].dropna().unique().tolist())
-        selected_budget = st.selectbox("Budget", budgets)
+        selected_budget = st.selectbox("Budget", ['All'] + filter_options['budget_preference'])
     
     with filter4:
-        classes = ['All'] + sorted(flight_data['flight_class'].dropna().unique().tolist())
-        selected_class = st.selectbox("Class", classes)
+        selected_class = st.selectbox("Class", ['All'] + filter_options['flight_class'])
+    
+    with filter5:
+        sort_labels = {
+            "Newest Searches": ('created_at', True),
+            "Oldest Searches": ('created_at', False),
+            "Departure Date (Latest)": ('departure_date', True),
+            "Departure Date (Earliest)": ('departure_date', False),
+        }
+        sort_choice = st.selectbox("Sort by", list(sort_labels.keys()))
+    
+    sort_by, descending = sort_labels[sort_choice]
+    query_args = dict(
+        origin=None if selected_origin == 'All' else selected_origin,
+        destination=None if selected_destination == 'All' else selected_destination,
+        budget_preference=None if selected_budget == 'All' else selected_budget,
+        flight_class=None if selected_class == 'All' else selected_class,
+        days=90,
+        sort_by=sort_by,
+        descending=descending,
+        page_size=50,
+    )
     
-    # Apply filters
-    filtered_data = flight_data.copy()
+    # Keyset pagination: remember the cursors of the pages already visited and
+    # start over whenever the filters change
+    filter_key = tuple(sorted(query_args.items()))
+    if st.session_state.get('flight_page_filters') != filter_key:
+        st.session_state.flight_page_filters = filter_key
+        st.session_state.flight_page_cursors = [None]
+    cursors = st.session_state.flight_page_cursors
     
-    if selected_origin != 'All':
-        filtered_data = filtered_data[filtered_data['origin'] == selected_origin]
-    if selected_destination != 'All':
-        filtered_data = filtered_data[filtered_data['destination'] == selected_destination]
-    if selected_budget != 'All':
-        filtered_data = filtered_data[filtered_data['budget_preference'] == selected_budget]
-    if selected_class != 'All':
-        filtered_data = filtered_data[filtered_data['flight_class'] == selected_class]
+    page = query_flight_searches(cursor=cursors[-1], **query_args)
     
     # Display summary metrics for filtered data
     st.markdown("### 📊 Filtered Data Summary")
     summary1, summary2, summary3 = st.columns(3)
     
     with summary1:
-        st.metric("Filtered Records", len(filtered_data))
+        st.metric("Filtered Records", page.total_count)
     
     with summary2:
-        avg_duration = filtered_data['duration_days'].mean()
-        st.metric("Avg Duration", f"{avg_duration:.1f} days" if not pd.isna(avg_duration) else "N/A")
+        avg_duration = page.avg_duration
+        st.metric("Avg Duration", f"{avg_duration:.1f} days" if avg_duration is not None else "N/A")
     
     with summary3:
-        if 'estimated_price' in filtered_data.columns:
-            avg_price = filtered_data['estimated_price'].mean()
-            st.metric("Avg Price", f"₹{avg_price:,.0f}" if not pd.isna(avg_price) else "N/A")
+        avg_price = page.avg_price
+        st.metric("Avg Price", f"₹{avg_price:,.0f}" if avg_price is not None else "N/A")
     
     st.markdown("---")
     
     # Flight data table
-    st.markdown(f"### 📋 Flight Searches ({len(filtered_data)} records)")
+    page_number = len(cursors)
+    total_pages = max(1, -(-page.total_count // query_args['page_size']))
+    st.markdown(f"### 📋 Flight Searches ({page.total_count} records, page {page_number} of {total_pages})")
     
-    if not filtered_data.empty:
+    if not page.rows.empty:
         # Prepare display data
         display_columns = [
             'origin', 'destination', 'departure_date', 'return_date',
             'duration_days', 'budget_preference', 'flight_class', 'created_at'
         ]
         
-        display_data = filtered_data[
-            [col for col in display_columns if col in filtered_data.columns]
-        ].copy()
+        display_data = page.rows[display_columns].copy()
         
         # Format dates
-        if 'created_at' in display_data.columns:
-            display_data['Search Time'] = pd.to_datetime(
-                display_data['created_at']
-            ).dt.strftime('%Y-%m-%d %H:%M')
+        display_data['Search Time'] = pd.to_datetime(
+            display_data['created_at']
+        ).dt.strftime('%Y-%m-%d %H:%M')
         
         # Show dataframe
         st.dataframe(display_data, use_container_width=True)
-        
+    
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        if st.button("⬅️ Previous", key="flight_page_prev", disabled=page_number == 1):
+            cursors.pop()
+            st.rerun()
+    with next_col:
+        if st.button("Next ➡️", key="flight_page_next", disabled=page.next_cursor is None):
+            cursors.append(page.next_cursor)
+            st.rerun()
+    
+    if not page.rows.empty:
         # Recent searches sidebar
         with st.expander("🔍 Recent Flight Searches", expanded=False):
             try:
@@ -572,7 +583,71 @@ def display_system_status():
             
             st.success("✅ Database: Connected")
             st.write(f"**File Size:** {db_info.get('file_size_mb', 'Unknown')} MB")
-            
+            st.write(f"**Schema Version:** {db_info.get('schema_version', 'Unknown')}")
+            pool_info = db_info.get('connection_pool', {})
+            if pool_info:
+                st.write(f"**Pooled Connections:** {pool_info['open_connections']} open / {pool_info['max_size']} max")
+            queue_info = db_info.get('write_queue', {})
+            if queue_info:
+                st.write(f"**Write Queue:** {queue_info['pending']} pending, {queue_info['written']:,} written in {queue_info['batches']:,} batches")
+            cache_info = db_info.get('analytics_cache', {})
+            if cache_info:
+                st.write(f"**Analytics Cache:** {cache_info['entries']} entries, {cache_info['hit_rate']:.0%} hit rate "
+                         f"({cache_info['hits']:,} hits / {cache_info['misses']:,} misses)")
+            flight_cache_info = get_flight_cache_stats()
+            st.write(f"**Flight Cache:** {flight_cache_info['entries']} routes, {flight_cache_info['hit_rate']:.0%} hit rate "
+                     f"({flight_cache_info['hits']:,} fresh / {flight_cache_info['stale_hits']:,} stale / "
+                     f"{flight_cache_info['misses']:,} API calls)")
+            job_info = get_plan_job_queue().get_stats()
+            job_counts = job_info['by_status']
+            st.write(f"**Plan Jobs:** {job_counts.get('queued', 0)} queued, {job_counts.get('running', 0)} running, "
+                     f"{job_counts.get('done', 0)} done, {job_counts.get('failed', 0)} failed · "
+                     f"{job_info['deduplicated']:,} duplicate requests joined in-flight jobs")
+            coalescing_info = get_single_flight_stats()
+            st.write(f"**Request Coalescing:** {coalescing_info['saved_calls']:,} upstream calls saved by "
+                     f"sharing in-progress requests")
+            for group_name, group_stats in coalescing_info['groups'].items():
+                st.write(f"• {group_name}: {group_stats['executed']:,} executed, {group_stats['shared']:,} shared "
+                         f"({group_stats['share_rate']:.0%}), {group_stats['in_flight']} in flight, "
+                         f"peak {group_stats['peak_followers']} waiting")
+            visa_info = get_passport_scanner().visa_dataset.get_stats()
+            visa_checked = (datetime.fromtimestamp(visa_info['checked_at']).strftime('%Y-%m-%d %H:%M')
+                            if visa_info['checked_at'] else 'never')
+            st.write(f"**Visa Dataset:** {visa_info['source']} {visa_info['version'] or ''} · "
+                     f"{visa_info['rows']:,} rows, {visa_info['memory_bytes'] / 1024:.0f} KB · "
+                     f"last checked {visa_checked} ({visa_info['updates']} updates, "
+                     f"{visa_info['not_modified']} unchanged, {visa_info['errors']} failed)")
+            registry_info = get_agent_registry().get_stats()
+            st.write(f"**Agent Registry:** {registry_info['created']} agents built "
+                     f"(avg {registry_info['avg_build_seconds'] * 1000:.0f} ms each), "
+                     f"{registry_info['reused']:,} reuses saved {registry_info['saved_seconds']:.2f}s of construction")
+            agent_cache_info = get_agent_cache_stats()
+            st.write(f"**Agent Cache:** {agent_cache_info['hit_rate']:.0%} hit rate "
+                     f"({agent_cache_info['hits']:,} of {agent_cache_info['lookups']:,} agent calls)")
+            for agent_name, agent_stats in agent_cache_info['agents'].items():
+                st.write(f"• {agent_name}: {agent_stats['entries']} cached, {agent_stats['hits']:,} exact / "
+                         f"{agent_stats['near_hits']:,} near-duplicate hits, {agent_stats['hit_rate']:.0%}")
+
+            outbox_info = get_crm_dispatcher().get_stats()
+            outbox_counts = outbox_info['by_status']
+            oldest_pending = outbox_info['oldest_pending_seconds']
+            st.write(f"**CRM Outbox:** {outbox_counts.get('pending', 0) + outbox_counts.get('sending', 0)} waiting"
+                     f"{f' (oldest {oldest_pending:.0f}s)' if oldest_pending else ''}, "
+                     f"{outbox_counts.get('sent', 0):,} delivered, {outbox_counts.get('dead', 0)} dead")
+            if outbox_info['last_error']:
+                st.caption(f"Last CRM error: {outbox_info['last_error']}")
+            if outbox_counts.get('dead') and st.button("🔁 Retry dead CRM deliveries"):
+                st.success(f"Requeued {get_crm_dispatcher().requeue_dead()} deliveries")
+
+            for client_name, endpoints in get_http_stats().items():
+                for endpoint, endpoint_stats in endpoints.items():
+                    p50 = endpoint_stats['p50_ms']
+                    p95 = endpoint_stats['p95_ms']
+                    st.write(f"**Outbound {client_name}:** {endpoint_stats['requests']:,} requests, "
+                             f"{endpoint_stats['failures']:,} failed, {endpoint_stats['retries']:,} retried, "
+                             f"breaker {endpoint_stats['breaker']} ({endpoint_stats['short_circuited']:,} skipped) · "
+                             f"p50 {p50 or 0:.0f} ms / p95 {p95 or 0:.0f} ms")
+
             # Table information
             st.markdown("**Table Counts:**")
             for table, count in db_info.get('table_counts', {}).items():
@@ -610,54 +685,108 @@ def display_system_status():
     
     with backup_col1:
         st.markdown("#### Backup Options")
-        if st.button("💾 Create Database Backup", key="backup_btn", use_container_width=True):
-            backup_name = backup_database()
-            if backup_name:
-                st.success(f"Backup created: {backup_name}")
-            else:
-                st.error("Backup failed")
-    
+        full_col, incr_col = st.columns(2)
+        with full_col:
+            if st.button("💾 Full Backup", key="backup_btn", use_container_width=True):
+                backup_name = backup_database('full')
+                if backup_name:
+                    st.success(f"Backup created: {backup_name}")
+                else:
+                    st.error("Backup failed")
+        with incr_col:
+            if st.button("➕ Incremental Backup", key="incr_backup_btn", use_container_width=True):
+                backup_name = backup_database('incremental')
+                if backup_name:
+                    st.success(f"Backup created: {backup_name}")
+                else:
+                    st.error("Backup failed")
+        
+        try:
+            backup_stats = get_backup_stats()
+            latest = backup_stats['latest']
+            if latest:
+                timings = latest['timings']
+                verified = {True: "✅ verified", False: "❌ failed verification"}.get(latest['verified'], "not verified")
+                st.write(f"**Latest:** {latest['kind']} · {latest['pages_written']:,}/{latest['page_count']:,} pages · "
+                         f"{latest['size_bytes'] / (1024 * 1024):.2f} MB · {verified}")
+                st.write(f"**Timings:** snapshot {timings.get('snapshot_seconds', 0):.2f}s "
+                         f"({timings.get('snapshot_steps', 0)} steps), write {timings.get('write_seconds', 0):.2f}s, "
+                         f"verify {timings.get('verify_seconds', 0):.2f}s, total {timings.get('total_seconds', 0):.2f}s")
+                st.write(f"**Stored:** {backup_stats['count']} backups, {backup_stats['total_size_mb']} MB "
+                         f"in `{backup_stats['backup_dir']}`")
+            
+                backup_names = [backup.name for backup in list_backups()]
+                selected_backup = st.selectbox("Backup", backup_names, key="selected_backup")
+                verify_col, restore_col = st.columns(2)
+                with verify_col:
+                    if st.button("🔍 Verify", key="verify_backup_btn", use_container_width=True):
+                        report = verify_backup(selected_backup)
+                        if report['ok']:
+                            st.success(f"Backup verified in {report['seconds']:.2f}s")
+                        else:
+                            st.error(f"Verification failed: {report.get('error') or report['integrity']}")
+                with restore_col:
+                    confirm_restore = st.checkbox("Confirm restore", key="confirm_restore")
+                    if st.button("♻️ Restore", key="restore_backup_btn", use_container_width=True,
+                                 disabled=not confirm_restore):
+                        try:
+                            report = restore_backup(selected_backup)
+                            st.success(f"Restored {selected_backup} in {report['seconds']:.2f}s")
+                        except Exception as e:
+                            st.error(f"Restore failed: {e}")
+        except Exception as e:
+            st.error(f"Error loading backups: {e}")
+
+        if st.button("🔁 Rebuild Analytics Rollups", key="rebuild_rollups_btn", use_container_width=True):
+            try:
+                elapsed = rebuild_search_rollups()
+                st.success(f"Analytics rollups rebuilt in {elapsed:.2f}s")
+            except Exception as e:
+                st.error(f"Rollup rebuild failed: {e}")
+
     with backup_col2:
         st.markdown("#### Export Options")
         
-        export1, export2, export3 = st.columns(3)
+        format_options = ["csv", "csv.gz"] + (["parquet"] if PARQUET_AVAILABLE else [])
+        export_format = st.selectbox("Export format", format_options, key="export_format")
+        use_date_range = st.checkbox("Limit to a date range", key="export_use_range")
+        start_date = end_date = None
+        if use_date_range:
+            range_col1, range_col2 = st.columns(2)
+            with range_col1:
+                start_date = st.date_input("From", key="export_start_date")
+            with range_col2:
+                end_date = st.date_input("To", key="export_end_date")
         
-        with export1:
-            if st.button("📊 Search Data", key="export_search_btn"):
-                try:
-                    search_data = fetch_all_searches()
-                    if search_data is not None and not search_data.empty:
-                        csv = search_data.to_csv(index=False)
-                        st.download_button(
-                            "💾 Download",
-                            csv,
-                            f"flight_searches_{datetime.now().strftime('%Y%m%d')}.csv",
-                            "text/csv",
-                            key="download_search_btn"
-                        )
-                    else:
-                        st.warning("No search data available.")
-                except Exception as e:
-                    st.error(f"Error: {e}")
-        
-        with export2:
-            if st.button("👥 Contact Data", key="export_contact_btn"):
-                try:
-                    contact_data = fetch_contacts()
-                    if contact_data is not None and not contact_data.empty:
-                        csv = contact_data.to_csv(index=False)
-                        st.download_button(
-                            "💾 Download",
-                            csv,
-                            f"contacts_{datetime.now().strftime('%Y%m%d')}.csv",
-                            "text/csv",
-                            key="download_contact_btn"
-                        )
-                    else:
-                        st.warning("No contact data available.")
-                except Exception as e:
-                    st.error(f"Error: {e}")
+        export1, export2, export3 = st.columns(3)
         
+        # Exports stream from SQLite into a temp file chunk by chunk instead
+        # of building a DataFrame and a CSV string for the whole table. The
+        # download button needs bytes, so only the finished (possibly
+        # compressed) file is read back, and the temp file is closed after.
+        for column, dataset, label in ((export1, 'flight_searches', "📊 Search Data"),
+                                       (export2, 'contacts', "👥 Contact Data")):
+            with column:
+                if st.button(label, key=f"export_{dataset}_btn"):
+                    try:
+                        with tempfile.TemporaryFile() as export_file:
+                            count = export_dataset(dataset, export_file, export_format,
+                                                   start_date=start_date, end_date=end_date)
+                            export_file.seek(0)
+                            export_bytes = export_file.read()
+                        if count:
+                            st.download_button(
+                                "💾 Download",
+                                export_bytes,
+                                default_export_filename(dataset, export_format),
+                                EXPORT_FORMATS[export_format][1],
+                                key=f"download_{dataset}_btn"
+                            )
+                        else:
+                            st.warning("No data available for export.")
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+
         with export3:
             if st.button("📈 Analytics", key="export_analytics_btn"):
                 try:
@@ -844,6 +973,206 @@ def get_base64_image(image_path):
     with open(image_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode()
 
+def build_agent(kind):
+    """Construct one travel agent together with its model and tools"""
+    if kind == "researcher":
+        return Agent(
+            name="Researcher",
+            instructions=[
+                "Identify destination, research climate, safety, top attractions, and activities.",
+                "Use reliable sources and summarize results clearly."
+            ],
+            model=Gemini(id="gemini-2.0-flash-exp"),
+            tools=[SerpApiTools(api_key=SERPAPI_KEY)],
+        )
+    if kind == "planner":
+        return Agent(
+            name="Planner",
+            instructions=[
+                "Create a detailed itinerary with travel preferences, time estimates, and budget alignment."
+            ],
+            model=Gemini(id="gemini-2.0-flash-exp"),
+        )
+    if kind == "hotel_restaurant_finder":
+        return Agent(
+            name="Hotel & Restaurant Finder",
+            instructions=[
+                "Find top-rated hotels and restaurants near main attractions. Include booking links if possible."
+            ],
+            model=Gemini(id="gemini-2.0-flash-exp"),
+            tools=[SerpApiTools(api_key=SERPAPI_KEY)],
+        )
+    raise ValueError(f"Unknown agent: {kind}")
+
+@st.cache_resource
+def get_agent_registry():
+    # Built once per process; agents are then reused by every session and rerun
+    return AgentRegistry(build_agent)
+
+def fetch_flights(source_iata, destination_iata, departure_date_obj, return_date_obj):
+    params = {
+        "engine": "google_flights",
+        "departure_id": source_iata,
+        "arrival_id": destination_iata,
+        "outbound_date": str(departure_date_obj),
+        "return_date": str(return_date_obj),
+        "currency": "INR",
+        "hl": "en",
+        "api_key": SERPAPI_KEY
+    }
+    # Repeat routes are served from the shared on-disk response cache
+    results = cached_flight_search(params)
+    return results
+
+def extract_cheapest_flights(flight_data):
+    best_flights = flight_data.get("best_flights", [])
+    return sorted(best_flights, key=lambda x: x.get("price", float("inf")))[:3]
+
+def run_travel_plan(request, progress, agent_registry):
+    """Generate a travel plan for a queued request (runs on a plan job worker)"""
+    plan_started = time.perf_counter()
+    destination = request["destination"]
+    travel_theme = request["travel_theme"]
+    activity_preferences = request["activity_preferences"]
+    budget = request["budget"]
+    flight_class = request["flight_class"]
+    hotel_rating = request["hotel_rating"]
+
+    def run_agent(kind, prompt, text_stream, on_update=None, near_match=None):
+        text_stream.prompt_tokens = estimate_tokens(prompt)
+        with agent_registry.checkout(kind) as agent:
+            return text_stream.feed(agent_output(agent, prompt, near_match=near_match), on_update=on_update)
+
+    research_prompt = (
+        f"Research top attractions in {destination} for a {request['num_days']}-day {travel_theme.lower()} trip. "
+        f"Interests: {activity_preferences}. Budget: {budget}. Class: {flight_class}. Rating: {hotel_rating}."
+    )
+    hotel_restaurant_prompt = (
+        f"Recommend hotels and restaurants in {destination} for a {travel_theme.lower()} trip. "
+        f"Preferences: {activity_preferences}. Budget: {budget}. Hotel Rating: {hotel_rating}."
+    )
+
+    # Cached answers are only reused for the same trip: the structured fields
+    # must match exactly, only the free-text preferences may differ slightly
+    research_match = ((destination, request['num_days'], travel_theme, budget, flight_class, hotel_rating),
+                      activity_preferences)
+    hotel_restaurant_match = ((destination, travel_theme, budget, hotel_rating), activity_preferences)
+
+    hotel_stream = TextStream("hotels_restaurants")
+
+    def publish_hotel_stream():
+        if hotel_stream.started:
+            progress.update("hotels_restaurants", hotel_stream.text())
+
+    # The three lookups are independent; only the planner needs all of them.
+    # Hotel recommendations are published as they stream in.
+    progress.stage("Fetching flights, researching attractions and finding hotels & restaurants")
+    stages = run_stages({
+        "flights": lambda: fetch_flights(request["source"], destination,
+                                         request["departure_date"], request["return_date"]),
+        "research": lambda: run_agent("researcher", research_prompt, TextStream("research"),
+                                      near_match=research_match),
+        "hotels_restaurants": lambda: run_agent(
+            "hotel_restaurant_finder", hotel_restaurant_prompt, hotel_stream,
+            near_match=hotel_restaurant_match,
+        ),
+    }, on_progress=publish_hotel_stream)
+
+    flight_data = stages["flights"].value if stages["flights"].ok else {}
+    cheapest_flights = extract_cheapest_flights(flight_data)
+    research_content = (stages["research"].value.text() if stages["research"].ok
+                        else "Research unavailable.")
+    hotel_restaurant_content = (hotel_stream.text() if stages["hotels_restaurants"].ok
+                                else "Hotel and restaurant recommendations are unavailable right now.")
+    progress.update("hotels_restaurants", hotel_restaurant_content, force=True)
+
+    progress.stage("Creating itinerary")
+    # Only the flight fields and text the planner needs, within a token budget
+    planning_prompt, prompt_tokens = build_planning_prompt(
+        destination, request["num_days"], travel_theme, activity_preferences, budget,
+        flight_class, hotel_rating, research_content, cheapest_flights,
+        hotel_restaurant_content,
+    )
+    itinerary_stream = TextStream("planner")
+    planning = run_stage("planner", lambda: run_agent(
+        "planner", planning_prompt, itinerary_stream,
+        on_update=lambda text: progress.update("itinerary", text),
+    ))
+
+    plan_seconds = time.perf_counter() - plan_started
+    stage_timings = (format_stage_timings(list(stages.values()) + [planning], plan_seconds)
+                     + format_token_report(prompt_tokens))
+    print("⏱️ Travel plan stages: " + "; ".join(stage_timings))
+
+    return {
+        "cheapest_flights": cheapest_flights,
+        "hotels_restaurants": hotel_restaurant_content,
+        "itinerary": itinerary_stream.text() if planning.ok else None,
+        "itinerary_error": None if planning.ok else str(planning.error),
+        "stage_errors": {name: str(stage.error) for name, stage in stages.items() if not stage.ok},
+        "stage_timings": stage_timings,
+    }
+
+@st.cache_resource
+def get_crm_dispatcher():
+    # One dispatcher per process drains the CRM outbox in the background
+    return CrmOutboxDispatcher().start()
+
+# Start on every page so deliveries left over from a previous run go out
+get_crm_dispatcher()
+
+@st.cache_resource
+def get_plan_job_queue():
+    # One worker pool per process; jobs live in SQLite so they outlive reruns
+    agent_registry = get_agent_registry()
+    return PlanJobQueue(
+        lambda request, progress: run_travel_plan(request, progress, agent_registry)
+    ).start()
+
+def render_flight_cards(cheapest_flights, source, destination):
+    """Render up to three flight option cards"""
+    if not cheapest_flights:
+        st.warning("No flight data available.")
+        return
+    cols = st.columns(len(cheapest_flights))
+    for idx, flight in enumerate(cheapest_flights):
+        with cols[idx]:
+            airline_logo = flight.get("airline_logo", "")
+            airline_name = flight.get("airline", "Unknown Airline")
+            price = flight.get("price", "Not Available")
+            total_duration_minutes = flight.get("total_duration", "N/A")
+
+            flights_details = flight.get("flights", [{}])
+            departure_airport_info = flights_details[0].get("departure_airport", {})
+            arrival_airport_info = flights_details[-1].get("arrival_airport", {})
+
+            departure_time = format_datetime(departure_airport_info.get("time", "N/A"))
+            arrival_time = format_datetime(arrival_airport_info.get("time", "N/A"))
+
+            booking_link = flight.get("link", f"https://www.google.com/flights?q={source}+{destination}")
+
+            st.markdown(
+                f"""
+                <div class="flight-card">
+                    <img src="{airline_logo}" alt="Airline Logo" />
+                    <h3>{airline_name}</h3>
+                    <p><strong>Departure:</strong> {departure_time}</p>
+                    <p><strong>Arrival:</strong> {arrival_time}</p>
+                    <p><strong>Duration:</strong> {total_duration_minutes} min</p>
+                    <div class="price">₹ {price}</div>
+                    <a href="{booking_link}" target="_blank" class="book-now-link">Book Now</a>
+                </div>
+                """,
+                unsafe_allow_html=True
+            )
+
+def format_datetime(iso_string):
+    try:
+        dt = datetime.strptime(iso_string, "%Y-%m-%d %H:%M")
+        return dt.strftime("%b-%d, %Y | %I:%M %p")
+    except:
+        return "N/A"
+
 logo_path = "Roamlogo.png"
 logo_base64 = get_base64_image(logo_path)
 
@@ -871,32 +1200,16 @@ MINDEE_API_KEY = "YOUR_MINDEE_API_KEY"
 
 class PassportScanner:
     def __init__(self):
-        self.visa_data = None
-        self.country_flags = {}
         self.load_visa_dataset()
-        self.load_country_flags()
 
     def load_visa_dataset(self):
-        try:
-            url1 = "https://raw.githubusercontent.com/ilyankou/passport-index-dataset/master/passport-index-tidy.csv"
-            try:
-                self.visa_data = pd.read_csv(url1)
-                return
-            except Exception as e1:
-                st.warning(f"Failed to load primary dataset: {e1}. Attempting secondary...")
-
-            url2 = "https://raw.githubusercontent.com/datasets/passport-index/main/data/passport-index-tidy.csv"
-            try:
-                self.visa_data = pd.read_csv(url2)
-                return
-            except Exception as e2:
-                st.warning(f"Failed to load secondary dataset: {e2}. Creating comprehensive dataset as fallback...")
+        # Local snapshot first (offline-safe); the network is only used by the
+        # background refresh, which swaps in new data when it changes
+        self.visa_dataset = VisaDatasetStore(fallback=self.create_comprehensive_visa_data).load().start()
 
-            self.create_comprehensive_visa_data()
-
-        except Exception as e:
-            st.error(f"Error loading visa dataset: {e}")
-            self.create_comprehensive_visa_data()
+    @property
+    def visa_data(self):
+        return self.visa_dataset.data
 
     def create_comprehensive_visa_data(self):
         visa_data = {
@@ -970,81 +1283,8 @@ class PassportScanner:
             }
         }
 
-        passport_data = []
-        destination_data = []
-        requirement_data = []
-
-        for passport_country, data in visa_data.items():
-            for dest_country in data['visa_free']:
-                passport_data.append(passport_country)
-                destination_data.append(dest_country)
-                requirement_data.append('visa free')
-
-        self.visa_data = pd.DataFrame({
-            'Passport': passport_data,
-            'Destination': destination_data,
-            'Requirement': requirement_data
-        })
-
-    def load_country_flags(self):
-        self.country_flags = {
-            'Thailand': '', 'Singapore': '', 'Malaysia': '', 'Indonesia': '',
-            'Philippines': '', 'Cambodia': '', 'Laos': '', 'Myanmar': '',
-            'Vietnam': '', 'Brunei': '', 'Nepal': '', 'Bhutan': '',
-            'Maldives': '', 'Sri Lanka': '', 'Bangladesh': '', 'India': '',
-            'Japan': '', 'South Korea': '', 'China': '', 'Taiwan': '',
-            'Hong Kong': '', 'Macau': '', 'Mongolia': '', 'Kazakhstan': '',
-            'Kyrgyzstan': '', 'Tajikistan': '', 'Uzbekistan': '',
-
-            'UAE': '', 'Qatar': '', 'Oman': '', 'Kuwait': '',
-            'Bahrain': '', 'Saudi Arabia': '', 'Jordan': '', 'Lebanon': '',
-            'Syria': '', 'Iraq': '', 'Iran': '', 'Israel': '',
-            'Turkey': '', 'Cyprus': '', 'Armenia': '', 'Georgia': '',
-
-            'United Kingdom': '', 'Ireland': '', 'France': '', 'Germany': '',
-            'Italy': '', 'Spain': '', 'Portugal': '', 'Netherlands': '',
-            'Belgium': '', 'Luxembourg': '', 'Switzerland': '', 'Austria': '',
-            'Denmark': '', 'Sweden': '', 'Norway': '', 'Finland': '',
-            'Iceland': '', 'Greece': '', 'Malta': '', 'Poland': '',
-            'Czech Republic': '', 'Slovakia': '', 'Hungary': '',
-            'Slovenia': '', 'Croatia': '', 'Bosnia and Herzegovina': '',
-            'Serbia': '', 'Montenegro': '', 'Albania': '',
-            'North Macedonia': '', 'Bulgaria': '', 'Romania': '',
-            'Moldova': '', 'Ukraine': '', 'Belarus': '', 'Russia': '',
-            'Estonia': '', 'Latvia': '', 'Lithuania': '',
-
-            'United States': '', 'Canada': '', 'Mexico': '', 'Guatemala': '',
-            'Belize': '', 'El Salvador': '', 'Honduras': '', 'Nicaragua': '',
-            'Costa Rica': '', 'Panama': '', 'Colombia': '', 'Venezuela': '',
-            'Guyana': '', 'Suriname': '', 'Brazil': '', 'Ecuador': '',
-            'Peru': '', 'Bolivia': '', 'Paraguay': '', 'Uruguay': '',
-            'Argentina': '', 'Chile': '', 'Cuba': '', 'Jamaica': '',
-            'Haiti': '', 'Dominican Republic': '', 'Puerto Rico': '',
-            'Trinidad and Tobago': '', 'Barbados': '', 'Saint Lucia': '',
-            'Grenada': '', 'Saint Vincent and the Grenadines': '',
-            'Saint Kitts and Nevis': '', 'Dominica': '',
-
-            'Morocco': '', 'Algeria': '', 'Tunisia': '', 'Libya': '',
-            'Egypt': '', 'Sudan': '', 'Ethiopia': '', 'Kenya': '',
-            'Uganda': '', 'Tanzania': '', 'Rwanda': '', 'Burundi': '',
-            'Somalia': '', 'Djibouti': '', 'Madagascar': '', 'Mauritius': '',
-            'Seychelles': '', 'Comoros': '', 'South Africa': '',
-            'Namibia': '', 'Botswana': '', 'Zimbabwe': '', 'Zambia': '',
-            'Mozambique': '', 'Malawi': '', 'Angola': '', 'Ghana': '',
-            'Nigeria': '', 'Senegal': '', 'Mali': '', 'Burkina Faso': '',
-            'Niger': '', 'Chad': '', 'Cameroon': '', 'Central African Republic': '',
-            'Democratic Republic of the Congo': '', 'Republic of the Congo': '',
-            'Gabon': '', 'Equatorial Guinea': '', 'Sao Tome and Principe': '',
-            'Cape Verde': '', 'Guinea-Bissau': '', 'Guinea': '',
-            'Sierra Leone': '', 'Liberia': '', 'Ivory Coast': '', 'Togo': '',
-            'Benin': '',
-
-            'Australia': '', 'New Zealand': '', 'Fiji': '', 'Papua New Guinea': '',
-            'Solomon Islands': '', 'Vanuatu': '', 'New Caledonia': '',
-            'French Polynesia': '', 'Samoa': '', 'Tonga': '', 'Tuvalu': '',
-            'Kiribati': '', 'Nauru': '', 'Palau': '', 'Marshall Islands': '',
-            'Micronesia': '', 'Cook Islands': '', 'Niue': ''
-        }
+        # Same bucket layout as visa_data.json, so both feed one tidy frame
+        return pd.concat([bucket_frame(visa_data), load_bucket_file('visa_data.json')], ignore_index=True)
 
     def extract_passport_info_tesseract(self, image_file):
         try:
@@ -1098,27 +1338,16 @@ class PassportScanner:
         return None
 
     def get_visa_free_countries(self, passport_country):
-        if self.visa_data is None:
+        visa_snapshot = self.visa_dataset.snapshot
+        if visa_snapshot.data is None:
             st.error("Visa dataset not loaded")
             return []
 
         try:
             passport_country_clean = passport_country.strip()
 
-            visa_free_data = self.visa_data[
-                (self.visa_data['Passport'].str.strip().str.lower() == passport_country_clean.lower()) &
-                (self.visa_data['Requirement'].str.contains('visa free|visa-free|visa on arrival', case=False, na=False))
-            ]
-
-            if visa_free_data.empty:
-                visa_free_data = self.visa_data[
-                    (self.visa_data['Passport'].str.contains(passport_country_clean, case=False, na=False)) &
-                    (self.visa_data['Requirement'].str.contains('visa free|visa-free|visa on arrival', case=False, na=False))
-                ]
-
-            countries = sorted(visa_free_data['Destination'].unique().tolist())
-
-            countries = [country for country in countries if country and str(country).strip()]
+            # Precomputed when the dataset was loaded: no DataFrame scan per call
+            countries = list(visa_snapshot.index.visa_free(passport_country_clean))
 
             st.success(f"Found {len(countries)} visa-free destinations for {passport_country_clean}")
 
@@ -1128,7 +1357,12 @@ class PassportScanner:
             st.error(f"Error fetching visa-free countries: {e}")
             return []
 
-passport_scanner = PassportScanner()
+@st.cache_resource
+def get_passport_scanner():
+    # Built once per process instead of on every rerun of every session
+    return PassportScanner()
+
+passport_scanner = get_passport_scanner()
 
 # Navigation Bar
 col_nav = st.columns(5)
@@ -1160,7 +1394,7 @@ if st.session_state.current_page == "Travel Plan":
 
             popular_destinations = []
             if st.session_state.passport_country == 'India':
-                popular_destinations = [country for country in ['Thailand', 'Singapore', 'Malaysia', 'UAE', 'Nepal']
+                popular_destinations = [country for country in ['Thailand', 'Singapore', 'Malaysia', 'United Arab Emirates', 'Nepal']
                                           if country in st.session_state.visa_free_countries]
             elif st.session_state.passport_country == 'United States':
                 popular_destinations = [country for country in ['United Kingdom', 'France', 'Germany', 'Japan', 'Canada']
@@ -1171,7 +1405,7 @@ if st.session_state.current_page == "Travel Plan":
                 dest_cols = st.columns(len(popular_destinations))
                 for idx, dest in enumerate(popular_destinations):
                     with dest_cols[idx]:
-                        flag = passport_scanner.country_flags.get(dest, '')
+                        flag = country_flag(dest)
                         st.write(f"{flag} {dest}")
 
         source = st.text_input("Departure City (IATA Code):", "BOM")
@@ -1206,32 +1440,6 @@ if st.session_state.current_page == "Travel Plan":
         travel_insurance_checkbox = st.checkbox("Get Travel Insurance")
         currency_converter_checkbox = st.checkbox("Currency Exchange Rates")
 
-    def format_datetime(iso_string):
-        try:
-            dt = datetime.strptime(iso_string, "%Y-%m-%d %H:%M")
-            return dt.strftime("%b-%d, %Y | %I:%M %p")
-        except:
-            return "N/A"
-
-    def fetch_flights(source_iata, destination_iata, departure_date_obj, return_date_obj):
-        params = {
-            "engine": "google_flights",
-            "departure_id": source_iata,
-            "arrival_id": destination_iata,
-            "outbound_date": str(departure_date_obj),
-            "return_date": str(return_date_obj),
-            "currency": "INR",
-            "hl": "en",
-            "api_key": SERPAPI_KEY
-        }
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        return results
-    
-    def extract_cheapest_flights(flight_data):
-        best_flights = flight_data.get("best_flights", [])
-        return sorted(best_flights, key=lambda x: x.get("price", float("inf")))[:3]
-
     def get_destination_country(iata_code):
         iata_to_country = {
             'DEL': 'India', 'BOM': 'India', 'BLR': 'India', 'MAA': 'India',
@@ -1247,41 +1455,46 @@ if st.session_state.current_page == "Travel Plan":
         }
         return iata_to_country.get(iata_code.upper(), 'Unknown')
 
-    researcher = Agent(
-        name="Researcher",
-        instructions=[
-            "Identify destination, research climate, safety, top attractions, and activities.",
-            "Use reliable sources and summarize results clearly."
-        ],
-        model=Gemini(id="gemini-2.0-flash-exp"),
-        tools=[SerpApiTools(api_key=SERPAPI_KEY)],
-    )
-
-    planner = Agent(
-        name="Planner",
-        instructions=[
-            "Create a detailed itinerary with travel preferences, time estimates, and budget alignment."
-        ],
-        model=Gemini(id="gemini-2.0-flash-exp"),
-    )
+    if st.button("Generate Travel Plan"):
+        # Generation runs on the background job queue; the page only polls
+        plan_request = {
+            "source": source.strip().upper(),
+            "destination": destination.strip().upper(),
+            "departure_date": str(departure_date),
+            "return_date": str(return_date),
+            "num_days": num_days,
+            "travel_theme": travel_theme,
+            "activity_preferences": activity_preferences,
+            "budget": budget,
+            "flight_class": flight_class,
+            "hotel_rating": hotel_rating,
+        }
+        try:
+            job_id = get_plan_job_queue().submit(plan_request)
+            st.session_state.plan_job_id = job_id
+            # Kept in the URL so a browser refresh picks the same job back up
+            st.query_params["plan_job"] = job_id
+        except Exception as e:
+            st.error(f"Could not start travel plan: {e}")
 
-    hotel_restaurant_finder = Agent(
-        name="Hotel & Restaurant Finder",
-        instructions=[
-            "Find top-rated hotels and restaurants near main attractions. Include booking links if possible."
-        ],
-        model=Gemini(id="gemini-2.0-flash-exp"),
-        tools=[SerpApiTools(api_key=SERPAPI_KEY)],
-    )
+    plan_job_id = st.session_state.get("plan_job_id") or st.query_params.get("plan_job")
+    plan_job = get_plan_job_queue().get(plan_job_id) if plan_job_id else None
 
-    if st.button("Generate Travel Plan"):
+    if plan_job is not None:
         visa_status = "Unknown"
-        destination_country = get_destination_country(destination)
+        destination_country = get_destination_country(plan_job.request["destination"])
+
+        destination_info = country_info(destination_country)
+        if destination_info:
+            # Flag and region come from the shared country table
+            destination_country = f"{destination_info.flag} {destination_info.name} ({destination_info.region})"
 
         if st.session_state.passport_country and st.session_state.visa_free_countries:
-            if destination_country in st.session_state.visa_free_countries:
+            # Compare ISO codes so "UAE" matches the dataset's "United Arab Emirates"
+            visa_free_codes = {country_iso3(country) for country in st.session_state.visa_free_countries}
+            if destination_info and destination_info.iso3 in visa_free_codes:
                 visa_status = "Visa-Free"
-            elif destination_country != 'Unknown':
+            elif destination_info:
                 visa_status = "Visa Required"
             else:
                 visa_status = "Check visa requirements"
@@ -1293,94 +1506,70 @@ if st.session_state.current_page == "Travel Plan":
         else:
             st.info(f"{visa_status} for {destination_country}")
 
-        with st.spinner("Fetching best flight options..."):
-            flight_data = fetch_flights(source, destination, departure_date, return_date)
-            cheapest_flights = extract_cheapest_flights(flight_data)
-
-        with st.spinner("Researching best attractions & activities..."):
-            research_prompt = (
-                f"Research top attractions in {destination} for a {num_days}-day {travel_theme.lower()} trip. "
-                f"Interests: {activity_preferences}. Budget: {budget}. Class: {flight_class}. Rating: {hotel_rating}."
-            )
-            research_results = researcher.run(research_prompt, stream=False)
-
-        with st.spinner("Searching for hotels & restaurants..."):
-            hotel_restaurant_prompt = (
-                f"Recommend hotels and restaurants in {destination} for a {travel_theme.lower()} trip. "
-                f"Preferences: {activity_preferences}. Budget: {budget}. Hotel Rating: {hotel_rating}."
-            )
-            hotel_restaurant_results = hotel_restaurant_finder.run(hotel_restaurant_prompt, stream=False)
-
-        with st.spinner("Creating itinerary..."):
-            planning_prompt = (
-                f"Create a {num_days}-day travel itinerary to {destination} for a {travel_theme.lower()} trip. "
-                f"Preferences: {activity_preferences}. Budget: {budget}. Class: {flight_class}. Rating: {hotel_rating}. "
-                f"Research: {research_results.content}. Flights: {json.dumps(cheapest_flights)}. "
-                f"Hotels & Restaurants: {hotel_restaurant_results.content}."
-            )
-            itinerary = planner.run(planning_prompt, stream=False)
+    if plan_job is not None and not plan_job.finished:
+        partial = plan_job.partial or {}
+        st.info(f"⏳ {plan_job.stage or 'Waiting for a free planner'}...")
+        if partial.get("hotels_restaurants"):
+            st.subheader("Hotels & Restaurants")
+            st.markdown(partial["hotels_restaurants"] + " ▌")
+        if partial.get("itinerary"):
+            st.subheader("Your Personalized Itinerary")
+            st.markdown(partial["itinerary"] + " ▌")
+        time.sleep(PLAN_JOB_POLL_SECONDS)
+        st.rerun()
+
+    elif plan_job is not None and plan_job.status == "failed":
+        st.error(f"Travel plan generation failed: {plan_job.error}")
+
+    elif plan_job is not None:
+        plan_request = plan_job.request
+        result = plan_job.result
+        for stage_name, stage_error in result["stage_errors"].items():
+            st.warning(f"{stage_name.replace('_', ' ').title()} step failed: {stage_error}")
 
         st.subheader("Cheapest Flight Options")
-        if cheapest_flights:
-            cols = st.columns(len(cheapest_flights))
-            for idx, flight in enumerate(cheapest_flights):
-                with cols[idx]:
-                    airline_logo = flight.get("airline_logo", "")
-                    airline_name = flight.get("airline", "Unknown Airline")
-                    price = flight.get("price", "Not Available")
-                    total_duration_minutes = flight.get("total_duration", "N/A")
-
-                    flights_details = flight.get("flights", [{}])
-                    departure_airport_info = flights_details[0].get("departure_airport", {})
-                    arrival_airport_info = flights_details[-1].get("arrival_airport", {})
-
-                    departure_time = format_datetime(departure_airport_info.get("time", "N/A"))
-                    arrival_time = format_datetime(arrival_airport_info.get("time", "N/A"))
-                    
-                    booking_link = flight.get("link", f"https://www.google.com/flights?q={source}+{destination}")
-
-                    st.markdown(
-                        f"""
-                        <div class="flight-card">
-                            <img src="{airline_logo}" alt="Airline Logo" />
-                            <h3>{airline_name}</h3>
-                            <p><strong>Departure:</strong> {departure_time}</p>
-                            <p><strong>Arrival:</strong> {arrival_time}</p>
-                            <p><strong>Duration:</strong> {total_duration_minutes} min</p>
-                            <div class="price">₹ {price}</div>
-                            <a href="{booking_link}" target="_blank" class="book-now-link">Book Now</a>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-        else:
-            st.warning("No flight data available.")
+        render_flight_cards(result["cheapest_flights"], plan_request["source"], plan_request["destination"])
 
         st.subheader("Hotels & Restaurants")
-        st.write(hotel_restaurant_results.content)
+        st.markdown(result["hotels_restaurants"])
 
         st.subheader("Your Personalized Itinerary")
-        st.write(itinerary.content)
+        if result["itinerary"] is not None:
+            st.markdown(result["itinerary"])
+        else:
+            st.error(f"Could not create the itinerary: {result['itinerary_error']}")
 
-        # inside Generate Travel Plan block, after you build 'itinerary' and cheapest_flights
-        price_estimate = None
-        try:
-            price_estimate = float(cheapest_flights[0].get("price")) if cheapest_flights and cheapest_flights[0].get("price") else None
-        except Exception:
+        with st.expander("⏱️ Stage timings", expanded=False):
+            for line in result["stage_timings"]:
+                st.write(f"• {line}")
+
+        # Log each plan once per session, even though reruns redraw it
+        logged_jobs = st.session_state.setdefault("logged_plan_jobs", set())
+        if plan_job.id not in logged_jobs:
+            logged_jobs.add(plan_job.id)
+            cheapest_flights = result["cheapest_flights"]
             price_estimate = None
+            try:
+                price_estimate = float(cheapest_flights[0].get("price")) if cheapest_flights and cheapest_flights[0].get("price") else None
+            except Exception:
+                price_estimate = None
 
-        # Log into DB
-        try:
-            log_flight_search(
-                source, destination, str(departure_date), str(return_date),
-                num_days, budget, flight_class, price_estimate
-            )
-        except Exception as e:
-            st.warning(f"Could not log flight search: {e}")
+            # Log into DB
+            try:
+                log_flight_search(
+                    plan_request["source"], plan_request["destination"],
+                    plan_request["departure_date"], plan_request["return_date"],
+                    plan_request["num_days"], plan_request["budget"], plan_request["flight_class"],
+                    price_estimate
+                )
+            except Exception as e:
+                st.warning(f"Could not log flight search: {e}")
 
         st.success("Travel plan generated successfully!")
 
 elif st.session_state.current_page == "Passport":
+    # One dataset version for the whole page, even if a refresh lands mid-run
+    visa_snapshot = passport_scanner.visa_dataset.snapshot
     st.markdown("""
         <div class="passport-scan">
             <h2 style="color: white; text-align: center;">Passport Scanner</h2>
@@ -1424,8 +1613,8 @@ elif st.session_state.current_page == "Passport":
         st.write("Or select your passport country manually:")
 
         available_countries = []
-        if passport_scanner.visa_data is not None:
-            available_countries = sorted(passport_scanner.visa_data['Passport'].unique().tolist())
+        if visa_snapshot.data is not None:
+            available_countries = list(visa_snapshot.index.passports)
         else:
             available_countries = [
                 'India', 'United States', 'United Kingdom', 'Germany', 'France',
@@ -1441,12 +1630,39 @@ elif st.session_state.current_page == "Passport":
                 visa_free = passport_scanner.get_visa_free_countries(selected_country)
                 st.session_state.visa_free_countries = visa_free
 
+    st.markdown("---")
+    st.subheader("Group Travel")
+    st.write("Booking a mixed-nationality group? Pick every passport in the group to see where all of you can go.")
+    group_passports = st.multiselect("Passports in the group:", available_countries, key="group_passports")
+    if len(group_passports) >= 2:
+        group_access = visa_snapshot.matrix.group_access(group_passports)
+        st.info(f"{len(group_access.any_category)} destinations are open to all {len(group_access.passports)} "
+                f"passports without a consular visa")
+        group_labels = {
+            'visa_free': "Visa-free for everyone",
+            'visa_on_arrival': "Visa on arrival for everyone",
+            'e_visa': "e-Visa for everyone",
+        }
+        group_tabs = st.tabs([f"{label} ({len(group_access.by_category.get(category, ()))})"
+                              for category, label in group_labels.items()]
+                             + [f"Any of the above ({len(group_access.any_category)})"])
+        for tab, destinations in zip(group_tabs, [group_access.by_category.get(category, ())
+                                                  for category in group_labels] + [group_access.any_category]):
+            with tab:
+                st.write(", ".join(destinations) if destinations else "No common destinations in this category.")
+        if group_access.unknown:
+            st.warning(f"No visa data for: {', '.join(group_access.unknown)}")
+
     if st.session_state.passport_country and st.session_state.visa_free_countries:
         st.markdown("---")
         st.subheader(f"Visa-Free Destinations for {st.session_state.passport_country} Passport Holders")
 
         st.info(f"Great news! You can travel to {len(st.session_state.visa_free_countries)} countries visa-free!")
 
+        passport_rank = visa_snapshot.matrix.rank_of(st.session_state.passport_country)
+        if passport_rank:
+            st.caption(f"Passport strength: #{passport_rank[0]} of {passport_rank[1]} passports by visa-free access")
+
         search_country = st.text_input("Search countries:", placeholder="Type to filter countries...")
 
         filtered_countries = st.session_state.visa_free_countries
@@ -1460,7 +1676,7 @@ elif st.session_state.current_page == "Passport":
             for idx, country in enumerate(filtered_countries):
                 col_idx = idx % 4
                 with cols[col_idx]:
-                    flag = passport_scanner.country_flags.get(country, '')
+                    flag = country_flag(country)
 
                     st.markdown(f"""
                         <div class="visa-free-card">
@@ -1471,59 +1687,24 @@ elif st.session_state.current_page == "Passport":
         else:
             st.write("No countries found matching your search.")
 
+        with st.expander("Who can travel to a destination visa-free?"):
+            visa_matrix = visa_snapshot.matrix
+            reverse_destination = st.selectbox("Destination", list(visa_matrix.names), key="reverse_visa_destination")
+            if reverse_destination:
+                entering_passports = visa_matrix.passports_for(reverse_destination)
+                st.write(f"{len(entering_passports)} passports can enter {reverse_destination} visa-free "
+                         f"or with a visa on arrival:")
+                st.write(", ".join(entering_passports) or "None in the current dataset")
+
         st.markdown("### Regional Breakdown")
 
-        asia_countries = ['Thailand', 'Singapore', 'Malaysia', 'Indonesia', 'Philippines',
-                          'Cambodia', 'Laos', 'Myanmar', 'Vietnam', 'Brunei', 'Nepal', 'Bhutan',
-                          'South Korea', 'Japan', 'Mongolia', 'Kazakhstan', 'Kyrgyzstan',
-                          'Tajikistan', 'Uzbekistan']
-
-        europe_countries = ['Germany', 'France', 'Italy', 'Spain', 'United Kingdom', 'Ireland',
-                            'Netherlands', 'Belgium', 'Switzerland', 'Austria', 'Portugal',
-                            'Greece', 'Denmark', 'Sweden', 'Norway', 'Finland', 'Iceland',
-                            'Poland', 'Czech Republic', 'Slovakia', 'Hungary', 'Slovenia',
-                            'Croatia', 'Serbia', 'Montenegro', 'Albania', 'North Macedonia',
-                            'Bosnia and Herzegovina', 'Bulgaria', 'Romania', 'Moldova', 'Belarus']
-
-        middle_east_countries = ['UAE', 'Qatar', 'Oman', 'Kuwait', 'Bahrain', 'Saudi Arabia',
-                                 'Jordan', 'Turkey', 'Armenia', 'Georgia', 'Iran', 'Israel']
-
-        africa_countries = ['Mauritius', 'Seychelles', 'Madagascar', 'Comoros', 'Cape Verde',
-                            'Guinea-Bissau', 'Mozambique', 'Zimbabwe', 'Zambia', 'Uganda',
-                            'Rwanda', 'Burundi', 'Tanzania', 'Kenya', 'Ethiopia', 'Djibouti',
-                            'Somalia', 'Sudan', 'Egypt', 'Morocco', 'Tunisia', 'South Africa',
-                            'Namibia', 'Botswana']
-
-        americas_countries = ['United States', 'Canada', 'Mexico', 'Brazil', 'Argentina',
-                              'Chile', 'Uruguay', 'Paraguay', 'Colombia', 'Ecuador', 'Peru',
-                              'Bolivia', 'Venezuela', 'Guyana', 'Suriname', 'Jamaica', 'Haiti',
-                              'Barbados', 'Trinidad and Tobago', 'Dominica', 'Grenada',
-                              'Saint Lucia', 'Saint Vincent and the Grenadines',
-                              'Saint Kitts and Nevis', 'El Salvador', 'Honduras', 'Nicaragua']
-
-        oceania_countries = ['Australia', 'New Zealand', 'Fiji', 'Vanuatu', 'Samoa', 'Tonga',
-                             'Cook Islands', 'Niue', 'Tuvalu', 'Micronesia', 'Papua New Guinea']
-
-        asia_count = sum(1 for country in st.session_state.visa_free_countries if country in asia_countries)
-        europe_count = sum(1 for country in st.session_state.visa_free_countries if country in europe_countries)
-        middle_east_count = sum(1 for country in st.session_state.visa_free_countries if country in middle_east_countries)
-        africa_count = sum(1 for country in st.session_state.visa_free_countries if country in africa_countries)
-        americas_count = sum(1 for country in st.session_state.visa_free_countries if country in americas_countries)
-        oceania_count = sum(1 for country in st.session_state.visa_free_countries if country in oceania_countries)
-
-        col1, col2, col3, col4, col5, col6 = st.columns(6)
-        with col1:
-            st.metric("Asia", asia_count)
-        with col2:
-            st.metric("Europe", europe_count)
-        with col3:
-            st.metric("Middle East", middle_east_count)
-        with col4:
-            st.metric("Africa", africa_count)
-        with col5:
-            st.metric("Americas", americas_count)
-        with col6:
-            st.metric("Oceania", oceania_count)
+        # One grouped count over the canonical country table; names it does not know land in "Other"
+        regional_counts = (visa_snapshot.matrix.region_breakdown(st.session_state.passport_country)
+                           or region_breakdown(st.session_state.visa_free_countries))
+        region_cols = st.columns(len(regional_counts))
+        for region_col, (region, count) in zip(region_cols, regional_counts.items()):
+            with region_col:
+                st.metric(region, count)
 
 elif st.session_state.current_page == "IVR Call":
     # Replace this with your actual n8n webhook URL
@@ -1544,11 +1725,11 @@ elif st.session_state.current_page == "IVR Call":
                     st.write(f"Debug: Sending request to {N8N_WEBHOOK_URL}")
                     st.write(f"Debug: Payload: {payload}")
 
-                    response = requests.post(
-                        N8N_WEBHOOK_URL, 
+                    # Pooled session with short timeouts; a failing webhook trips its breaker
+                    response = get_http_client('n8n').post(
+                        N8N_WEBHOOK_URL,
                         json=payload,
-                        headers={'Content-Type': 'application/json'},
-                        timeout=30  # Add timeout
+                        headers={'Content-Type': 'application/json'}
                     )
                     
                     # Enhanced response handling
@@ -1570,6 +1751,8 @@ elif st.session_state.current_page == "IVR Call":
                         st.error(f"Call initiation failed. Status: {response.status_code}")
                         st.error(f"Response content: {response.text}")
                         
+                except CircuitOpenError as breaker_error:
+                    st.error(f"Calling service is temporarily unavailable. {breaker_error}")
                 except requests.exceptions.Timeout:
                     st.error("Request timed out. Please check your internet connection and try again.")
                 except requests.exceptions.ConnectionError:
@@ -1591,7 +1774,7 @@ elif st.session_state.current_page == "IVR Call":
     # Add a test connectivity button
     if st.button("Test Webhook Connectivity"):
         try:
-            test_response = requests.get(N8N_WEBHOOK_URL.replace('/webhook/', '/webhook-test/'), timeout=10)
+            test_response = get_http_client('n8n').get(N8N_WEBHOOK_URL.replace('/webhook/', '/webhook-test/'), retries=0)
             st.info(f"Webhook test response: {test_response.status_code}")
         except Exception as e:
             st.error(f"Webhook connectivity test failed: {e}")
@@ -1618,6 +1801,14 @@ elif st.session_state.current_page == "Contact Us":
 
         def save_contact_locally(first_name, last_name, email, phone, message=""):
             """Save contact to local database using the imported function"""
+            # The CRM copy goes into the outbox in the same transaction
+            crm_payload = {
+                "firstName": first_name,
+                "secondName": last_name,
+                "email": email,
+                "phone": phone,
+                "message": message
+            }
             try:
                 # Fix: Use the correct function signature from your database code
                 success = log_enhanced_contact(
@@ -1625,7 +1816,8 @@ elif st.session_state.current_page == "Contact Us":
                     secondName=last_name,  # Note: database uses secondName, not last_name
                     email=email,
                     phone=phone,
-                    source='web_form'
+                    source='web_form',
+                    crm_payload=crm_payload
                 )
                 
                 if success:
@@ -1642,28 +1834,6 @@ elif st.session_state.current_page == "Contact Us":
             except Exception as e:
                 return False, f"Database error: {e}"
 
-        def send_to_vendasta(first_name, last_name, email, phone, message=""):
-            """Send contact info to Vendasta CRM"""
-            payload = {
-                "firstName": first_name,
-                "secondName": last_name,
-                "email": email,
-                "phone": phone,
-                "message": message
-            }
-            try:
-                res = requests.post(
-                    "https://automations.businessapp.io/start/UNMG/59276034-e50b-4344-b053-7022d7eac352",
-                    json=payload,
-                    timeout=10
-                )
-                if res.status_code == 200:
-                    return True, "Info sent to our CRM successfully!"
-                else:
-                    return False, f"CRM submission failed. Status code: {res.status_code}"
-            except Exception as e:
-                return False, f"Error sending to CRM: {e}"
-
         if st.button("📤 Send My Info", key="send_contact_info"):
             if all([first_name, last_name, email, phone]):
                 with st.spinner("Saving your information..."):
@@ -1672,14 +1842,9 @@ elif st.session_state.current_page == "Contact Us":
                     
                     if local_success:
                         st.success(f"✅ {local_message}")
-                        
-                        # Then send to Vendasta
-                        vendasta_success, vendasta_message = send_to_vendasta(first_name, last_name, email, phone, message)
-                        
-                        if vendasta_success:
-                            st.success(f"✅ {vendasta_message}")
-                        else:
-                            st.warning(f"⚠️ {vendasta_message} (But saved locally)")
+                        # Delivered to Vendasta in the background, with retries
+                        get_crm_dispatcher().wake()
+                        st.info("📨 Your info will be shared with our CRM shortly.")
                         
                     else:
                         st.error(f"❌ {local_message}")
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Modules read their ROAMGENIE_* settings at import time, so point every
+# on-disk store at a scratch directory before anything is imported
+_scratch = tempfile.mkdtemp(prefix='roamgenie_tests_')
+os.environ.setdefault('ROAMGENIE_DB_PATH', os.path.join(_scratch, 'roamgenie.db'))
+os.environ.setdefault('ROAMGENIE_FLIGHT_CACHE_PATH', os.path.join(_scratch, 'flight_cache.db'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import crm_outbox
+import db_utils
+from crm_outbox import CrmOutboxDispatcher, CrmRejectedError
+
+
+@pytest.fixture(autouse=True)
+def empty_outbox():
+    with db_utils.get_connection() as conn:
+        conn.execute("DELETE FROM crm_outbox")
+        conn.commit()
+
+
+def enqueue(*names):
+    with db_utils.get_connection() as conn:
+        conn.executemany("INSERT INTO crm_outbox (idempotency_key, payload) VALUES (?, ?)",
+                         [(f'key-{name}', json.dumps({'name': name})) for name in names])
+        conn.commit()
+
+
+def outbox():
+    with db_utils.get_connection() as conn:
+        rows = conn.execute(
+            "SELECT idempotency_key, status, attempts FROM crm_outbox ORDER BY id"
+        ).fetchall()
+    return {key: (status, attempts) for key, status, attempts in rows}
+
+
+def test_each_outcome_is_saved_before_the_next_row_is_sent():
+    enqueue('a', 'b')
+    seen = []
+
+    def send(payload, idempotency_key):
+        seen.append(dict(outbox()))
+
+    CrmOutboxDispatcher(send=send).dispatch_batch()
+    assert seen[1]['key-a'] == ('sent', 1)
+    assert outbox() == {'key-a': ('sent', 1), 'key-b': ('sent', 1)}
+
+
+def test_rows_reclaimed_by_another_dispatcher_are_not_sent_or_overwritten():
+    enqueue('a', 'b')
+    sent = []
+
+    def send(payload, idempotency_key):
+        sent.append(idempotency_key)
+        # Our claim expired during this slow send and another dispatcher took every row
+        with db_utils.get_connection() as conn:
+            conn.execute("UPDATE crm_outbox SET claim_token = 'other', status = 'sending'")
+            conn.commit()
+
+    dispatcher = CrmOutboxDispatcher(send=send)
+    dispatcher.dispatch_batch()
+    assert sent == ['key-a']
+    assert outbox() == {'key-a': ('sending', 0), 'key-b': ('sending', 0)}
+    assert dispatcher.get_stats()['lost_claims'] == 2
+
+
+def test_rejected_rows_are_dead_after_one_attempt():
+    enqueue('bad', 'flaky')
+
+    def send(payload, idempotency_key):
+        if payload['name'] == 'bad':
+            raise CrmRejectedError("CRM rejected the contact with status 422")
+        raise RuntimeError("CRM returned status 500")
+
+    dispatcher = CrmOutboxDispatcher(send=send)
+    dispatcher.dispatch_batch()
+    assert outbox() == {'key-bad': ('dead', 1), 'key-flaky': ('pending', 1)}
+    stats = dispatcher.get_stats()
+    assert (stats['failed_attempts'], stats['dead'], stats['rejected']) == (2, 1, 1)
+
+
+@pytest.mark.parametrize('status, error', [
+    (400, CrmRejectedError),
+    (422, CrmRejectedError),
+    (408, RuntimeError),
+    (429, RuntimeError),
+    (503, RuntimeError),
+])
+def test_post_to_crm_only_treats_permanent_client_errors_as_rejections(monkeypatch, status, error):
+    class Response:
+        status_code = status
+
+    class Client:
+        def post(self, url, **kwargs):
+            return Response()
+
+    monkeypatch.setattr(crm_outbox, 'get_http_client', lambda name: Client())
+    with pytest.raises(error) as raised:
+        crm_outbox.post_to_crm({'name': 'x'}, 'key-x')
+    assert isinstance(raised.value, CrmRejectedError) == (error is CrmRejectedError)
@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+import db_utils
+from data_export import export_dataset
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def test_parquet_schema_survives_a_null_only_first_chunk():
+    with db_utils.get_connection() as conn:
+        # Exported newest first, so the all-NULL row lands in the first chunk
+        conn.executemany('''
+        INSERT INTO flight_searches
+        (origin, destination, departure_date, return_date, duration_days,
+         budget_preference, flight_class, estimated_price, created_at)
+        VALUES ('BOM', 'LIS', '2099-03-01', '2099-03-08', ?, ?, ?, ?, ?)
+        ''', [
+            (None, None, None, None, '2099-01-02 10:00:00'),
+            (7, 'Luxury', 'Business', 1234.5, '2099-01-01 10:00:00'),
+        ])
+        conn.commit()
+
+    buffer = io.BytesIO()
+    count = export_dataset('flight_searches', buffer, 'parquet', start_date='2099-01-01',
+                           chunk_size=1)
+    table = pq.read_table(io.BytesIO(buffer.getvalue()))
+
+    assert count == 2
+    assert table.schema.field('Budget Preference').type == pa.string()
+    assert table.schema.field('Trip Duration (Days)').type == pa.int64()
+    assert table.schema.field('Estimated Price').type == pa.float64()
+    assert table.column('Budget Preference').to_pylist() == [None, 'Luxury']
+    assert table.column('Trip Duration (Days)').to_pylist() == [None, 7]
+
+
+def test_empty_parquet_export_keeps_the_declared_types():
+    buffer = io.BytesIO()
+    count = export_dataset('contacts', buffer, 'parquet', start_date='2199-01-01')
+    schema = pq.read_schema(io.BytesIO(buffer.getvalue()))
+
+    assert count == 0
+    assert schema.field('id').type == pa.int64()
+    assert schema.field('email').type == pa.string()
@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+
+import pytest
+
+import db_utils
+
+
+def outbox_rows(email):
+    with db_utils.get_connection() as conn:
+        return conn.execute('''
+        SELECT COUNT(*) FROM crm_outbox o JOIN contacts c ON c.id = o.contact_id
+        WHERE c.email = ?
+        ''', (email,)).fetchone()[0]
+
+
+def test_duplicate_email_updates_the_contact_and_queues_crm_sync():
+    assert db_utils.log_enhanced_contact('Asha', 'Rao', 'asha@example.com', '1', crm_payload={'n': 1})
+    assert not db_utils.log_enhanced_contact('Asha', 'Menon', 'asha@example.com', '2', crm_payload={'n': 2})
+
+    with db_utils.get_connection() as conn:
+        row = conn.execute("SELECT secondName, phone FROM contacts WHERE email = ?",
+                           ('asha@example.com',)).fetchone()
+    assert tuple(row) == ('Menon', '2')
+    assert outbox_rows('asha@example.com') == 2
+
+
+def test_other_integrity_errors_are_raised_and_nothing_is_saved():
+    with pytest.raises(sqlite3.IntegrityError):
+        db_utils.log_enhanced_contact(None, 'Rao', 'no-name@example.com', '1', crm_payload={'n': 1})
+
+    with db_utils.get_connection() as conn:
+        saved = conn.execute("SELECT COUNT(*) FROM contacts WHERE email = ?",
+                             ('no-name@example.com',)).fetchone()[0]
+        queued = conn.execute("SELECT COUNT(*) FROM crm_outbox WHERE contact_id IS NULL").fetchone()[0]
+    assert (saved, queued) == (0, 0)
+
+
+def test_exhausted_pool_raises_operational_error(tmp_path):
+    pool = db_utils.ConnectionPool(str(tmp_path / 'pool.db'), max_size=1, timeout=0.05)
+    held = pool._acquire()
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='pool exhausted'):
+            pool._acquire()
+    finally:
+        pool._release(held)
+        pool.close_all()
+
+
+def test_rollups_keep_empty_string_preferences_apart_from_null():
+    for budget in ('', None, 'Luxury'):
+        db_utils.log_flight_search('DEL', 'GOI', '2026-01-01', '2026-01-05', 4, budget, 'Economy')
+    db_utils.flush_pending_writes()
+
+    budgets = dict(db_utils.get_budget_distribution())
+    assert budgets[''] >= 1 and budgets['Luxury'] >= 1
+    assert None not in budgets and '\x00' not in budgets
+    assert '' in db_utils.get_flight_filter_options()['budget_preference']
+
+
+def test_analytics_cache_computes_once_for_concurrent_callers():
+    cache = db_utils.AnalyticsCache()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(1)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['value'] * 8
+    assert len(calls) == 1
+    assert cache._key_locks == {}
+
+
+def test_analytics_cache_honours_zero_ttl():
+    cache = db_utils.AnalyticsCache(default_ttl=60)
+    calls = []
+    for _ in range(2):
+        cache.get_or_compute('k', lambda: calls.append(1), ttl=0)
+    assert len(calls) == 2
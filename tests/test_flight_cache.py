@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from flight_cache import FlightResultCache, flight_cache_key
+
+PARAMS = {'departure_id': 'bom', 'arrival_id': 'del', 'outbound_date': '2026-11-01',
+          'return_date': '2026-11-06', 'currency': 'inr'}
+
+
+class StubSearch:
+    """Stands in for SerpAPI: counts calls and returns a numbered response"""
+
+    def __init__(self, fail=False, error_body=False, delay=0.0):
+        self.calls = 0
+        self.fail = fail
+        self.error_body = error_body
+        self.delay = delay
+        self.called = threading.Event()
+
+    def __call__(self, params):
+        self.calls += 1
+        self.called.set()
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("SerpAPI unreachable")
+        if self.error_body:
+            return {'error': "Google Flights hasn't returned any results"}
+        return {'best_flights': [{'price': 1000 + self.calls}], 'call': self.calls}
+
+
+def make_cache(tmp_path, search, **options):
+    return FlightResultCache(str(tmp_path / 'flights.db'), search=search, **options)
+
+
+def test_key_is_normalized():
+    upper = dict(PARAMS, departure_id=' BOM ', arrival_id='DEL', currency='INR')
+    assert flight_cache_key(upper) == flight_cache_key(PARAMS)
+
+
+def test_hit_within_ttl(tmp_path):
+    search = StubSearch()
+    cache = make_cache(tmp_path, search, ttl=60)
+
+    first = cache.get(PARAMS)
+    second = cache.get(PARAMS)
+
+    assert search.calls == 1
+    assert first == second
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_stale_response_is_served_while_refreshing(tmp_path):
+    search = StubSearch(delay=0.2)
+    cache = make_cache(tmp_path, search, ttl=0, stale_ttl=60)
+    assert cache.get(PARAMS)['call'] == 1
+
+    search.called.clear()
+    started = time.perf_counter()
+    stale = cache.get(PARAMS)
+
+    # The old copy comes back without waiting for the slow refresh
+    assert stale['call'] == 1
+    assert time.perf_counter() - started < 0.2
+    assert search.called.wait(2)
+    deadline = time.monotonic() + 2
+    while cache.stats['refreshes'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.stats['refreshes'] == 1
+    assert cache.get(PARAMS)['call'] == 2
+    assert cache.stats['stale_hits'] >= 1
+
+
+def test_expired_past_stale_window_fetches_synchronously(tmp_path):
+    search = StubSearch()
+    cache = make_cache(tmp_path, search, ttl=0, stale_ttl=0)
+
+    cache.get(PARAMS)
+    assert cache.get(PARAMS)['call'] == 2
+    assert cache.stats['misses'] == 2
+
+
+def test_least_recently_used_rows_are_evicted(tmp_path):
+    search = StubSearch()
+    cache = make_cache(tmp_path, search, ttl=60, max_entries=2)
+    routes = [dict(PARAMS, arrival_id=code) for code in ('DEL', 'BLR', 'MAA')]
+
+    cache.get(routes[0])
+    time.sleep(0.01)
+    cache.get(routes[1])
+    time.sleep(0.01)
+    cache.get(routes[0])  # touch: routes[1] is now the least recently used
+    time.sleep(0.01)
+    cache.get(routes[2])
+
+    stats = cache.get_stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    calls = search.calls
+    cache.get(routes[0])
+    assert search.calls == calls
+    cache.get(routes[1])
+    assert search.calls == calls + 1
+
+
+def test_search_errors_propagate_and_are_not_cached(tmp_path):
+    search = StubSearch(fail=True)
+    cache = make_cache(tmp_path, search, ttl=60)
+
+    with pytest.raises(ConnectionError):
+        cache.get(PARAMS)
+    assert cache.get_stats()['entries'] == 0
+
+    search.fail = False
+    assert cache.get(PARAMS)['call'] == 2
+
+
+def test_error_bodies_are_returned_but_not_cached(tmp_path):
+    search = StubSearch(error_body=True)
+    cache = make_cache(tmp_path, search, ttl=60)
+
+    assert 'error' in cache.get(PARAMS)
+    assert 'error' in cache.get(PARAMS)
+    assert search.calls == 2
+    assert cache.get_stats()['entries'] == 0
+
+
+def test_failed_background_refresh_keeps_the_stale_copy(tmp_path):
+    search = StubSearch()
+    cache = make_cache(tmp_path, search, ttl=0, stale_ttl=60)
+    cache.get(PARAMS)
+
+    search.fail = True
+    search.called.clear()
+    assert cache.get(PARAMS)['call'] == 1
+    assert search.called.wait(2)
+    deadline = time.monotonic() + 2
+    while cache.stats['errors'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.stats['errors'] == 1
+    assert cache.get_stats()['entries'] == 1
+
+
+def test_concurrent_misses_share_one_fetch(tmp_path):
+    search = StubSearch(delay=0.2)
+    cache = make_cache(tmp_path, search, ttl=60)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get(PARAMS))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert search.calls == 1
+    assert len(results) == 5 and all(result == results[0] for result in results)
@@ -0,0 +1,185 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import CircuitOpenError, HttpClient, LatencyHistogram
+
+
+class StubServer:
+    """Local HTTP server that answers with a scripted list of status codes"""
+
+    def __init__(self):
+        self.statuses = []
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                stub.requests.append((self.command, self.path))
+                status = stub.statuses.pop(0) if stub.statuses else 200
+                body = b'{"ok": true}'
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/webhook"
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+def make_client(**options):
+    options.setdefault('connect_timeout', 1)
+    options.setdefault('read_timeout', 2)
+    client = HttpClient('test', **options)
+    client.delays = []
+
+    def backoff(attempt):
+        client.delays.append(attempt)
+        return 0.0
+
+    # Record the backoff schedule instead of sleeping through it
+    client._backoff = backoff
+    return client
+
+
+def endpoint_stats(client, stub):
+    return client.get_stats()[stub.url]
+
+
+def test_retries_5xx_with_backoff(stub):
+    stub.statuses = [503, 502, 200]
+    client = make_client(retries=2)
+
+    response = client.get(stub.url)
+
+    assert response.status_code == 200
+    assert len(stub.requests) == 3
+    assert client.delays == [0, 1]
+    stats = endpoint_stats(client, stub)
+    assert (stats['retries'], stats['failures'], stats['breaker']) == (2, 2, 'closed')
+
+
+def test_gives_up_after_the_retry_budget(stub):
+    stub.statuses = [503, 503, 503, 503]
+    client = make_client(retries=2)
+
+    assert client.get(stub.url).status_code == 503
+    assert len(stub.requests) == 3
+
+
+def test_backoff_is_jittered_and_capped():
+    client = HttpClient('test', backoff_base=0.25, backoff_max=1.0)
+    delays = [client._backoff(attempt) for attempt in range(6) for _ in range(50)]
+    assert all(0 <= delay <= 1.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_4xx_is_not_retried_and_does_not_trip_the_breaker(stub):
+    stub.statuses = [404, 404, 404]
+    client = make_client(retries=2, failure_threshold=2)
+
+    for _ in range(3):
+        assert client.get(stub.url).status_code == 404
+
+    assert len(stub.requests) == 3
+    stats = endpoint_stats(client, stub)
+    assert (stats['retries'], stats['failures'], stats['breaker']) == (0, 0, 'closed')
+
+
+def test_post_is_retried_only_when_the_server_did_not_process_it(stub):
+    client = make_client(retries=2)
+
+    stub.statuses = [503, 200]
+    assert client.post(stub.url, json={'lead': 1}).status_code == 200
+    assert len(stub.requests) == 2
+
+    # A 502 may have been processed upstream, so a POST is not repeated
+    stub.requests.clear()
+    stub.statuses = [502, 200]
+    assert client.post(stub.url, json={'lead': 2}).status_code == 502
+    assert len(stub.requests) == 1
+
+
+def test_connection_refused_post_is_retried():
+    client = make_client(retries=2)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        # Nothing listens on port 9 locally; the request never reaches a server
+        client.post('http://127.0.0.1:9/webhook', json={})
+    assert client.delays == [0, 1]
+
+
+def test_breaker_opens_after_repeated_failures(stub):
+    stub.statuses = [503, 503]
+    client = make_client(retries=0, failure_threshold=2, reset_seconds=60)
+
+    client.get(stub.url)
+    client.get(stub.url)
+    with pytest.raises(CircuitOpenError):
+        client.get(stub.url)
+
+    assert len(stub.requests) == 2
+    stats = endpoint_stats(client, stub)
+    assert (stats['breaker'], stats['times_opened'], stats['short_circuited']) == ('open', 1, 1)
+
+
+def test_half_open_probe_closes_the_breaker_on_success(stub):
+    stub.statuses = [503, 503]
+    client = make_client(retries=0, failure_threshold=2, reset_seconds=0.2)
+    client.get(stub.url)
+    client.get(stub.url)
+    with pytest.raises(CircuitOpenError):
+        client.get(stub.url)
+
+    time.sleep(0.25)
+    assert client.get(stub.url).status_code == 200
+    assert endpoint_stats(client, stub)['breaker'] == 'closed'
+    assert client.get(stub.url).status_code == 200
+
+
+def test_failed_half_open_probe_reopens_the_breaker(stub):
+    stub.statuses = [503, 503, 503]
+    client = make_client(retries=0, failure_threshold=2, reset_seconds=0.2)
+    client.get(stub.url)
+    client.get(stub.url)
+
+    time.sleep(0.25)
+    assert client.get(stub.url).status_code == 503
+    with pytest.raises(CircuitOpenError):
+        client.get(stub.url)
+    assert endpoint_stats(client, stub)['times_opened'] == 2
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram(buckets=(10, 100))
+    for ms in (1, 2, 3, 50, 500):
+        histogram.observe(ms)
+
+    assert histogram.percentile(0.5) == 10
+    assert histogram.percentile(0.8) == 100
+    assert histogram.percentile(1.0) == 500
+    assert histogram.snapshot()['buckets'] == {'<=10ms': 3, '<=100ms': 1, '>100ms': 1}
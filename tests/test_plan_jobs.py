@@ -0,0 +1,41 @@
+from plan_jobs import PlanJobQueue
+
+
+def make_queue(runner, max_attempts=2):
+    # Workers are never started; the tests drive _claim/_run directly
+    return PlanJobQueue(runner, workers=0, stale_seconds=-1, max_attempts=max_attempts)
+
+
+def test_worker_cannot_finish_a_job_that_was_failed_behind_its_back():
+    job_queue = make_queue(lambda request, progress: {'plan': 'late'}, max_attempts=1)
+    job_id = job_queue.submit({'destination': 'Oslo', 'test': 'failed-behind'})
+    claimed_id, request, owner = job_queue._claim()
+    assert claimed_id == job_id
+
+    # The heartbeat lapsed and the only attempt is used up
+    assert job_queue.requeue_stale() == 1
+    job_queue._run(claimed_id, {}, owner)
+
+    job = job_queue.get(job_id)
+    assert (job.status, job.result) == ('failed', None)
+    stats = job_queue.get_stats()
+    assert (stats['completed'], stats['superseded']) == (0, 1)
+
+
+def test_requeued_job_only_accepts_writes_from_its_new_owner():
+    job_queue = make_queue(lambda request, progress: {'plan': 'fresh'})
+    job_id = job_queue.submit({'destination': 'Lima', 'test': 'requeued'})
+    _, _, old_owner = job_queue._claim()
+
+    assert job_queue.requeue_stale() == 1
+    _, _, new_owner = job_queue._claim()
+    assert new_owner != old_owner
+
+    assert not job_queue._update(job_id, old_owner, stage='stale worker')
+    assert job_queue._update(job_id, new_owner, stage='Researching')
+    assert job_queue.get(job_id).stage == 'Researching'
+
+    job_queue._run(job_id, {}, new_owner)
+    job = job_queue.get(job_id)
+    assert (job.status, job.result) == ('done', {'plan': 'fresh'})
+    assert job_queue.get_stats()['completed'] == 1
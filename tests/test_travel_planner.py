@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+
+from travel_planner import (
+    AgentResponseCache, StageResult, TextStream, agent_output, clear_agent_cache, format_stage_timings,
+)
+
+PREFERENCES = (
+    "We love slow mornings at local cafes, long walks through old neighbourhoods, "
+    "small art galleries and museums, street food markets in the evening, a cooking "
+    "class if possible, one day trip to the countryside, live music at night, and "
+    "quiet parks where the kids can play while we read."
+)
+
+
+class FakeAgent:
+    """Streams a canned response in chunks, like agno's Agent.run(stream=True)"""
+
+    def __init__(self, name, chunks=('Day 1: ', 'Old Delhi. ', 'Day 2: ', 'Agra.'),
+                 first_token_delay=0.0, gate=None):
+        self.name = name
+        self.chunks = chunks
+        self.first_token_delay = first_token_delay
+        # When set, the stream pauses after the first chunk until the gate opens
+        self.gate = gate
+        self.runs = 0
+
+    def run(self, prompt, stream=False):
+        self.runs += 1
+        if not stream:
+            return ''.join(self.chunks)
+        return self._stream()
+
+    def _stream(self):
+        time.sleep(self.first_token_delay)
+        for index, chunk in enumerate(self.chunks):
+            yield chunk
+            if index == 0 and self.gate is not None:
+                self.gate.wait(5)
+
+
+@pytest.fixture(autouse=True)
+def empty_agent_cache():
+    clear_agent_cache()
+    yield
+    clear_agent_cache()
+
+
+def test_text_stream_records_time_to_first_token():
+    agent = FakeAgent('TTFT Agent', first_token_delay=0.05)
+
+    stream = TextStream('research').feed(agent_output(agent, 'Research Delhi', use_cache=False))
+
+    assert stream.text() == 'Day 1: Old Delhi. Day 2: Agra.'
+    assert stream.chunks == 4
+    assert 0.05 <= stream.first_token_seconds <= stream.total_seconds
+    timings = format_stage_timings([StageResult('research', stream, stream.total_seconds)])
+    assert 'first token' in timings[0]
+
+
+def test_text_stream_throttles_updates_but_always_sends_the_final_text():
+    updates = []
+    agent = FakeAgent('Throttle Agent')
+
+    TextStream('planner').feed(agent_output(agent, 'Plan a trip', use_cache=False),
+                               on_update=updates.append, min_interval=60)
+
+    assert updates[-1] == 'Day 1: Old Delhi. Day 2: Agra.'
+    assert len(updates) <= 2
+
+
+def test_cache_hit_is_replayed_as_one_chunk():
+    agent = FakeAgent('Cache Agent')
+
+    first = list(agent_output(agent, 'Hotels in Jaipur', use_cache=True))
+    second = list(agent_output(agent, '  hotels in JAIPUR! ', use_cache=True))
+
+    assert first == list(agent.chunks)
+    assert second == ['Day 1: Old Delhi. Day 2: Agra.']
+    assert agent.runs == 1
+
+
+def test_abandoned_stream_is_not_cached():
+    gate = threading.Event()
+    agent = FakeAgent('Abandon Cache Agent', gate=gate)
+
+    stream = agent_output(agent, 'Research Goa', use_cache=True)
+    next(stream)
+    stream.close()
+    gate.set()
+
+    assert list(agent_output(agent, 'Research Goa', use_cache=True)) == list(agent.chunks)
+    assert agent.runs == 2
+
+
+def test_followers_get_an_error_when_the_leader_abandons_the_stream():
+    gate = threading.Event()
+    agent = FakeAgent('Shared Agent', gate=gate)
+    leader = agent_output(agent, 'Research Kerala', use_cache=False)
+    assert next(leader) == 'Day 1: '
+
+    received, errors = [], []
+
+    def follow():
+        try:
+            for chunk in agent_output(agent, 'Research Kerala', use_cache=False):
+                received.append(chunk)
+        except Exception as e:
+            errors.append(e)
+
+    follower = threading.Thread(target=follow, daemon=True)
+    follower.start()
+    deadline = time.monotonic() + 2
+    while not received and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    leader.close()
+    follower.join(5)
+    gate.set()
+
+    assert not follower.is_alive()
+    assert received == ['Day 1: ']
+    assert len(errors) == 1 and isinstance(errors[0], RuntimeError)
+    assert 'abandoned' in str(errors[0])
+    assert agent.runs == 1
+
+
+def research_prompt(destination, num_days, preferences=PREFERENCES, budget='Standard'):
+    return (f"Research top attractions in {destination} for a {num_days}-day family vacation trip. "
+            f"Interests: {preferences}. Budget: {budget}. Class: Economy. Rating: 4.")
+
+
+def research_match(destination, num_days, preferences=PREFERENCES, budget='Standard'):
+    return (destination, num_days, 'Family Vacation', budget, 'Economy', 4), preferences
+
+
+def test_near_duplicate_reuse_never_crosses_trips():
+    cache = AgentResponseCache()
+    cache.put('Researcher', research_prompt('Paris', 5), 'Paris research', research_match('Paris', 5))
+
+    for destination, num_days, budget in (('Rome', 5, 'Standard'), ('Paris', 12, 'Standard'),
+                                          ('Paris', 5, 'Luxury')):
+        assert cache.get('Researcher', research_prompt(destination, num_days, budget=budget),
+                         research_match(destination, num_days, budget=budget)) is None
+
+
+def test_near_duplicate_preferences_reuse_the_same_trip():
+    cache = AgentResponseCache()
+    cache.put('Researcher', research_prompt('Paris', 5), 'Paris research', research_match('Paris', 5))
+    reworded = PREFERENCES.replace('while we read.', 'while we read books.')
+
+    assert cache.get('Researcher', research_prompt('Paris', 5, reworded),
+                     research_match('Paris', 5, reworded)) == 'Paris research'
+    assert cache.get_stats()['agents']['Researcher']['near_hits'] == 1
+
+
+def test_without_fields_only_exact_prompts_match():
+    cache = AgentResponseCache()
+    cache.put('Researcher', research_prompt('Paris', 5), 'Paris research')
+    reworded = PREFERENCES.replace('while we read.', 'while we read books.')
+
+    assert cache.get('Researcher', research_prompt('Paris', 5, reworded)) is None
+    assert cache.get('Researcher', research_prompt('Paris', 5)) == 'Paris research'
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from visa_dataset import VisaDatasetStore
+
+FALLBACK = pd.DataFrame({
+    'Passport': ['India'],
+    'Destination': ['Nepal'],
+    'Requirement': ['visa free'],
+})
+UPDATED_CSV = b"Passport,Destination,Requirement\nIndia,Bhutan,visa free\nIndia,Nepal,visa required\n"
+
+
+def make_store(tmp_path, responses):
+    def fetch(url, headers):
+        return responses.pop(0)
+    return VisaDatasetStore(lambda: FALLBACK, snapshot_dir=str(tmp_path), urls=['https://example.test/visa.csv'],
+                            fetch=fetch).load()
+
+
+def test_update_publishes_data_index_matrix_and_version_together(tmp_path):
+    store = make_store(tmp_path, [(200, UPDATED_CSV, {'ETag': '"v2"'})])
+    before = store.snapshot
+    assert before.source == 'fallback'
+
+    assert store.refresh() == 'updated'
+    after = store.snapshot
+    assert after is not before
+    assert after.source == 'snapshot' and after.manifest['etag'] == '"v2"'
+    assert list(after.index.visa_free('India')) == ['Bhutan']
+    assert list(after.matrix.passports_for('Bhutan')) == ['India']
+    assert len(after.data) == 2
+    # A reader still holding the old snapshot sees a consistent old dataset
+    assert list(before.index.visa_free('India')) == ['Nepal']
+    assert store.get_stats()['updates'] == 1
+
+
+def test_not_modified_keeps_the_data_and_publishes_the_new_check_time(tmp_path):
+    store = make_store(tmp_path, [(200, UPDATED_CSV, {'ETag': '"v2"'}), (304, None, {})])
+    store.refresh()
+    updated = store.snapshot
+
+    assert store.refresh() == 'not_modified'
+    assert store.snapshot.data is updated.data and store.snapshot.index is updated.index
+    assert store.snapshot.manifest['checked_at'] >= updated.manifest['checked_at']
+    assert store.get_stats()['not_modified'] == 1
@@ -0,0 +1,458 @@
+"""Orchestration for the "Generate Travel Plan" flow.
+
+Flight lookup, destination research and the hotel/restaurant search do
+not depend on each other, so they run concurrently on a shared thread
+pool. Only the planner waits for all three. Every stage is timed so the
+page can show where the latency goes.
+
+Agent output can be streamed: a TextStream collects the chunks as they
+arrive (on any thread) and records time-to-first-token, while the page
+re-renders the text collected so far.
+
+Agent responses are cached per agent, keyed by a hash of the normalized
+prompt. Agents whose answers do not hinge on exact wording can also
+reuse a response for a near-duplicate prompt: the caller passes the
+structured trip fields, which must match exactly, and the free-text
+preferences, which are compared by word-shingle similarity. Identical
+prompts that are already running are not sent again: later callers
+follow the in-progress stream (see single_flight).
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from single_flight import get_single_flight
+
+STAGE_TIMEOUT = float(os.environ.get('ROAMGENIE_STAGE_TIMEOUT', 120))
+STAGE_WORKERS = int(os.environ.get('ROAMGENIE_STAGE_WORKERS', 8))
+STREAM_AGENT_OUTPUT = os.environ.get('ROAMGENIE_STREAM_AGENTS', '1') != '0'
+STREAM_RENDER_INTERVAL = 0.1
+AGENT_CACHE_ENABLED = os.environ.get('ROAMGENIE_AGENT_CACHE', '1') != '0'
+AGENT_CACHE_MAX_ENTRIES = int(os.environ.get('ROAMGENIE_AGENT_CACHE_MAX', 256))
+
+# Per-agent cache policy, keyed by Agent.name. `similarity` is the Jaccard
+# threshold for reusing the response of a prompt whose free-text part is a
+# near-duplicate (the structured fields must still match exactly); None
+# means exact matches only. The planner prompt embeds live flight prices,
+# so it only ever matches exactly.
+AGENT_CACHE_POLICIES = {
+    'Researcher': {'ttl': 24 * 60 * 60, 'similarity': 0.9},
+    'Hotel & Restaurant Finder': {'ttl': 6 * 60 * 60, 'similarity': 0.9},
+    'Planner': {'ttl': 60 * 60, 'similarity': None},
+}
+DEFAULT_AGENT_CACHE_POLICY = {'ttl': 60 * 60, 'similarity': None}
+SHINGLE_SIZE = 3
+
+# Token budgets for upstream agent output inlined into the planner prompt
+PLANNER_RESEARCH_TOKENS = int(os.environ.get('ROAMGENIE_PLANNER_RESEARCH_TOKENS', 600))
+PLANNER_HOTELS_TOKENS = int(os.environ.get('ROAMGENIE_PLANNER_HOTELS_TOKENS', 500))
+CHARS_PER_TOKEN = 4
+
+# Shared across sessions. A stage that overruns its timeout keeps its worker
+# until the underlying call returns, so the pool is sized with headroom.
+_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix='roamgenie-stage')
+
+@dataclass
+class StageResult:
+    """Outcome of one plan stage: its value or the error that replaced it"""
+    name: str
+    value: Any = None
+    seconds: float = 0.0
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+def run_stage(name, func):
+    """Run one stage inline, capturing its duration and any error"""
+    started = time.perf_counter()
+    try:
+        return StageResult(name, func(), time.perf_counter() - started)
+    except Exception as e:
+        return StageResult(name, seconds=time.perf_counter() - started, error=e)
+
+def run_stages(stages, timeout=STAGE_TIMEOUT, on_progress=None, poll_interval=STREAM_RENDER_INTERVAL):
+    """Run independent callables concurrently and collect a StageResult each
+
+    `stages` maps a stage name to a zero-argument callable, or to a
+    (callable, timeout_seconds) pair to override the default timeout.
+    Timeouts are measured from submission, so all stages share one clock.
+    `on_progress` is called on the calling thread every poll_interval
+    while stages are still running, e.g. to render streamed output.
+    """
+    submitted_at = time.perf_counter()
+    futures = {}
+    for name, stage in stages.items():
+        func, stage_timeout = stage if isinstance(stage, tuple) else (stage, timeout)
+        futures[name] = (_executor.submit(run_stage, name, func), stage_timeout)
+
+    if on_progress is not None:
+        deadline = submitted_at + max(stage_timeout for _, stage_timeout in futures.values())
+        pending = {future for future, _ in futures.values()}
+        while pending and time.perf_counter() < deadline:
+            _, pending = wait(pending, timeout=poll_interval)
+            on_progress()
+
+    results = {}
+    for name, (future, stage_timeout) in futures.items():
+        remaining = max(0.0, stage_timeout - (time.perf_counter() - submitted_at))
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            # Cancels the stage if it has not started; a running call is
+            # abandoned and its result discarded
+            future.cancel()
+            results[name] = StageResult(
+                name, seconds=time.perf_counter() - submitted_at,
+                error=TimeoutError(f"{name} timed out after {stage_timeout:g}s"),
+            )
+    return results
+
+def format_stage_timings(results, total_seconds=None):
+    """One line per stage, for the page and the logs"""
+    lines = []
+    for result in results:
+        status = "ok" if result.ok else f"failed: {result.error}"
+        first_token = getattr(result.value, 'first_token_seconds', None)
+        if first_token is not None:
+            status += f", first token {first_token:.2f}s"
+        prompt_tokens = getattr(result.value, 'prompt_tokens', None)
+        if prompt_tokens is not None:
+            status += f", ~{prompt_tokens:,} tokens in / ~{estimate_tokens(result.value.text()):,} out"
+        lines.append(f"{result.name}: {result.seconds:.2f}s ({status})")
+    if total_seconds is not None:
+        lines.append(f"total: {total_seconds:.2f}s")
+    return lines
+
+# ============= PROMPT COMPACTION =============
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+def compact_flight(flight):
+    """Project a SerpAPI flight option down to what the planner uses"""
+    legs = flight.get('flights') or [{}]
+    departure = legs[0].get('departure_airport', {})
+    arrival = legs[-1].get('arrival_airport', {})
+    compact = {
+        'airline': legs[0].get('airline') or flight.get('airline'),
+        'price': flight.get('price'),
+        'duration_min': flight.get('total_duration'),
+        'depart': f"{departure.get('id', '')} {departure.get('time', '')}".strip(),
+        'arrive': f"{arrival.get('id', '')} {arrival.get('time', '')}".strip(),
+        'stops': len(legs) - 1,
+    }
+    layovers = [layover.get('id') or layover.get('name') for layover in flight.get('layovers', [])]
+    if layovers:
+        compact['via'] = layovers
+    return {key: value for key, value in compact.items() if value not in (None, '')}
+
+def compact_text(text, max_tokens):
+    """Strip link/image markup and cut to max_tokens at a sentence or line break"""
+    text = re.sub(r'!\[[^\]]*\]\([^)]*\)', '', text)
+    text = re.sub(r'\[([^\]]+)\]\([^)]*\)', r'\1', text)
+    text = re.sub(r'https?://\S+', '', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'\n\s*\n+', '\n', text).strip()
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind('\n'), cut.rfind('. '))
+    if boundary > max_chars // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + ' …'
+
+def build_planning_prompt(destination, num_days, travel_theme, activity_preferences, budget,
+                          flight_class, hotel_rating, research, flights, hotels_restaurants,
+                          research_tokens=PLANNER_RESEARCH_TOKENS, hotels_tokens=PLANNER_HOTELS_TOKENS):
+    """Planner prompt with compacted inputs, plus estimated token counts per section"""
+    flights_raw = json.dumps(flights)
+    flights_compact = json.dumps([compact_flight(flight) for flight in flights], separators=(',', ':'))
+    research_compact = compact_text(research, research_tokens)
+    hotels_compact = compact_text(hotels_restaurants, hotels_tokens)
+    prompt = (
+        f"Create a {num_days}-day travel itinerary to {destination} for a {travel_theme.lower()} trip. "
+        f"Preferences: {activity_preferences}. Budget: {budget}. Class: {flight_class}. Rating: {hotel_rating}. "
+        f"Research: {research_compact}. Flights: {flights_compact}. "
+        f"Hotels & Restaurants: {hotels_compact}."
+    )
+    token_report = {
+        'research': (estimate_tokens(research), estimate_tokens(research_compact)),
+        'flights': (estimate_tokens(flights_raw), estimate_tokens(flights_compact)),
+        'hotels_restaurants': (estimate_tokens(hotels_restaurants), estimate_tokens(hotels_compact)),
+        'prompt': estimate_tokens(prompt),
+    }
+    return prompt, token_report
+
+def format_token_report(token_report):
+    """Before/after token estimates for each compacted planner input"""
+    lines = []
+    for name, counts in token_report.items():
+        if name != 'prompt':
+            lines.append(f"planner input {name}: ~{counts[0]:,} → ~{counts[1]:,} tokens")
+    lines.append(f"planner prompt: ~{token_report['prompt']:,} tokens")
+    return lines
+
+# ============= AGENT REGISTRY =============
+
+class AgentRegistry:
+    """Process-wide pool of built agents, reused across reruns and sessions
+
+    Agents keep per-run state, so one instance is never shared by two
+    concurrent runs: checkout() hands out an idle instance of the requested
+    kind, building a new one only when every existing one is busy.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'build_seconds': 0.0,
+        }
+
+    @contextmanager
+    def checkout(self, kind):
+        with self._lock:
+            agent = self._idle[kind].pop() if self._idle[kind] else None
+            if agent is not None:
+                self.stats['reused'] += 1
+        if agent is None:
+            started = time.perf_counter()
+            agent = self.factory(kind)
+            with self._lock:
+                self.stats['created'] += 1
+                self.stats['build_seconds'] += time.perf_counter() - started
+        try:
+            yield agent
+        finally:
+            with self._lock:
+                self._idle[kind].append(agent)
+
+    def get_stats(self):
+        """Build counts and the construction time reuse has saved"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['idle'] = {kind: len(agents) for kind, agents in self._idle.items()}
+        stats['avg_build_seconds'] = stats['build_seconds'] / stats['created'] if stats['created'] else 0.0
+        stats['saved_seconds'] = stats['reused'] * stats['avg_build_seconds']
+        return stats
+
+# ============= AGENT RESPONSE CACHE =============
+
+def normalize_prompt(prompt):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return ' '.join(re.findall(r'\w+', prompt.lower()))
+
+def prompt_shingles(normalized, size=SHINGLE_SIZE):
+    words = normalized.split()
+    if len(words) <= size:
+        return frozenset([' '.join(words)])
+    return frozenset(' '.join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class AgentResponseCache:
+    """Per-agent TTL + LRU cache of response text with near-duplicate lookup"""
+
+    def __init__(self, max_entries=AGENT_CACHE_MAX_ENTRIES, policies=AGENT_CACHE_POLICIES):
+        self.max_entries = max_entries
+        self.policies = policies
+        self._entries = defaultdict(OrderedDict)
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'hits': 0, 'near_hits': 0, 'misses': 0, 'evictions': 0})
+
+    def policy(self, agent_name):
+        return self.policies.get(agent_name, DEFAULT_AGENT_CACHE_POLICY)
+
+    @staticmethod
+    def _near_key(near_match):
+        """(scope, shingles) for a (fields, free_text) pair; scope must match exactly"""
+        if near_match is None:
+            return None, None
+        fields, free_text = near_match
+        scope = hashlib.sha256(normalize_prompt(repr(tuple(fields))).encode('utf-8')).hexdigest()
+        return scope, prompt_shingles(normalize_prompt(free_text or ''))
+
+    def get(self, agent_name, prompt, near_match=None):
+        """Cached response text for this prompt, else None
+
+        near_match=(fields, free_text) also allows reusing an entry stored
+        with the same fields whose free text is a near-duplicate.
+        """
+        normalized = normalize_prompt(prompt)
+        key = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        threshold = self.policy(agent_name)['similarity']
+        scope, shingles = self._near_key(near_match)
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries[agent_name]
+            stats = self._stats[agent_name]
+            for expired in [k for k, (expires_at, _, _, _) in entries.items() if expires_at <= now]:
+                del entries[expired]
+
+            if key in entries:
+                entries.move_to_end(key)
+                stats['hits'] += 1
+                return entries[key][3]
+
+            if threshold is not None and scope is not None:
+                best_key, best_score = None, threshold
+                for candidate_key, (_, candidate_scope, candidate_shingles, _) in entries.items():
+                    if candidate_scope != scope:
+                        continue
+                    score = _jaccard(shingles, candidate_shingles)
+                    if score >= best_score:
+                        best_key, best_score = candidate_key, score
+                if best_key is not None:
+                    entries.move_to_end(best_key)
+                    stats['near_hits'] += 1
+                    return entries[best_key][3]
+
+            stats['misses'] += 1
+            return None
+
+    def put(self, agent_name, prompt, text, near_match=None):
+        normalized = normalize_prompt(prompt)
+        key = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        expires_at = time.monotonic() + self.policy(agent_name)['ttl']
+        scope, shingles = self._near_key(near_match)
+        with self._lock:
+            entries = self._entries[agent_name]
+            entries[key] = (expires_at, scope, shingles, text)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self._stats[agent_name]['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Per-agent counters plus an overall hit rate"""
+        with self._lock:
+            per_agent = {name: dict(stats, entries=len(self._entries[name]))
+                         for name, stats in self._stats.items()}
+        hits = sum(stats['hits'] + stats['near_hits'] for stats in per_agent.values())
+        lookups = hits + sum(stats['misses'] for stats in per_agent.values())
+        for stats in per_agent.values():
+            agent_lookups = stats['hits'] + stats['near_hits'] + stats['misses']
+            stats['hit_rate'] = (stats['hits'] + stats['near_hits']) / agent_lookups if agent_lookups else 0.0
+        return {
+            'agents': per_agent,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'hits': hits,
+            'lookups': lookups,
+        }
+
+_agent_cache = AgentResponseCache()
+
+def get_agent_cache_stats():
+    """Get agent response cache statistics"""
+    return _agent_cache.get_stats()
+
+def clear_agent_cache():
+    """Drop every cached agent response"""
+    _agent_cache.clear()
+
+# ============= STREAMING =============
+
+def _chunk_text(chunk):
+    text = chunk if isinstance(chunk, str) else getattr(chunk, 'content', None)
+    return text if isinstance(text, str) and text else None
+
+def iter_stream_text(chunks):
+    """Yield the text of each streamed chunk, skipping tool/status events"""
+    for chunk in chunks:
+        text = _chunk_text(chunk)
+        if text:
+            yield text
+
+def agent_output(agent, prompt, stream=STREAM_AGENT_OUTPUT, use_cache=AGENT_CACHE_ENABLED, near_match=None):
+    """Lazily run an agent, yielding its output chunks as they arrive
+
+    near_match=(fields, free_text) lets the cache reuse the answer to a
+    prompt with the same structured fields and near-duplicate free text;
+    without it only the exact prompt matches.
+    """
+    # The call starts on first iteration, so TextStream times the whole request
+    agent_name = getattr(agent, 'name', None) or type(agent).__name__
+    if use_cache:
+        cached = _agent_cache.get(agent_name, prompt, near_match)
+        if cached is not None:
+            yield cached
+            return
+
+    def run_upstream():
+        # One chunk holding the whole response keeps the callers identical
+        chunks = agent.run(prompt, stream=True) if stream else [agent.run(prompt, stream=False)]
+        parts = []
+        for chunk in chunks:
+            text = _chunk_text(chunk)
+            if text:
+                parts.append(text)
+            yield chunk
+
+        # Only complete responses are cached; an abandoned stream never gets here
+        if use_cache and parts:
+            _agent_cache.put(agent_name, prompt, ''.join(parts), near_match)
+
+    # Concurrent identical prompts (e.g. the same promoted route) share one model call
+    yield from get_single_flight('agents').stream((agent_name, normalize_prompt(prompt), stream), run_upstream)
+
+class TextStream:
+    """Thread-safe accumulator for one streamed agent response"""
+
+    def __init__(self, name):
+        self.name = name
+        self.first_token_seconds = None
+        self.total_seconds = None
+        self.chunks = 0
+        self.prompt_tokens = None
+        self._parts = []
+        self._lock = threading.Lock()
+        self._started = None
+
+    def feed(self, chunks, on_update=None, min_interval=STREAM_RENDER_INTERVAL):
+        """Consume a chunk iterable; on_update(text) is throttled to min_interval"""
+        self._started = time.perf_counter()
+        last_update = 0.0
+        for text in iter_stream_text(chunks):
+            now = time.perf_counter()
+            with self._lock:
+                if self.first_token_seconds is None:
+                    self.first_token_seconds = now - self._started
+                self._parts.append(text)
+                self.chunks += 1
+            if on_update is not None and now - last_update >= min_interval:
+                on_update(self.text())
+                last_update = now
+        self.total_seconds = time.perf_counter() - self._started
+        if on_update is not None:
+            on_update(self.text())
+        return self
+
+    def text(self):
+        with self._lock:
+            return ''.join(self._parts)
+
+    @property
+    def started(self):
+        return self.first_token_seconds is not None
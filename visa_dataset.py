@@ -0,0 +1,617 @@
+"""Local, versioned snapshots of the passport-index visa dataset.
+
+The Passport page used to download the passport-index CSV from GitHub on
+every rerun. Now the dataset is read from the newest local snapshot when
+the process starts. A daemon thread keeps the snapshot current with
+conditional requests (If-None-Match / If-Modified-Since). Only a changed
+body is parsed. It is written to a new versioned file, the manifest is
+replaced atomically, and the in-memory frame is swapped in one
+assignment, so readers always see a complete dataset.
+
+Lookups go through a VisaIndex built once per loaded frame, so the page
+never scans the DataFrame on a rerun. A VisaMatrix built alongside it
+holds every passport x destination pair as an int8 category code for
+vectorized queries (reverse lookups, listings, passport rankings, regional
+counts), plus per-passport bitmaps so group-travel intersections are a
+few word ANDs.
+
+Snapshots are Parquet when pyarrow is installed and gzip CSV otherwise.
+With no snapshot and no network the built-in fallback data is served, so
+the app still boots offline.
+
+    python visa_dataset.py --refresh     # fetch now and write a snapshot
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from countries import REGIONS, UNKNOWN_REGION, country_iso3, country_name, country_region
+from http_client import get_http_client
+
+try:
+    import pyarrow  # noqa: F401  (pandas Parquet engine)
+except ImportError:
+    pyarrow = None
+
+PARQUET_AVAILABLE = pyarrow is not None
+
+VISA_SNAPSHOT_DIR = os.environ.get('ROAMGENIE_VISA_SNAPSHOT_DIR', 'visa_snapshots')
+VISA_REFRESH_SECONDS = float(os.environ.get('ROAMGENIE_VISA_REFRESH_SECONDS', 24 * 60 * 60))
+VISA_SNAPSHOT_RETENTION = int(os.environ.get('ROAMGENIE_VISA_SNAPSHOT_RETENTION', 3))
+VISA_DATASET_URLS = (
+    "https://raw.githubusercontent.com/ilyankou/passport-index-dataset/master/passport-index-tidy.csv",
+    "https://raw.githubusercontent.com/datasets/passport-index/main/data/passport-index-tidy.csv",
+)
+VISA_COLUMNS = ['Passport', 'Destination', 'Requirement']
+MANIFEST_NAME = 'manifest.json'
+
+# Requirement text -> category, first match wins. Anything else (day counts,
+# "no admission", the passport's own country) is 'other'.
+REQUIREMENT_CATEGORIES = (
+    ('home', re.compile(r'^-1$')),
+    ('visa_free', re.compile(r'visa free|visa-free', re.IGNORECASE)),
+    ('visa_on_arrival', re.compile(r'visa on arrival', re.IGNORECASE)),
+    ('e_visa', re.compile(r'e-visa|evisa|\beta\b', re.IGNORECASE)),
+    ('visa_required', re.compile(r'visa required', re.IGNORECASE)),
+)
+# What the Passport page lists as "visa-free"
+VISA_FREE_CATEGORIES = ('visa_free', 'visa_on_arrival')
+
+# int8 codes stored in VisaMatrix; 0 means the pair is not in the dataset
+VISA_CATEGORY_CODES = {
+    'unknown': 0, 'visa_free': 1, 'visa_on_arrival': 2, 'e_visa': 3,
+    'visa_required': 4, 'other': 5, 'home': 6,
+}
+VISA_CATEGORY_NAMES = tuple(sorted(VISA_CATEGORY_CODES, key=VISA_CATEGORY_CODES.get))
+
+# Categories offered for group travel, easiest first
+GROUP_CATEGORIES = ('visa_free', 'visa_on_arrival', 'e_visa')
+
+# Bucketed visa_data.json / fallback layout -> requirement text in the tidy layout
+BUCKET_REQUIREMENTS = {
+    'visa_free': 'visa free',
+    'visa_on_arrival': 'visa on arrival',
+    'e_visa': 'e-visa',
+    'visa_required': 'visa required',
+}
+
+def normalize_visa_frame(df):
+    """Validate the tidy layout and store it compactly (stripped, categorical)"""
+    missing = [column for column in VISA_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Visa dataset is missing columns: {', '.join(missing)}")
+    df = df[VISA_COLUMNS].dropna(subset=['Passport', 'Destination'])
+    # ~40k rows over ~200 country names: categories cut memory by an order of magnitude
+    return pd.DataFrame({
+        column: df[column].astype(str).str.strip().astype('category') for column in VISA_COLUMNS
+    }).reset_index(drop=True)
+
+def bucket_frame(mapping):
+    """Tidy Passport/Destination/Requirement frame from {passport: {bucket: [destinations]}}"""
+    rows = []
+    for passport, buckets in mapping.items():
+        # visa_data.json keys passports by ISO3 ("IND") and abbreviates some names ("UK")
+        passport_name = country_name(country_iso3(passport)) or passport
+        for bucket, destinations in buckets.items():
+            for destination in destinations:
+                destination_name = country_name(country_iso3(destination)) or destination
+                rows.append((passport_name, destination_name, BUCKET_REQUIREMENTS.get(bucket, bucket)))
+    return pd.DataFrame(rows, columns=VISA_COLUMNS)
+
+def load_bucket_file(path):
+    """bucket_frame for a JSON file, or an empty frame if it is missing or invalid"""
+    try:
+        with open(path) as f:
+            return bucket_frame(json.load(f))
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"⚠️ Warning: Could not read visa buckets from {path}: {e}")
+        return pd.DataFrame(columns=VISA_COLUMNS)
+
+def normalize_country(name):
+    """Lookup key for a country name"""
+    return str(name).strip().lower()
+
+def classify_requirement(requirement):
+    for category, pattern in REQUIREMENT_CATEGORIES:
+        if pattern.search(requirement):
+            return category
+    return 'other'
+
+class VisaIndex:
+    """Passport -> requirement category -> sorted destinations, built once per frame"""
+
+    def __init__(self, by_passport, names):
+        self.by_passport = by_passport
+        self.names = names
+        self.passports = tuple(sorted(names.values()))
+
+    @classmethod
+    def from_frame(cls, data):
+        # Classify each distinct requirement once, not once per row
+        category_of = {requirement: classify_requirement(requirement)
+                       for requirement in data['Requirement'].unique()}
+        grouped = defaultdict(lambda: defaultdict(set))
+        names = {}
+        for passport, destination, requirement in zip(data['Passport'], data['Destination'], data['Requirement']):
+            key = normalize_country(passport)
+            names.setdefault(key, passport)
+            if destination:
+                grouped[key][category_of[requirement]].add(destination)
+
+        by_passport = {}
+        for key, categories in grouped.items():
+            entry = {category: tuple(sorted(destinations)) for category, destinations in categories.items()}
+            entry['visa_free_any'] = tuple(sorted(set().union(
+                *(categories.get(category, ()) for category in VISA_FREE_CATEGORIES)
+            )))
+            by_passport[key] = entry
+        return cls(by_passport, names)
+
+    def resolve(self, passport):
+        """Keys for an exact (case-insensitive) passport name, else every partial match"""
+        key = normalize_country(passport)
+        if key in self.by_passport:
+            return [key]
+        return [candidate for candidate in self.by_passport if key in candidate]
+
+    def destinations(self, passport, category='visa_free_any'):
+        """Sorted destinations for a passport and requirement category"""
+        keys = self.resolve(passport)
+        if len(keys) == 1:
+            return self.by_passport[keys[0]].get(category, ())
+        # Partial matches are rare (typed names); merge them like the old scan did
+        return tuple(sorted(set().union(*(self.by_passport[key].get(category, ()) for key in keys))))
+
+    def visa_free(self, passport):
+        """Visa-free and visa-on-arrival destinations, as listed on the Passport page"""
+        return self.destinations(passport, 'visa_free_any')
+
+@dataclass
+class GroupVisaAccess:
+    """Destinations open to every member of a mixed-nationality group"""
+    passports: list
+    unknown: list = field(default_factory=list)
+    # category -> destinations every member can enter under exactly that category
+    by_category: dict = field(default_factory=dict)
+    # destinations every member can enter under any of the requested categories
+    any_category: tuple = ()
+
+class VisaMatrix:
+    """Dense passport x destination matrix of int8 requirement codes"""
+
+    def __init__(self, names, matrix):
+        self.names = np.asarray(names, dtype=object)
+        self.matrix = matrix
+        self.iso3 = np.asarray([country_iso3(name) for name in names], dtype=object)
+        self._positions = {}
+        for position, (name, iso3) in enumerate(zip(names, self.iso3)):
+            self._positions.setdefault(normalize_country(name), position)
+            if iso3 is not None:
+                self._positions.setdefault(iso3, position)
+        # Rows with any data are passports; the rest only appear as destinations
+        self.passport_mask = (matrix != 0).any(axis=1)
+        # Region of every column as a small int, so regional counts are one bincount
+        self.region_names = REGIONS + (UNKNOWN_REGION,)
+        region_position = {region: index for index, region in enumerate(self.region_names)}
+        self.region_codes = np.array([region_position[country_region(name)] for name in names], dtype=np.int8)
+        self._category_counts = None
+        self._rankings = {}
+        self._bitmaps = self._build_bitmaps(matrix)
+
+    @staticmethod
+    def _build_bitmaps(matrix):
+        # One row of packed bits per passport and category, padded to whole
+        # 64-bit words so a group intersection is an AND over a few uint64s
+        width = -(-matrix.shape[1] // 64) * 64
+        bitmaps = {}
+        for category in GROUP_CATEGORIES:
+            bits = np.zeros((matrix.shape[0], width), dtype=bool)
+            bits[:, :matrix.shape[1]] = matrix == VISA_CATEGORY_CODES[category]
+            bitmaps[category] = np.packbits(bits, axis=1).view(np.uint64)
+        return bitmaps
+
+    def _bitmap_names(self, words):
+        bits = np.unpackbits(words.view(np.uint8))[:len(self.names)]
+        return tuple(self.names[bits.astype(bool)])
+
+    @classmethod
+    def from_frame(cls, data):
+        # Dictionary-encode both axes over one shared list of country names
+        passports = data['Passport'].astype('category')
+        destinations = data['Destination'].astype('category')
+        requirements = data['Requirement'].astype('category')
+        names = sorted(set(passports.cat.categories) | set(destinations.cat.categories))
+        position = {name: index for index, name in enumerate(names)}
+
+        passport_lookup = np.array([position[name] for name in passports.cat.categories], dtype=np.int32)
+        destination_lookup = np.array([position[name] for name in destinations.cat.categories], dtype=np.int32)
+        requirement_lookup = np.array(
+            [VISA_CATEGORY_CODES[classify_requirement(value)] for value in requirements.cat.categories],
+            dtype=np.int8,
+        )
+
+        matrix = np.zeros((len(names), len(names)), dtype=np.int8)
+        matrix[passport_lookup[passports.cat.codes.to_numpy()],
+               destination_lookup[destinations.cat.codes.to_numpy()]] = \
+            requirement_lookup[requirements.cat.codes.to_numpy()]
+        return cls(names, matrix)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes
+
+    def position(self, country):
+        """Matrix position for a country name, alias or ISO3 code; None when unknown"""
+        found = self._positions.get(normalize_country(country))
+        if found is None:
+            found = self._positions.get(country_iso3(country))
+        return found
+
+    def _codes(self, categories):
+        if isinstance(categories, str):
+            categories = (categories,)
+        return np.array([VISA_CATEGORY_CODES[category] for category in categories], dtype=np.int8)
+
+    def requirement(self, passport, destination):
+        """Requirement category for one passport/destination pair"""
+        row, column = self.position(passport), self.position(destination)
+        if row is None or column is None:
+            return 'unknown'
+        return VISA_CATEGORY_NAMES[self.matrix[row, column]]
+
+    def destinations(self, passport, categories=VISA_FREE_CATEGORIES):
+        """Destinations a passport can enter under the given categories (sorted)"""
+        row = self.position(passport)
+        if row is None:
+            return ()
+        return tuple(self.names[np.isin(self.matrix[row], self._codes(categories))])
+
+    def passports_for(self, destination, categories=VISA_FREE_CATEGORIES):
+        """Reverse lookup: passports that can enter destination under the given categories"""
+        column = self.position(destination)
+        if column is None:
+            return ()
+        return tuple(self.names[np.isin(self.matrix[:, column], self._codes(categories))])
+
+    def region_breakdown(self, passport, categories=VISA_FREE_CATEGORIES):
+        """Destinations per region a passport can enter under the given categories; 'Other' only when non-zero"""
+        row = self.position(passport)
+        if row is None:
+            return {}
+        open_destinations = np.isin(self.matrix[row], self._codes(categories))
+        counts = np.bincount(self.region_codes[open_destinations], minlength=len(self.region_names))
+        breakdown = {region: int(count) for region, count in zip(REGIONS, counts)}
+        if counts[-1]:
+            breakdown[UNKNOWN_REGION] = int(counts[-1])
+        return breakdown
+
+    def group_access(self, passports, categories=GROUP_CATEGORIES):
+        """Destinations every passport in the group can enter, per category and overall"""
+        rows, resolved, unknown = [], [], []
+        for passport in passports:
+            row = self.position(passport)
+            if row is None or not self.passport_mask[row]:
+                unknown.append(passport)
+            elif row not in rows:
+                rows.append(row)
+                resolved.append(self.names[row])
+        result = GroupVisaAccess(passports=resolved, unknown=unknown)
+        if not rows:
+            return result
+
+        rows = np.array(rows)
+        either = None
+        for category in categories:
+            member_bits = self._bitmaps[category][rows]
+            result.by_category[category] = self._bitmap_names(np.bitwise_and.reduce(member_bits, axis=0))
+            either = member_bits if either is None else either | member_bits
+        result.any_category = self._bitmap_names(np.bitwise_and.reduce(either, axis=0))
+        return result
+
+    def category_counts(self):
+        """(countries x categories) counts of each requirement code per passport"""
+        if self._category_counts is None:
+            self._category_counts = np.stack(
+                [(self.matrix == code).sum(axis=1) for code in range(len(VISA_CATEGORY_NAMES))], axis=1
+            )
+        return self._category_counts
+
+    def strength_ranking(self, weights=None):
+        """Passports ranked by weighted destination counts: [(rank, name, score)], ties share a rank"""
+        weights = weights or {category: 1.0 for category in VISA_FREE_CATEGORIES}
+        cache_key = tuple(sorted(weights.items()))
+        if cache_key in self._rankings:
+            return self._rankings[cache_key]
+        weight_vector = np.zeros(len(VISA_CATEGORY_NAMES))
+        for category, weight in weights.items():
+            weight_vector[VISA_CATEGORY_CODES[category]] = weight
+
+        scores = self.category_counts() @ weight_vector
+        candidates = np.flatnonzero(self.passport_mask)
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        ordered_scores = scores[order]
+        ranks = np.searchsorted(-ordered_scores, -ordered_scores, side='left') + 1
+        # The matrix never changes after construction, so rankings are cached
+        ranking = self._rankings[cache_key] = [
+            (int(rank), self.names[index], float(score))
+            for rank, index, score in zip(ranks, order, ordered_scores)
+        ]
+        return ranking
+
+    def rank_of(self, passport, weights=None):
+        """(rank, number of ranked passports) for one passport, or None"""
+        row = self.position(passport)
+        if row is None or not self.passport_mask[row]:
+            return None
+        ranking = self.strength_ranking(weights)
+        rank = next(rank for rank, name, _ in ranking if name == self.names[row])
+        return rank, len(ranking)
+
+@dataclass(frozen=True)
+class VisaSnapshot:
+    """One loaded version of the dataset with everything derived from it"""
+    data: Optional[pd.DataFrame] = None
+    index: Optional[VisaIndex] = None
+    matrix: Optional[VisaMatrix] = None
+    manifest: dict = field(default_factory=dict)
+    source: Optional[str] = None
+
+class VisaDatasetStore:
+    """Serve the visa dataset from local snapshots, refreshing in the background"""
+
+    def __init__(self, fallback, snapshot_dir=VISA_SNAPSHOT_DIR, urls=VISA_DATASET_URLS,
+                 refresh_seconds=VISA_REFRESH_SECONDS, retention=VISA_SNAPSHOT_RETENTION, fetch=None):
+        self.fallback = fallback
+        self.snapshot_dir = snapshot_dir
+        self.urls = urls
+        self.refresh_seconds = refresh_seconds
+        self.retention = retention
+        self.fetch = fetch or self._http_fetch
+        # Replaced as a whole on every swap; read it once per request so the
+        # index, matrix and version all come from the same dataset
+        self.snapshot = VisaSnapshot()
+        self._listeners = []
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'checks': 0,
+            'not_modified': 0,
+            'updates': 0,
+            'errors': 0,
+            'last_error': None,
+            'load_seconds': None,
+        }
+
+    @property
+    def data(self):
+        return self.snapshot.data
+
+    @property
+    def index(self):
+        return self.snapshot.index
+
+    @property
+    def matrix(self):
+        return self.snapshot.matrix
+
+    @property
+    def manifest(self):
+        return self.snapshot.manifest
+
+    @property
+    def source(self):
+        return self.snapshot.source
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    # ----- loading -----
+
+    def _manifest_path(self):
+        return os.path.join(self.snapshot_dir, MANIFEST_NAME)
+
+    def load(self):
+        """Load the newest snapshot, or the built-in fallback when there is none"""
+        started = time.perf_counter()
+        try:
+            with open(self._manifest_path()) as f:
+                manifest = json.load(f)
+            data = self._read_snapshot(os.path.join(self.snapshot_dir, manifest['file']))
+            self._swap(data, manifest, 'snapshot')
+        except FileNotFoundError:
+            print("⚠️ Warning: No visa dataset snapshot yet; using built-in data until the first refresh")
+            self._swap(normalize_visa_frame(self.fallback()), {}, 'fallback')
+        except Exception as e:
+            print(f"⚠️ Warning: Could not read visa dataset snapshot: {e}; using built-in data")
+            self._swap(normalize_visa_frame(self.fallback()), {}, 'fallback')
+        with self._stats_lock:
+            self.stats['load_seconds'] = time.perf_counter() - started
+        return self
+
+    def _read_snapshot(self, path):
+        if path.endswith('.parquet'):
+            return normalize_visa_frame(pd.read_parquet(path))
+        return normalize_visa_frame(pd.read_csv(path, compression='gzip'))
+
+    def _swap(self, data, manifest, source):
+        # Everything is built first, then published with one assignment
+        self.snapshot = VisaSnapshot(
+            data=data,
+            index=VisaIndex.from_frame(data),
+            matrix=VisaMatrix.from_frame(data),
+            manifest=manifest,
+            source=source,
+        )
+        for listener in self._listeners:
+            try:
+                listener(data)
+            except Exception as e:
+                print(f"⚠️ Warning: Visa dataset listener failed: {e}")
+
+    def on_swap(self, listener):
+        """Call listener(data) after every swap (e.g. to rebuild derived indexes)"""
+        self._listeners.append(listener)
+        if self.data is not None:
+            listener(self.data)
+
+    # ----- refreshing -----
+
+    def _http_fetch(self, url, headers):
+        response = get_http_client('visa_dataset', read_timeout=30).get(url, headers=headers)
+        if response.status_code == 304:
+            return 304, None, response.headers
+        response.raise_for_status()
+        return response.status_code, response.content, response.headers
+
+    def refresh(self):
+        """Conditionally fetch the dataset; returns 'updated', 'not_modified' or 'failed'"""
+        with self._refresh_lock:
+            self._count('checks')
+            errors = []
+            for url in self.urls:
+                # Validators only apply to the URL they came from
+                headers = {}
+                if self.manifest.get('source_url') == url:
+                    if self.manifest.get('etag'):
+                        headers['If-None-Match'] = self.manifest['etag']
+                    if self.manifest.get('last_modified'):
+                        headers['If-Modified-Since'] = self.manifest['last_modified']
+                try:
+                    status, body, response_headers = self.fetch(url, headers)
+                    if status == 304:
+                        self._count('not_modified')
+                        self._update_manifest(dict(self.manifest, checked_at=time.time()))
+                        return 'not_modified'
+                    self._store(url, body, response_headers)
+                    self._count('updates')
+                    return 'updated'
+                except Exception as e:
+                    errors.append(f"{url}: {e}")
+            last_error = '; '.join(errors)
+            with self._stats_lock:
+                self.stats['errors'] += 1
+                self.stats['last_error'] = last_error
+            print(f"⚠️ Warning: Visa dataset refresh failed: {last_error}")
+            return 'failed'
+
+    def _store(self, url, body, headers):
+        digest = hashlib.sha256(body).hexdigest()
+        if digest == self.manifest.get('sha256'):
+            # Same content from a server that ignores validators
+            self._update_manifest(dict(self.manifest, checked_at=time.time(),
+                                       etag=headers.get('ETag'), last_modified=headers.get('Last-Modified')))
+            return
+        data = normalize_visa_frame(pd.read_csv(io.BytesIO(body)))
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        version = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        extension = '.parquet' if PARQUET_AVAILABLE else '.csv.gz'
+        filename = f"passport-index-{version}{extension}"
+        path = os.path.join(self.snapshot_dir, filename)
+        temp_path = path + '.tmp'
+        if PARQUET_AVAILABLE:
+            data.to_parquet(temp_path, index=False)
+        else:
+            data.to_csv(temp_path, index=False, compression='gzip')
+        os.replace(temp_path, path)
+
+        now = time.time()
+        manifest = {
+            'version': version,
+            'file': filename,
+            'source_url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'sha256': digest,
+            'rows': len(data),
+            'fetched_at': now,
+            'checked_at': now,
+        }
+        self._write_manifest(manifest)
+        self._swap(data, manifest, 'snapshot')
+        self._prune()
+        print(f"✅ Visa dataset updated to snapshot {version} ({len(data):,} rows)")
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        temp_path = self._manifest_path() + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, self._manifest_path())
+
+    def _update_manifest(self, manifest):
+        # Same data, new validators/timestamps
+        self._write_manifest(manifest)
+        self.snapshot = replace(self.snapshot, manifest=manifest)
+
+    def _prune(self):
+        snapshots = sorted(name for name in os.listdir(self.snapshot_dir)
+                           if name.startswith('passport-index-') and not name.endswith('.tmp'))
+        for name in snapshots[:-self.retention]:
+            try:
+                os.remove(os.path.join(self.snapshot_dir, name))
+            except OSError:
+                pass
+
+    def start(self):
+        """Refresh in the background now if the snapshot is due, then periodically"""
+        self._thread = threading.Thread(target=self._refresh_loop, name='roamgenie-visa-refresh', daemon=True)
+        self._thread.start()
+        return self
+
+    def _refresh_loop(self):
+        checked_at = self.manifest.get('checked_at') or 0
+        delay = max(checked_at + self.refresh_seconds - time.time(), 0)
+        while not self._stop.wait(delay):
+            result = self.refresh()
+            # Retry failures sooner than the regular interval
+            delay = self.refresh_seconds if result != 'failed' else min(self.refresh_seconds, 15 * 60)
+
+    def shutdown(self):
+        self._stop.set()
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        snapshot = self.snapshot
+        data = snapshot.data
+        stats.update({
+            'source': snapshot.source,
+            'version': snapshot.manifest.get('version'),
+            'rows': 0 if data is None else len(data),
+            'memory_bytes': 0 if data is None else int(data.memory_usage(deep=True).sum()),
+            'fetched_at': snapshot.manifest.get('fetched_at'),
+            'checked_at': snapshot.manifest.get('checked_at'),
+        })
+        return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage local visa dataset snapshots")
+    parser.add_argument('--refresh', action='store_true', help="fetch the dataset now")
+    parser.add_argument('--snapshot-dir', default=VISA_SNAPSHOT_DIR)
+    args = parser.parse_args(argv)
+
+    store = VisaDatasetStore(lambda: pd.DataFrame(columns=VISA_COLUMNS), snapshot_dir=args.snapshot_dir).load()
+    if args.refresh:
+        print(f"Refresh: {store.refresh()}")
+    stats = store.get_stats()
+    print(f"Source: {stats['source']}, version {stats['version'] or '-'}, {stats['rows']:,} rows, "
+          f"{stats['memory_bytes'] / 1024:.0f} KB in memory")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())